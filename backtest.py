@@ -0,0 +1,199 @@
+# ================================================
+#   FILE: backtest.py
+#
+#   Replays stored candles through the same indicator and signal code the
+#   data process runs live (streaming IndicatorEngine + evaluateMarketConditions)
+#   and simulates the trader's buy, sell and trailing stop loss handling at
+#   full CPU speed. Every strategy in app_variables['strategies'] trades its
+#   own positions, like the live trader. Trades are written in the
+#   database/events.csv schema plus the strategy column.
+#
+#       python backtest.py --candles database/history --out database/backtest_events.csv
+#
+#   --candles is a directory with one {coin}.json per coin, in the format the
+#   v2/candles endpoint returns ([[time, open, high, low, close, volume], ...]
+#   newest first), or the candle store the trader keeps (database/candles,
+#   the default). Coins with no json file are read from the store.
+#
+#   Fills: signals buy and sell at the candle close. Stop losses are checked
+#   against the candle low first (sold at the low, the pessimistic case) and
+#   then the close, which also raises the trailing stops.
+#
+
+
+# ==== IMPORTS
+from data import Data
+from trader import Trader
+from main import APP_VARIABLES
+from resources.candlestore import CandleStore
+
+import argparse
+import csv
+import json
+import os
+import time
+
+
+
+
+EVENT_COLUMNS = ['coin', 'strategy', 'buy-type', 'sell-type', 'buy-price', 'sell-price', 'timeframe', 'sl-percent']
+
+
+
+
+# ==== SIMULATED PROCESSES
+
+# trader that fills at the current simulated price and keeps trades in memory
+class BacktestTrader(Trader):
+    def __init__(self, app_vars):
+        super().__init__(app_vars, None, None)
+        self.prices = {}
+        self.trades = []
+
+    def placeBuyOrder(self, coin):
+        return self.prices[coin]
+
+    def placeSellOrder(self, coin):
+        return self.prices[coin]
+
+    def notifyBuy(self, coin, order, type):
+        pass
+
+    def notifySell(self, coin, order, type):
+        pass
+
+    def recordTrade(self, order):
+        self.trades.append({
+            'coin': order['coin'],
+            'strategy': order['strategy'],
+            'buy-type': order['buy-type'],
+            'sell-type': order['sell-type'],
+            'buy-price': order['bid'],
+            'sell-price': order['ask'],
+            'timeframe': self.app_variables['timeframe'],
+            'sl-percent': self.app_variables['stop_loss_percent']
+        })
+
+
+
+# data process whose signals go straight to the simulated trader
+class BacktestData(Data):
+    def __init__(self, app_vars, trader):
+        super().__init__(app_vars, None, None)
+        self.trader = trader
+
+    def sendMessage(self, to, message):
+        if (to == 'trader'):
+            self.trader.handleMessage(message)
+
+
+
+
+# ==== BACKTEST
+
+# replays candles for every coin --> {coin: [candles oldest first]}
+# returns the simulated trader
+def runBacktest(app_vars, candles):
+    trader = BacktestTrader(app_vars)
+    data = BacktestData(app_vars, trader)
+    engine = data.indicator_engine
+
+    for coin in candles:
+        for i, candle in enumerate(candles[coin]):
+            trader.prices[coin] = candle[4]
+
+            if trader.coin_orders.get(coin):
+                trader.checkStopLosses(coin, candle[3])
+                trader.checkStopLosses(coin, candle[4])
+
+            engine.append(coin, candle)
+
+            # the rules only look at the last `depth` values
+            if (i + 1 >= engine.required):
+                data.evaluateMarketConditions({coin: engine.values(coin, data.strategies.depth)})
+
+    return trader
+
+
+
+# loads {coin}.json files, or the candle store files, from a directory
+# --> {coin: [candles oldest first]}
+def loadCandles(path, coins, timeframe='1m'):
+    store = CandleStore(path, timeframe, readonly=True)
+
+    out_data = {}
+    for coin in coins:
+        file = os.path.join(path, f'{coin}.json')
+        if os.path.exists(file):
+            with open(file) as f:
+                candles = json.load(f)
+        else:
+            candles = store.candles(coin)
+
+        if not(candles):
+            print(f'no candles for {coin}')
+            continue
+
+        candles.sort(key=lambda candle: candle[0])
+        out_data[coin] = candles
+
+    store.close()
+    return out_data
+
+
+
+def writeEvents(trades, path):
+    new = not os.path.exists(path)
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=EVENT_COLUMNS)
+        if new:
+            writer.writeheader()
+        writer.writerows(trades)
+
+
+
+# per strategy and coin trade count, win rate and summed percent return
+def summarize(trades, open_positions):
+    stats = {}
+    for trade in trades:
+        s = stats.setdefault((trade['strategy'], trade['coin']), {'trades': 0, 'wins': 0, 'percent': 0.0})
+        s['trades'] += 1
+        s['wins'] += (trade['sell-price'] > trade['buy-price'])
+        s['percent'] += (trade['sell-price'] - trade['buy-price']) / trade['buy-price'] * 100
+
+    print(f"{'STRATEGY':<14}{'COIN':<10}{'TRADES':>8}{'WIN %':>8}{'PNL %':>10}")
+    for strategy, coin in sorted(stats):
+        s = stats[(strategy, coin)]
+        print(f"{strategy:<14}{coin.upper():<10}{s['trades']:>8}{(s['wins'] / s['trades'] * 100):>8.1f}{s['percent']:>10.2f}")
+
+    for strategy in sorted({key[0] for key in stats}):
+        total = sum(stats[key]['percent'] for key in stats if (key[0] == strategy))
+        count = sum(stats[key]['trades'] for key in stats if (key[0] == strategy))
+        print(f"{strategy:<14}{'TOTAL':<10}{count:>8}{'':>8}{total:>10.2f}")
+    print(f'{open_positions} positions still open')
+
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='replay stored candles through the live signal logic')
+    parser.add_argument('--candles', default=APP_VARIABLES['candle_store'], help='directory with {coin}.json or candle store files')
+    parser.add_argument('--coins', nargs='*', help='defaults to the coins in APP_VARIABLES')
+    parser.add_argument('--out', default='database/backtest_events.csv')
+    args = parser.parse_args()
+
+    app_variables = dict(APP_VARIABLES)
+    if args.coins:
+        app_variables['coins'] = args.coins
+
+    candles = loadCandles(args.candles, app_variables['coins'], app_variables['timeframe'])
+
+    start = time.perf_counter()
+    trader = runBacktest(app_variables, candles)
+    elapsed = time.perf_counter() - start
+
+    count = sum(len(candles[coin]) for coin in candles)
+    print(f'replayed {count} candles in {elapsed:.2f}s ({count / elapsed:,.0f} candles / s)')
+
+    summarize(trader.trades, len(trader.active_orders))
+    writeEvents(trader.trades, args.out)
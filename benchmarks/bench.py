@@ -0,0 +1,356 @@
+# ================================================
+#   FILE: benchmarks/bench.py
+#
+#   Benchmark harness, runs on the synthetic market of benchmarks/market.py
+#   so the numbers only depend on the code and the machine:
+#
+#       indicators/...          each Data.calculateFull* and calculateCoinData
+#       calculate_data/...      Data.calculateData per backend, coin count and
+#                               display window, one new candle per coin per call
+#       ipc/...                 Message round trip through a Pipe to an echo
+#                               process (encode, send, recv, decode both ways)
+#       gui/...                 GUI.displayData on off-screen Agg canvases
+#
+#   Results are written as JSON and compared with a stored baseline, the run
+#   fails (exit code 1) when a benchmark got slower than the threshold. A
+#   missing baseline fails too (exit code 2, before anything runs) unless
+#   --allow-missing-baseline is given, so the gate can not pass silently:
+#
+#       python -m benchmarks.bench --save-baseline      # on the reference machine
+#       python -m benchmarks.bench                      # compare, 25 % threshold
+#       python -m benchmarks.bench --filter ipc --threshold 0.5
+#       python -m benchmarks.bench --allow-missing-baseline     # just the numbers
+#
+#   Baselines are only comparable on the same machine and python.
+#
+
+
+# ==== IMPORTS
+from multiprocessing import Process, Pipe
+
+from benchmarks.market import SyntheticMarket, coinNames
+from main import APP_VARIABLES
+from resources.message import Message, Signal, encode, sendMessage, recvMessage
+from resources.message import CALC_DATA, DISPLAY_DATA, BUY_SIGNAL
+from data import Data
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+
+
+
+WINDOWS = (60, 240)
+COIN_COUNTS = (1, 7, 28)
+BACKENDS = ('streaming', 'python', 'numpy')
+
+DEFAULT_OUT = 'benchmarks/latest.json'
+DEFAULT_BASELINE = 'benchmarks/baseline.json'
+
+
+
+
+# app variables for a benchmark, nothing is written to disk
+def appVariables(window, backend='streaming', coins=None):
+    app_vars = dict(APP_VARIABLES)
+    app_vars.update({
+        'display_window': window,
+        'indicator_backend': backend,
+        'coins': coins or coinNames(1),
+        'candle_store': None,
+        'metrics_dir': None,
+        'resample_timeframes': []
+    })
+    return app_vars
+
+
+
+# data process without Pipes, messages are still encoded as they would be
+class BenchData(Data):
+    def sendMessage(self, to, message):
+        encode(message)
+
+
+
+
+# ==== TIMING
+
+# runs func `number` times per repeat after one warm up call
+# --> seconds per call, best and median of the repeats
+def timeCase(func, number, repeat):
+    func()
+
+    times = []
+    for _ in range(0, repeat):
+        start = time.perf_counter()
+        for _ in range(0, number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+
+    return {'best': min(times), 'median': statistics.median(times), 'number': number, 'repeat': repeat}
+
+
+
+
+# ==== CASES
+# every group returns [(name, func, number)]
+
+def indicatorCases(market):
+    cases = []
+
+    for window in WINDOWS:
+        data = BenchData(appVariables(window), None, None)
+        av = data.app_variables
+
+        candles = market.candles('c00usd', data.indicator_engine.required + 1)
+        closes = [candle[4] for candle in candles]
+        longs = data.calculateFullEMAs(closes, av['periods_long'])
+        shorts = data.calculateFullEMAs(closes, av['periods_short'])
+        macds = data.calculateFullMACDs(longs, shorts)
+
+        cases += [
+            (f'indicators/ema/w{window}', lambda data=data, closes=closes, av=av: data.calculateFullEMAs(closes, av['periods_long']), 200),
+            (f'indicators/macd/w{window}', lambda data=data, longs=longs, shorts=shorts: data.calculateFullMACDs(longs, shorts), 500),
+            (f'indicators/macd_signal/w{window}', lambda data=data, macds=macds, av=av: data.calculateFullMACDSignals(macds, av['periods_signal']), 200),
+            (f'indicators/rsi/w{window}', lambda data=data, candles=candles, av=av: data.calculateFullRSIs(candles, av['periods_rsi']), 20),
+            (f'indicators/coin_data/w{window}', lambda data=data, candles=candles: data.calculateCoinData(candles), 20)
+        ]
+
+    return cases
+
+
+
+# every call gets the next candle of each coin, like a refresh after a pull
+def calculateDataCases(market, number, repeat):
+    cases = []
+
+    for backend in BACKENDS:
+        if (backend == 'numpy'):
+            try:
+                import numpy
+            except ImportError:
+                print('skipping calculate_data/numpy: numpy is not installed')
+                continue
+
+        for n in COIN_COUNTS:
+            for window in WINDOWS:
+                coins = coinNames(n)
+                data = BenchData(appVariables(window, backend, coins), None, None)
+                needed = data.indicator_engine.required + 1
+
+                calls = 1 + number * repeat
+                series = market.market(coins, calls + needed)
+
+                def step(data=data, series=series, needed=needed, state=[calls]):
+                    state[0] -= 1
+                    i = max(0, state[0])
+                    data.calculateData({coin: series[coin][i:(i + needed)] for coin in series})
+
+                cases.append((f'calculate_data/{backend}/c{n}/w{window}', step, number))
+
+    return cases
+
+
+
+def echo(conn):
+    while True:
+        raw = conn.recv_bytes()
+        if not(raw):
+            return
+        conn.send_bytes(raw)
+
+
+
+def ipcCases(market):
+    data = BenchData(appVariables(60), None, None)
+    coins = coinNames(7)
+    series = market.market(coins, data.indicator_engine.required + 1)
+
+    messages = [
+        ('ipc/signal', Signal(BUY_SIGNAL, 'c00usd', 'macd', 'default', (1.0, 2.0, 3.0, 4.0, 5.0)), 2000),
+        ('ipc/candles/c7', Message(CALC_DATA, {coin: series[coin][:2] for coin in coins}, (1.0, 2.0, 3.0)), 1000),
+        ('ipc/candles_full/c7', Message(CALC_DATA, series, (1.0, 2.0, 3.0)), 200),
+        ('ipc/display/c7/w60', Message(DISPLAY_DATA, {'sent': time.time(), 'coins': {coin: data.calculateCoinData(series[coin]) for coin in coins}}), 500)
+    ]
+
+    conn, child = Pipe()
+    process = Process(target=echo, args=(child,), daemon=True)
+    process.start()
+
+    def roundTrip(message):
+        sendMessage(conn, message)
+        recvMessage(conn)
+
+    cases = [(name, lambda message=message: roundTrip(message), number) for name, message, number in messages]
+    return cases, (conn, process)
+
+
+
+# GUI with Agg canvases in place of the Tk windows, every window counts as
+# shown so displayData draws
+def guiCases(market):
+    try:
+        import matplotlib
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        import gui
+    except ImportError as e:
+        print(f'skipping gui: {e}')
+        return []
+
+    class OffscreenWindow:
+        def winfo_viewable(self):
+            return True
+
+    cases = []
+    for n in (1, 7):
+        coins = coinNames(n)
+        app_vars = appVariables(60, coins=coins)
+        data = BenchData(app_vars, None, None)
+        series = market.market(coins, data.indicator_engine.required + 41)
+
+        # 40 consecutive refreshes, the axis limits settle after the first ones
+        frames = []
+        for i in range(40, 0, -1):
+            frames.append({coin: data.calculateCoinData(series[coin][i:]) for coin in coins})
+
+        g = gui.GUI(app_vars, [], None)
+        g.coin_windows = {}
+        for coin in coins:
+            d = g.createPlots(coin)
+            d['WINDOW'] = OffscreenWindow()
+            d['CANVAS'] = FigureCanvasAgg(d['FIGURE'])
+            g.attachCanvas(coin, d)
+            g.coin_windows[coin] = d
+            d['CANVAS'].draw()
+
+        def refresh(g=g, frames=frames, state=[0]):
+            g.displayData(frames[state[0] % len(frames)])
+            state[0] += 1
+
+        cases.append((f'gui/display/c{n}', refresh, 40))
+
+    # every other frame at twice the price --> the axes rescale and the whole
+    # figure is drawn
+    def rescale(g=g, frames=frames, state=[0]):
+        frame = frames[state[0] % len(frames)]
+        if (state[0] % 2):
+            frame = {coin: dict(frame[coin], close_prices=[p * 2 for p in frame[coin]['close_prices']]) for coin in frame}
+        g.displayData({coins[0]: frame[coins[0]]})
+        state[0] += 1
+
+    cases.append(('gui/display_rescale/c1', rescale, 10))
+    return cases
+
+
+
+
+# ==== RESULTS
+
+def machineInfo(seed):
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'seed': seed,
+        'time': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+
+def writeJSON(path, results):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+
+# --> [names that got slower than the threshold]
+def compare(results, baseline, threshold):
+    for key in ('python', 'machine', 'cpus'):
+        if (results['meta'].get(key) != baseline['meta'].get(key)):
+            print(f"warning: baseline {key} is {baseline['meta'].get(key)}, this run {results['meta'].get(key)}")
+
+    print(f"{'BENCHMARK':<36} {'BEST':>12} {'BASELINE':>12} {'RATIO':>8}")
+
+    regressions = []
+    for name in sorted(results['results']):
+        best = results['results'][name]['best']
+        base = baseline['results'].get(name)
+        if (base is None):
+            print(f'{name:<36} {best * 1e6:>10.1f}us {"-":>12} {"new":>8}')
+            continue
+
+        ratio = best / base['best']
+        flag = ''
+        if (ratio > 1 + threshold):
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<36} {best * 1e6:>10.1f}us {base['best'] * 1e6:>10.1f}us {ratio:>8.2f}{flag}")
+
+    return regressions
+
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='run the benchmarks and compare them with the baseline')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--filter', help='only run benchmarks whose name contains this')
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown, 0.25 --> 25 %%')
+    parser.add_argument('--allow-missing-baseline', action='store_true', help='only report when there is no baseline instead of failing')
+    args = parser.parse_args()
+
+    missing = not(args.save_baseline) and not(os.path.exists(args.baseline))
+    if missing and not(args.allow_missing_baseline):
+        print(f'no baseline at {args.baseline}, run with --save-baseline first (or --allow-missing-baseline)')
+        sys.exit(2)
+
+    market = SyntheticMarket(args.seed)
+
+    cases = indicatorCases(market)
+    cases += calculateDataCases(market, 20, args.repeat)
+    ipc, (conn, process) = ipcCases(market)
+    cases += ipc
+    cases += guiCases(market)
+
+    results = {'meta': machineInfo(args.seed), 'results': {}}
+    for name, func, number in cases:
+        if args.filter and (args.filter not in name):
+            continue
+        results['results'][name] = timeCase(func, number, args.repeat)
+        print(f"{name:<36} {results['results'][name]['best'] * 1e6:>10.1f}us")
+
+    conn.send_bytes(b'')
+    process.join()
+
+    writeJSON(args.out, results)
+    print(f'results written to {args.out}')
+
+    if args.save_baseline:
+        writeJSON(args.baseline, results)
+        print(f'baseline saved to {args.baseline}')
+        sys.exit(0)
+
+    if missing:
+        print(f'no baseline at {args.baseline}, nothing compared')
+        sys.exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    print()
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} benchmarks regressed more than {args.threshold * 100:.0f} %: {', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,78 @@
+# ================================================
+#   FILE: benchmarks/market.py
+#
+#   Seeded synthetic market for the benchmarks, so they never touch the
+#   network and every run sees the same candles. Prices follow a random walk
+#   with slowly changing volatility (quiet and busy stretches, like the real
+#   feed) and a small drift that flips now and then so the indicators cross
+#   over. Candles are in the v2/candles format the app uses:
+#
+#       [time (ms), open, high, low, close, volume] newest first
+#
+
+
+# ==== IMPORTS
+from itertools import islice
+
+import math
+import random
+
+
+
+
+START = 1600000000000       # ms, first candle of every coin
+
+
+
+
+# coin names for a benchmark with n coins --> ['c00usd', 'c01usd', ...]
+def coinNames(n):
+    return [f'c{i:02d}usd' for i in range(0, n)]
+
+
+
+
+class SyntheticMarket:
+    def __init__(self, seed=0, timeframe_ms=60 * 1000):
+        self.seed = seed
+        self.timeframe_ms = timeframe_ms
+
+
+
+    # n candles of a coin, the same seed and coin always give the same candles
+    def candles(self, coin, n):
+        out_data = list(islice(self.walk(coin), n))
+        out_data.reverse()
+        return out_data
+
+
+
+    # endless candles of a coin, oldest first
+    def walk(self, coin):
+        rnd = random.Random(f'{self.seed}:{coin}')
+
+        price = rnd.uniform(1, 1000)
+        volatility = 0.002
+        drift = 0.0
+
+        i = 0
+        while True:
+            volatility = min(0.02, max(0.0005, volatility * math.exp(rnd.gauss(0, 0.05))))
+            if (rnd.random() < 0.01):
+                drift = rnd.gauss(0, volatility * 0.2)
+
+            o = price
+            c = o * math.exp(drift + rnd.gauss(0, volatility))
+            h = max(o, c) * (1 + abs(rnd.gauss(0, volatility * 0.5)))
+            l = min(o, c) * (1 - abs(rnd.gauss(0, volatility * 0.5)))
+            v = rnd.expovariate(1 / 50)
+
+            yield [START + i * self.timeframe_ms, round(o, 6), round(h, 6), round(l, 6), round(c, 6), round(v, 4)]
+            price = c
+            i += 1
+
+
+
+    # {coin: candles} for several coins
+    def market(self, coins, n):
+        return {coin: self.candles(coin, n) for coin in coins}
@@ -8,102 +8,327 @@
 
 
 # ==== IMPORTS
-from resources.message import Message
+from collections import deque
+from itertools import islice
+
+from resources.message import Message, Signal, DisplayUpdate, Dispatcher, sendMessage
+from resources.message import CALC_DATA, DISPLAY_DATA, BUY_SIGNAL
+from resources.indicators import IndicatorEngine, IndicatorCache
+from resources.messageloop import MessageLoop
+from resources.candlestore import CandleStore
+from resources.resampler import Resampler, timeframeMs
+from resources.metrics import Metrics
+from resources.strategies import StrategyEngine, DEFAULT_STRATEGIES
+
+import time
 
 
 
 class Data:
-    def __init__(self, app_vars, t_conn, g_conn):
+    def __init__(self, app_vars, t_conn, g_conn, buffers=None):
         self.trader_connection = t_conn
         self.gui_connection = g_conn
 
+        # shared memory buffers for the gui, None --> data is sent through the Pipe
+        self.buffers = buffers
+
         self.app_variables = app_vars
 
+        # per coin streaming indicator state
+        self.indicator_engine = IndicatorEngine(app_vars)
+
+        # indicator outputs by candle fingerprint (off by default) and the key
+        # last shown for each (coin, timeframe), a repeat of that key changed
+        # nothing
+        self.indicator_cache = IndicatorCache(app_vars.get('indicator_cache_bytes', 0))
+        self.indicator_params = tuple(app_vars[name] for name in ('display_window', 'periods_long', 'periods_short', 'periods_signal', 'periods_rsi', 'ema_smoothing'))
+        self.last_keys = {}
+
+        # bounded candle history per coin --> newest first, the trader only
+        # sends new or revised candles
+        self.candle_history = {}
+
+        # 'streaming' (default), 'numpy' --> all coins in one batched pass,
+        # 'python' --> full recompute for every coin
+        self.indicator_backend = app_vars.get('indicator_backend', 'streaming')
+        if (self.indicator_backend == 'numpy'):
+            from resources.vectorized import BatchIndicators
+            self.batch_indicators = BatchIndicators(app_vars)
+
+        # higher timeframe bars built from the base candles, indicators and
+        # signals for each of them --> {coin: {timeframe: ...}}
+        self.resampler = None
+        self.timeframe_data = {}
+        self.timeframe_signals = {}
+        if app_vars.get('resample_timeframes'):
+            self.resampler = Resampler(app_vars['timeframe'], app_vars['resample_timeframes'], self.indicator_engine.required + 1)
+
+        # every strategy compiled into one rule graph, evaluated for all the
+        # coins of a refresh at once
+        self.strategies = StrategyEngine(app_vars.get('strategies') or DEFAULT_STRATEGIES, app_vars)
+
+        # latency histograms and counters, written to the stats file by the mainloop
+        self.metrics = Metrics(f"data-{app_vars.get('data_worker', 0)}", app_vars.get('metrics_dir'))
+        self.loop = None
+
+        # message handlers by opcode
+        self.dispatcher = Dispatcher()
+        self.dispatcher.register(CALC_DATA, self.handleCalcData)
+
 
 
     # mainloop
     def start(self):
 
-        # check for incoming messages
-        def checkForMessages():
-            if self.gui_connection.poll():
-                try:
-                    msg = self.gui_connection.recv()
-                    self.handleMessage(msg)
-                except:
-                    pass
+        if self.app_variables.get('candle_store'):
+            self.loadStoredCandles()
 
+        # blocks until a message arrives from either process
+        self.loop = MessageLoop()
+        self.loop.addConnection(self.gui_connection, self.dispatcher.dispatch)
+        self.loop.addConnection(self.trader_connection, self.dispatcher.dispatch)
+        if self.app_variables.get('metrics_dir'):
+            self.loop.addTimer(self.app_variables['metrics_interval'], self.writeMetrics)
+        self.loop.run()
 
-            if self.trader_connection.poll():
-                try:
-                    msg = self.trader_connection.recv()
-                    self.handleMessage(msg)
-                except:
-                    pass
 
 
-        # mainloop
-        while True:
-            # check for incoming messages
-            checkForMessages()
+    def writeMetrics(self):
+        self.metrics.set('pipe_backlog', self.loop.backlog)
+        self.metrics.set('pipe_backlog_max', self.loop.max_backlog)
+        for result in ('hits', 'misses', 'unchanged'):
+            self.metrics.set('indicator_cache_total', getattr(self.indicator_cache, result), result=result)
+        self.metrics.write()
 
 
 
 
-    # creates a Message object and sends it through the
-    # corresponding pipe
-    def sendMessage(self, to, m='', d=''):
-        message = Message(m, d)
+    # sends a message through the corresponding pipe
+    def sendMessage(self, to, message):
 
         if (to == 'trader'):
             #print('MESSAGE: data --> trader')
-            self.trader_connection.send(message)
+            sendMessage(self.trader_connection, message)
 
         if (to == 'gui'):
             #print('MESSAGE: data --> gui')
-            self.gui_connection.send(message)
+            sendMessage(self.gui_connection, message)
 
 
 
-    # handles incoming messages
-    def handleMessage(self, m):
+    # fills the candle history from the on-disk store so the charts are up
+    # before the first pull, the trader then only sends newer candles
+    # no signals are checked on stored candles, they can be old
+    def loadStoredCandles(self):
+        store = CandleStore(self.app_variables['candle_store'], self.app_variables['timeframe'], readonly=True)
 
-        if (m.message == 'calc-data'):
-            #print('DATA: calculating data...')
-            self.calculateData(m.data)      # m.data is a dict {'coin': [candles]}
+        # enough base candles for the indicators of the largest timeframe
+        limit = self.app_variables['candle_history']
+        if self.resampler:
+            ratio = max(self.resampler.timeframes.values()) // timeframeMs(self.app_variables['timeframe'])
+            limit = max(limit, (self.indicator_engine.required + 2) * ratio)
+
+        d = {}
+        for coin in self.app_variables['coins']:
+            candles = store.candles(coin, limit=limit)
+            if (len(candles) > self.indicator_engine.required):
+                d[coin] = candles
+        store.close()
+
+        if (d):
+            self.calculateData(self.mergeCandles(d), signals=False)
+            self.calculateTimeframes(d, signals=False)
+
+
+
+    # new candles from the trader
+    def handleCalcData(self, m):
+        #print('DATA: calculating data...')
+        received = time.monotonic()
+        if m.trace:
+            self.metrics.observe('ipc_seconds', received - m.trace[-1], route='trader-data')
+
+        self.calculateData(self.mergeCandles(m.data), trace=(m.trace + (received,)))      # m.data is a dict {'coin': [new candles]}
+        self.calculateTimeframes(m.data)
+
+
+    # merges new or revised candles into the history of each coin
+    # returns {coin: [recent candles]} for the coins that changed, just enough
+    # history for the indicators
+    def mergeCandles(self, d):
+        out_data = {}
+        needed = self.indicator_engine.required + 1
+
+        for coin in d:
+            if coin not in self.candle_history:
+                self.candle_history[coin] = deque(maxlen=self.app_variables['candle_history'])
+            history = self.candle_history[coin]
+
+            # d[coin] is newest first --> apply oldest first
+            for candle in reversed(d[coin]):
+                if not(history) or (candle[0] > history[0][0]):
+                    history.appendleft(candle)
+                    continue
+
+                # revised candle --> replace it in place
+                for i, old in enumerate(history):
+                    if (old[0] == candle[0]):
+                        history[i] = candle
+                    if (old[0] <= candle[0]):
+                        break
+
+            out_data[coin] = list(islice(history, needed))
+
+        return out_data
 
-        pass
 
 
     # loop through active coins and calculate all data
     # send the data to ui to display
     # check for buy and sell signals --> send message back to trader if signals
-    def calculateData(self, d):
+    # trace --> stamps of the candle message, passed on with the signals
+    # coins whose candles are the same as last time are left out, a candle
+    # state seen before reuses the cached values
+    def calculateData(self, d, signals=True, trace=()):
 
         out_data = {}
+        keys = {}
+        cached = {}
+        computed = {}
+        timeframe = self.app_variables['timeframe']
 
         for coin in d:
-            out_data[coin] = {}
+            key = self.indicator_cache.key(coin, timeframe, d[coin], self.indicator_params)
+            if (key == self.last_keys.get((coin, timeframe))):
+                self.indicator_cache.unchanged += 1
+                continue
+
+            keys[coin] = key
+            cached[coin] = self.indicator_cache.get(key)
+
+        if not(keys):
+            return
+
+        if (self.indicator_backend == 'numpy'):
+            missed = {coin: d[coin] for coin in keys if (cached[coin] is None)}
+            if missed:
+                start = time.monotonic()
+                out_data = self.batch_indicators.calculate(missed)
+                self.metrics.observe('compute_seconds', time.monotonic() - start, coin='all')
 
-            close_prices_all = []
-            for candle in d[coin]:
-                close_prices_all.append(candle[4])
+        for coin in keys:
+            start = time.monotonic()
 
+            if (cached[coin] is not None):
+                out_data[coin] = cached[coin]
 
-            close_prices = close_prices_all[:(self.app_variables['display_window'])]
-            close_prices.reverse()
-            out_data[coin]['close_prices'] = close_prices
+            # only the candles newer than the last refresh are applied, falls
+            # back to the full recompute until there is enough history
+            elif (self.indicator_backend == 'streaming'):
+                out_data[coin] = self.indicator_engine.update(coin, d[coin])
 
-            out_data[coin]['emas_long'] = self.calculateFullEMAs(close_prices_all, self.app_variables['periods_long'])
-            out_data[coin]['emas_short'] = self.calculateFullEMAs(close_prices_all, self.app_variables['periods_short'])
-            out_data[coin]['macds'] = self.calculateFullMACDs(out_data[coin]['emas_long'], out_data[coin]['emas_short'])
-            out_data[coin]['macds_signal'] = self.calculateFullMACDSignals(out_data[coin]['macds'], self.app_variables['periods_signal'])
-            out_data[coin]['rsis'] = self.calculateFullRSIs(d[coin], self.app_variables['periods_rsi'])
+            if out_data.get(coin) is None:
+                out_data[coin] = self.calculateCoinData(d[coin])
 
-            self.evaluateMarketConditions(coin, out_data[coin])
+            if (cached[coin] is None):
+                self.indicator_cache.put(keys[coin], out_data[coin])
+            self.last_keys[(coin, timeframe)] = keys[coin]
+
+            computed[coin] = time.monotonic()
+            self.metrics.observe('compute_seconds', computed[coin] - start, coin=coin)
+
+        if signals:
+            self.evaluateMarketConditions(out_data, {coin: trace + (computed[coin],) for coin in computed})
+
+        trace = trace + (time.monotonic(),)
+        if self.buffers:
+            # only the sequence numbers go through the Pipe
+            seqs = {coin: self.buffers.write(coin, out_data[coin]) for coin in out_data}
+            self.sendMessage('gui', DisplayUpdate(seqs, time.time(), trace))
+        else:
+            self.sendMessage('gui', Message(DISPLAY_DATA, {'sent': time.time(), 'coins': out_data}, trace))
+
+
+
+    # resamples new candles into the higher timeframes and updates the
+    # indicators and signals of every bar that changed, always with the
+    # streaming engine keyed by (coin, timeframe)
+    #   d --> {coin: [new candles]} newest first
+    def calculateTimeframes(self, d, signals=True):
+        if not(self.resampler):
+            return
+
+        needed = self.indicator_engine.required + 1
+        updated = {}        # timeframe --> {coin: values}
+
+        for coin in d:
+            changed, revised = self.resampler.add(coin, reversed(d[coin]))
 
+            for timeframe in changed:
+                bars = self.resampler.bars(coin, timeframe, needed)
 
-        self.sendMessage('gui', m='display-data', d=out_data)
+                # the engine only follows revisions of the newest bar
+                if (timeframe in revised):
+                    self.indicator_engine.reset((coin, timeframe))
+
+                key = self.indicator_cache.key(coin, timeframe, bars, self.indicator_params)
+                if (key == self.last_keys.get((coin, timeframe))):
+                    continue
+
+                values = self.indicator_cache.get(key)
+                if (values is None):
+                    values = self.indicator_engine.update((coin, timeframe), bars)
+                    if (values is None):
+                        continue
+                    self.indicator_cache.put(key, values)
+                self.last_keys[(coin, timeframe)] = key
+
+                self.timeframe_data.setdefault(coin, {})[timeframe] = values
+                updated.setdefault(timeframe, {})[coin] = values
+
+        # {coin: {timeframe: {strategy: (BUY_SIGNAL / SELL_SIGNAL, kind)}}}
+        if signals:
+            for timeframe in updated:
+                results = self.strategies.evaluate(updated[timeframe])
+                for coin in updated[timeframe]:
+                    self.timeframe_signals.setdefault(coin, {})[timeframe] = results.get(coin, {})
+
+
+
+    # indicator values of the newest bar of a resampled timeframe, None until
+    # the timeframe has enough bars --> {series: [values]}
+    def timeframeValues(self, coin, timeframe):
+        return self.timeframe_data.get(coin, {}).get(timeframe)
+
+
+
+    # signals of the newest bar of a resampled timeframe
+    # --> {strategy: (BUY_SIGNAL / SELL_SIGNAL, kind)}, empty without any
+    def timeframeSignals(self, coin, timeframe):
+        return self.timeframe_signals.get(coin, {}).get(timeframe, {})
+
+
+
+    # calculate all data for a single coin from scratch
+    def calculateCoinData(self, candles):
+        out_data = {}
+
+        close_prices_all = []
+        for candle in candles:
+            close_prices_all.append(candle[4])
+
+
+        close_prices = close_prices_all[:(self.app_variables['display_window'])]
+        close_prices.reverse()
+        out_data['close_prices'] = close_prices
+
+        out_data['emas_long'] = self.calculateFullEMAs(close_prices_all, self.app_variables['periods_long'])
+        out_data['emas_short'] = self.calculateFullEMAs(close_prices_all, self.app_variables['periods_short'])
+        out_data['macds'] = self.calculateFullMACDs(out_data['emas_long'], out_data['emas_short'])
+        out_data['macds_signal'] = self.calculateFullMACDSignals(out_data['macds'], self.app_variables['periods_signal'])
+        out_data['rsis'] = self.calculateFullRSIs(candles, self.app_variables['periods_rsi'])
+
+        return out_data
 
 
 
@@ -203,79 +428,13 @@ class Data:
 
 
 
-    def evaluateMarketConditions(self, coin, d):
+    # runs every strategy on the latest values of the coins and sends their
+    # signals, tagged with the strategy id
+    #   d --> {coin: values}, traces --> {coin: stamps of the candle message}
+    def evaluateMarketConditions(self, d, traces=None):
+        results = self.strategies.evaluate(d)
 
-        # check if price > ema_short > ema_long
-        def checkPriceEMA(_d):
-            if ((_d['close_prices'][-1] > _d['emas_short'][-1]) and (_d['emas_short'][-1] > _d['emas_long'][-1])):
-                return True
-            return False
-
-        # check if macd line is above the macd signal line
-        def checkMACD(_d):
-            if (_d['macds'][-1] > _d['macds_signal'][-1]):
-                return True
-            return False
-
-        # check if rsi is above the crossover value --> indicatind a positive trend
-        def checkRSI(_d):
-            if (_d['rsis'][-1] > self.app_variables['rsi_crossover']):
-                return True
-            return False
-
-        # check if macd line crosses from below to above the macd signal line
-        def checkMACDCrossoverBuy(_d):
-            if (_d['macds'][-1] > _d['macds_signal'][-1]) and (_d['macds'][-2] < _d['macds_signal'][-2]):
-                return True
-            return False
-
-        # check if macd line crosses from above to below the macd signal line
-        def checkMACDCrossoverSell(_d):
-            if (_d['macds'][-1] < _d['macds_signal'][-1]) and (_d['macds'][-2] > _d['macds_signal'][-2]):
-                return True
-            return False
-
-        # check if rsi crosses from below to above the crossover value --> indicating shift to positive trend
-        def checkRSICrossoverBuy(_d):
-            if (_d['rsis'][-1] > self.app_variables['rsi_crossover']) and (_d['rsis'][-2] < self.app_variables['rsi_crossover']):
-                return True
-            return False
-
-        # check if rsi crosses from above to below the crossover value --> indicating shift to negative trend
-        def checkRSICrossoverSell(_d):
-            if (_d['rsis'][-1] < self.app_variables['rsi_crossover']) and (_d['rsis'][-2] > self.app_variables['rsi_crossover']):
-                return True
-            return False
-
-
-        def checkPriceEMACrossoverBuy(_d):
-            if not((_d['close_prices'][-2] > _d['emas_short'][-2]) and (_d['emas_short'][-2] > _d['emas_long'][-2])):
-                return True
-            return False
-
-
-
-
-        # evaluate buy conditions
-        if checkPriceEMA(d):
-            if checkMACDCrossoverBuy(d) and checkRSI(d):
-                self.sendMessage('trader', 'buy-signal-macd', coin)
-                return
-
-            if checkRSICrossoverBuy(d) and checkMACD(d):
-                self.sendMessage('trader', 'buy-signal-rsi', coin)
-                return
-
-            if checkPriceEMACrossoverBuy(d) and checkMACD(d) and checkRSI(d):
-                self.sendMessage('trader', 'buy-signal-ema', coin)
-                return
-
-
-
-        if checkMACDCrossoverSell(d):
-            self.sendMessage('trader', 'sell-signal-macd', coin)
-            return
-
-        if checkRSICrossoverSell(d):
-            self.sendMessage('trader', 'sell-signal-rsi', coin)
-            return
+        for coin in results:
+            for strategy, (op, kind) in results[coin].items():
+                self.metrics.inc('signals_total', coin=coin, kind=kind, strategy=strategy, side=('buy' if (op == BUY_SIGNAL) else 'sell'))
+                self.sendMessage('trader', Signal(op, coin, kind, strategy, traces.get(coin, ()) if traces else ()))
@@ -10,10 +10,14 @@
 
 
 # ==== MODULES
-from resources.message import Message
+from resources.message import Signal, Dispatcher, sendMessage, recvMessage
+from resources.message import DISPLAY_DATA, DISPLAY_UPDATE, BUY_SIGNAL, SELL_SIGNAL
+from resources.metrics import Metrics
 
 import tkinter as tk
 from tkinter.ttk import *
+import numpy as np
+import time
 import matplotlib
 matplotlib.use("TkAgg")
 
@@ -26,14 +30,36 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
 
 class GUI(tk.Frame):
-    def __init__(self, app_vars, d_conn, t_conn):
-        self.data_connection = d_conn
+    def __init__(self, app_vars, d_conns, t_conn, buffers=None):
+        self.data_connections = d_conns     # one Pipe per data worker, each sends its own coins
         self.trader_connection = t_conn
 
+        # shared memory buffers written by the data process, None --> pickled data
+        self.buffers = buffers
+
         self.app_variables = app_vars
 
         self.refresh_rate = 5000    # 5 seconds
 
+        # message handlers by opcode
+        self.dispatcher = Dispatcher()
+        self.dispatcher.register(DISPLAY_DATA, self.queueDisplayData)
+        self.dispatcher.register(DISPLAY_UPDATE, self.queueDisplayUpdate)
+
+        # newest snapshot per coin waiting to be drawn, older ones are dropped
+        self.pending = {}           # coin --> {series: values}
+        self.pending_seqs = {}      # coin --> seq in the shared buffers
+        self.render_scheduled = False
+
+        # intake stats shown in the main window
+        self.backlog = 0            # messages waiting in the last drain
+        self.max_backlog = 0
+        self.data_sent = {}         # coin --> when the shown data was sent
+
+        # latency histograms, traces of the messages waiting to be drawn
+        self.metrics = Metrics('gui', app_vars.get('metrics_dir'))
+        self.pending_traces = []
+
         # signal line data used to display in the graphs
         self.zero_list = [0 for i in range(0, app_vars['display_window'])]
         self.rsi_crossover_list = [app_vars['rsi_crossover'] for i in range(0, app_vars['display_window'])]
@@ -52,8 +78,13 @@ class GUI(tk.Frame):
         self.root = tk.Tk(className="Palio")
         tk.Frame.__init__(self, self.root)
 
-        # set interval for checking for messages
-        self.root.after(1000, self.checkForMessages)
+        # wake up as soon as a message arrives on any Pipe, platforms
+        # without Tk file handlers (Windows) fall back to polling
+        try:
+            for conn in (self.data_connections + [self.trader_connection]):
+                self.root.tk.createfilehandler(conn, tk.READABLE, lambda f, mask, c=conn: self.readConnection(c))
+        except (AttributeError, tk.TclError):
+            self.root.after(1000, self.checkForMessages)
 
         # initialize the windows
         self.initializeWindows()
@@ -64,49 +95,167 @@ class GUI(tk.Frame):
 
 
 
+    # called by Tk when a Pipe has data waiting, reads everything that is
+    # queued and draws once for the newest data
+    def readConnection(self, conn):
+        if not(self.drainConnection(conn)):
+            # the other process is gone, stop watching its Pipe
+            self.root.tk.deletefilehandler(conn)
+
+        self.scheduleRender()
+
+
+
+
     # checks for incoming messages from the data and trader processes
     def checkForMessages(self):
+        for conn in self.data_connections:
+            self.drainConnection(conn)
+        self.drainConnection(self.trader_connection)
+        self.scheduleRender()
 
-        if self.data_connection.poll():
-            try:
-                msg = self.data_connection.recv()
-                self.handleMessage(msg)
-            except:
-                pass
+        self.root.after(self.refresh_rate, self.checkForMessages)
 
 
-        if self.trader_connection.poll():
-            try:
-                msg = self.trader_connection.recv()
-                self.handleMessage(msg)
-            except:
-                pass
 
-        self.root.after(self.refresh_rate, self.checkForMessages)
+    # handles every message waiting on a Pipe, returns False once it is closed
+    def drainConnection(self, conn):
+        count = 0
+        try:
+            while conn.poll():
+                msg = recvMessage(conn)
+                count += 1
+                try:
+                    self.handleMessage(msg)
+                except Exception as e:
+                    print(e)
+        except (EOFError, OSError):
+            return False
+        finally:
+            if count:
+                self.backlog = count
+                self.max_backlog = max(self.max_backlog, count)
+
+        return True
+
+
+
+    # display messages only replace the pending snapshot of their coins
+    def queueDisplayData(self, m):
+        self.traceDisplay(m)
+        for coin in m.data['coins']:
+            self.pending[coin] = m.data['coins'][coin]
+            self.data_sent[coin] = m.data['sent']
+
+
+
+    def queueDisplayUpdate(self, m):
+        self.traceDisplay(m)
+        for coin in m.seqs:
+            self.pending_seqs[coin] = m.seqs[coin]
+            self.data_sent[coin] = m.sent
+
+
 
+    def traceDisplay(self, m):
+        if m.trace:
+            self.metrics.observe('ipc_seconds', time.monotonic() - m.trace[-1], route='data-gui')
+            self.pending_traces.append(m.trace)
 
 
 
-    # creates a message object and routes that through the correct
-    # Pipe
-    def sendMessage(self, to, m='', d=''):
-        message = Message(m, d)
+    def scheduleRender(self):
+        if (self.pending or self.pending_seqs) and not(self.render_scheduled):
+            self.render_scheduled = True
+            self.root.after_idle(self.renderPending)
+
+
+
+    # draws the coins that changed since the last render
+    def renderPending(self):
+        self.render_scheduled = False
+
+        start = time.monotonic()
+        d = self.pending
+        self.pending = {}
+        if self.pending_seqs:
+            d.update(self.sharedData(self.pending_seqs))
+            self.pending_seqs = {}
+
+        self.displayData(d)
+        self.updateStatus()
+
+        drawn = time.monotonic()
+        self.metrics.observe('render_seconds', drawn - start)
+        for trace in self.pending_traces:
+            self.metrics.observe('pipeline_seconds', drawn - trace[0], stage='display')
+        self.pending_traces = []
+
+
+
+    # backlog of the last drain and age of the oldest data on screen
+    def updateStatus(self):
+        age = (time.time() - min(self.data_sent.values())) if self.data_sent else 0.0
+        self.status_label.config(text=f'backlog {self.backlog} (max {self.max_backlog})   data age {age:.1f}s')
+
+
+
+    def refreshStatus(self):
+        self.updateStatus()
+        self.root.after(1000, self.refreshStatus)
+
+
+
+    def writeMetrics(self):
+        self.metrics.set('pipe_backlog', self.backlog)
+        self.metrics.set('pipe_backlog_max', self.max_backlog)
+        self.metrics.write()
+        self.root.after(int(self.app_variables['metrics_interval'] * 1000), self.writeMetrics)
+
+
+
+
+    # routes a message through the correct Pipe
+    def sendMessage(self, to, message):
 
         if (to == 'trader'):
             #print('MESSAGE: gui --> trader')
-            self.trader_connection.send(message)
+            sendMessage(self.trader_connection, message)
 
         if (to == 'data'):
             #print('MESSAGE: gui --> data')
-            self.data_connection.send(message)
+            for conn in self.data_connections:
+                sendMessage(conn, message)
 
 
 
     # handles incoming messages
     def handleMessage(self, m):
+        self.dispatcher.dispatch(m)
+
 
-        if (m.message == 'display-data'):
-            self.displayData(m.data)
+
+    # reads the coins the data process updated in the shared buffers
+    #   seqs --> {coin: sequence number}
+    def sharedData(self, seqs):
+        d = {}
+        for coin in seqs:
+            for i in range(0, 3):
+                seq, views = self.buffers.read(coin)
+                if (seq is None):
+                    break
+
+                # copied out of the shared block (nothing is unpickled), the
+                # data process may start the next write while it is copied
+                values = {series: np.frombuffer(views[series], dtype=np.float64).copy() for series in views}
+
+                # only a copy with no write in between is drawn, otherwise
+                # try again, the coin is skipped after that
+                if (self.buffers.sequence(coin) == seq):
+                    d[coin] = values
+                    break
+
+        return d
 
 
 
@@ -119,103 +268,204 @@ class GUI(tk.Frame):
 
         r = 1
         btc_label = tk.Label(self.root, text='BTCUSD', fg='black').grid(row=r, column=0)
-        btc_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', 'buy-signal-manual', 'btcusd')).grid(row=r, column=1)
-        btc_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', 'sell-signal-manual', 'btcusd')).grid(row=r, column=2)
+        btc_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', Signal(BUY_SIGNAL, 'btcusd', 'manual'))).grid(row=r, column=1)
+        btc_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', Signal(SELL_SIGNAL, 'btcusd', 'manual'))).grid(row=r, column=2)
 
         r += 1
         eth_label = tk.Label(self.root, text='ETHUSD', fg='black').grid(row=r, column=0)
-        eth_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', 'buy-signal-manual', 'ethusd')).grid(row=r, column=1)
-        eth_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', 'sell-signal-manual', 'ethusd')).grid(row=r, column=2)
+        eth_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', Signal(BUY_SIGNAL, 'ethusd', 'manual'))).grid(row=r, column=1)
+        eth_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', Signal(SELL_SIGNAL, 'ethusd', 'manual'))).grid(row=r, column=2)
 
         r += 1
         ltc_label = tk.Label(self.root, text='LTCUSD', fg='black').grid(row=r, column=0)
-        ltc_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', 'buy-signal-manual', 'ltcusd')).grid(row=r, column=1)
-        ltc_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', 'sell-signal-manual', 'ltcusd')).grid(row=r, column=2)
+        ltc_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', Signal(BUY_SIGNAL, 'ltcusd', 'manual'))).grid(row=r, column=1)
+        ltc_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', Signal(SELL_SIGNAL, 'ltcusd', 'manual'))).grid(row=r, column=2)
 
         r += 1
         fil_label = tk.Label(self.root, text='FILUSD', fg='black').grid(row=r, column=0)
-        fil_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', 'buy-signal-manual', 'filusd')).grid(row=r, column=1)
-        fil_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', 'sell-signal-manual', 'filusd')).grid(row=r, column=2)
+        fil_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', Signal(BUY_SIGNAL, 'filusd', 'manual'))).grid(row=r, column=1)
+        fil_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', Signal(SELL_SIGNAL, 'filusd', 'manual'))).grid(row=r, column=2)
 
         r += 1
         link_label = tk.Label(self.root, text='LINKUSD', fg='black').grid(row=r, column=0)
-        link_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', 'buy-signal-manual', 'linkusd')).grid(row=r, column=1)
-        link_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', 'sell-signal-manual', 'linkusd')).grid(row=r, column=2)
+        link_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', Signal(BUY_SIGNAL, 'linkusd', 'manual'))).grid(row=r, column=1)
+        link_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', Signal(SELL_SIGNAL, 'linkusd', 'manual'))).grid(row=r, column=2)
 
         r += 1
         oxt_label = tk.Label(self.root, text='OXTUSD', fg='black').grid(row=r, column=0)
-        oxt_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', 'buy-signal-manual', 'oxtusd')).grid(row=r, column=1)
-        oxt_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', 'sell-signal-manual', 'oxtusd')).grid(row=r, column=2)
+        oxt_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', Signal(BUY_SIGNAL, 'oxtusd', 'manual'))).grid(row=r, column=1)
+        oxt_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', Signal(SELL_SIGNAL, 'oxtusd', 'manual'))).grid(row=r, column=2)
 
         r += 1
         ren_label = tk.Label(self.root, text='RENUSD', fg='black').grid(row=r, column=0)
-        ren_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', 'buy-signal-manual', 'renusd')).grid(row=r, column=1)
-        ren_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', 'sell-signal-manual', 'renusd')).grid(row=r, column=2)
+        ren_buy_btn = tk.Button(self.root, text='BUY', fg='black', command= lambda: self.sendMessage('trader', Signal(BUY_SIGNAL, 'renusd', 'manual'))).grid(row=r, column=1)
+        ren_sell_btn = tk.Button(self.root, text='SELL', fg='black', command= lambda: self.sendMessage('trader', Signal(SELL_SIGNAL, 'renusd', 'manual'))).grid(row=r, column=2)
+
+        r += 1
+        self.status_label = tk.Label(self.root, text='', fg='black')
+        self.status_label.grid(row=r, column=0, columnspan=3)
+        self.refreshStatus()
 
+        if self.app_variables.get('metrics_dir'):
+            self.root.after(int(self.app_variables['metrics_interval'] * 1000), self.writeMetrics)
 
 
         # create Toplevel windows for each active coin
         self.coin_windows = {}
 
         for coin in self.app_variables['coins']:
-            d = {
-                'WINDOW': tk.Toplevel(self.master),
-                'FIGURE': Figure(figsize=(6,8), dpi=100),
-                'X_VALS': [i for i in range(-self.app_variables['display_window'], 0)]
-            }
-
-            spec = matplotlib.gridspec.GridSpec(
-                ncols = 1,
-                nrows = 3,
-                height_ratios = [2,1,1],
-                hspace=0.3
-            )
-
-            d['PLOT_A'] = d['FIGURE'].add_subplot(spec[0])
-            d['PLOT_B'] = d['FIGURE'].add_subplot(spec[1])
-            d['PLOT_C'] = d['FIGURE'].add_subplot(spec[2])
-            d['PLOT_A'].set_title('PRICES')
-            d['PLOT_B'].set_title('MACD')
-            d['PLOT_C'].set_title('OSCILLATORS')
-            d['PLOT_C'].set_ylim([0, 100])
-
+            d = self.createPlots(coin)
+            d['WINDOW'] = tk.Toplevel(self.master)
             d['CANVAS'] = FigureCanvasTkAgg(d['FIGURE'], d['WINDOW'])
             d['CANVAS'].get_tk_widget().grid(row=0, column=0)
             d['WINDOW'].title(coin.upper())
+
+            # a window that comes back from being hidden shows the data it missed
+            d['WINDOW'].bind('<Map>', lambda e, coin=coin: self.windowShown(coin, e))
+            self.attachCanvas(coin, d)
+
             self.coin_windows[coin] = d
 
 
 
+    # figure, axes and line artists for a coin, created once and updated with
+    # set_ydata from then on. The reference lines never change so they are
+    # part of the saved background, the data lines are animated and blitted
+    # on top of it
+    def createPlots(self, coin):
+        window = self.app_variables['display_window']
+
+        d = {
+            'FIGURE': Figure(figsize=(6,8), dpi=100),
+            'X_VALS': [i for i in range(-window, 0)],
+            'BACKGROUND': None,     # figure without the data lines, for blitting
+            'STALE': False          # data arrived while the window was hidden
+        }
+
+        spec = matplotlib.gridspec.GridSpec(
+            ncols = 1,
+            nrows = 3,
+            height_ratios = [2,1,1],
+            hspace=0.3
+        )
+
+        d['PLOT_A'] = d['FIGURE'].add_subplot(spec[0])
+        d['PLOT_B'] = d['FIGURE'].add_subplot(spec[1])
+        d['PLOT_C'] = d['FIGURE'].add_subplot(spec[2])
+        d['PLOT_A'].set_title('PRICES')
+        d['PLOT_B'].set_title('MACD')
+        d['PLOT_C'].set_title('OSCILLATORS')
+        d['PLOT_C'].set_ylim([0, 100])
+        d['PLOT_A'].set_xlim([-window, -1])
+        d['PLOT_B'].set_xlim([-window, -1])
+        d['PLOT_C'].set_xlim([-window, -1])
+
+        empty = [float('nan')] * window
+
+        def line(plot, color, label):
+            return d[plot].plot(d['X_VALS'], empty, color=color, linewidth=0.5, label=label, animated=True)[0]
+
+        d['LINES'] = {
+            'close_prices': line('PLOT_A', 'blue', 'close'),
+            'emas_long': line('PLOT_A', 'red', 'ema long'),
+            'emas_short': line('PLOT_A', 'green', 'ema short'),
+            'macds': line('PLOT_B', 'green', 'macd'),
+            'macds_signal': line('PLOT_B', 'red', 'signal'),
+            'rsis': line('PLOT_C', 'green', 'rsi')
+        }
+
+        d['PLOT_B'].plot(d['X_VALS'], self.zero_list, color='blue', linestyle=':', linewidth=0.5)
+        d['PLOT_C'].plot(d['X_VALS'], self.rsi_crossover_list, color='orange', linestyle=':', linewidth=0.5)
+        d['PLOT_C'].plot(d['X_VALS'], self.rsi_oversold_list, color='blue', linestyle=':', linewidth=0.5)
+        d['PLOT_C'].plot(d['X_VALS'], self.rsi_overbought_list, color='blue', linestyle=':', linewidth=0.5)
+
+        d['PLOT_A'].legend(loc='upper left')
+        d['PLOT_B'].legend(loc='upper left')
+        d['PLOT_C'].legend(loc='upper left')
+
+        return d
+
+
+
+    # every full draw (first show, resize, rescaled axes) saves a new
+    # background and puts the data lines back on top of it
+    def attachCanvas(self, coin, d):
+        def onDraw(event):
+            d['BACKGROUND'] = d['CANVAS'].copy_from_bbox(d['FIGURE'].bbox)
+            self.drawLines(d)
+
+        d['CANVAS'].mpl_connect('draw_event', onDraw)
+
+
+
+    def drawLines(self, d):
+        for line in d['LINES'].values():
+            line.axes.draw_artist(line)
+        d['CANVAS'].blit(d['FIGURE'].bbox)
+
+
+
+    def windowShown(self, coin, e):
+        d = self.coin_windows[coin]
+        if (e.widget is d['WINDOW']) and d['STALE']:
+            self.renderCoin(coin)
+
+
+
+    # hidden or minimized windows are not drawn at all
+    def isVisible(self, d):
+        return bool(d['WINDOW'].winfo_viewable())
+
+
+
 
 
     # displays data to the corresponding plots and windows
     # computation is done in the data process and sent here via Pipe
+    # only the data lines are redrawn unless an axis has to be rescaled
     def displayData(self, d):
         for coin in d:
-            self.coin_windows[coin]['PLOT_A'].clear()
-            self.coin_windows[coin]['PLOT_B'].clear()
-            self.coin_windows[coin]['PLOT_C'].clear()
+            w = self.coin_windows[coin]
+            for series, line in w['LINES'].items():
+                line.set_ydata(d[coin][series])
+
+            if self.isVisible(w):
+                self.renderCoin(coin)
+            else:
+                w['STALE'] = True
+
+
+
+    def renderCoin(self, coin):
+        d = self.coin_windows[coin]
+        d['STALE'] = False
+
+        lines = d['LINES']
+        rescaled = self.fitLimits(d['PLOT_A'], (lines['close_prices'], lines['emas_long'], lines['emas_short']))
+        rescaled |= self.fitLimits(d['PLOT_B'], (lines['macds'], lines['macds_signal']))
+
+        if rescaled or (d['BACKGROUND'] is None):
+            d['CANVAS'].draw_idle()
+        else:
+            d['CANVAS'].restore_region(d['BACKGROUND'])
+            self.drawLines(d)
 
-            self.coin_windows[coin]['PLOT_A'].set_title('PRICES')
-            self.coin_windows[coin]['PLOT_B'].set_title('MACD')
-            self.coin_windows[coin]['PLOT_C'].set_title('OSCILLATORS')
-            self.coin_windows[coin]['PLOT_C'].set_ylim([0, 100])
 
-            self.coin_windows[coin]['PLOT_A'].plot(self.coin_windows[coin]['X_VALS'], d[coin]['close_prices'], color='blue', linewidth=0.5, label='close')
-            self.coin_windows[coin]['PLOT_A'].plot(self.coin_windows[coin]['X_VALS'], d[coin]['emas_long'], color='red', linewidth=0.5, label='ema long')
-            self.coin_windows[coin]['PLOT_A'].plot(self.coin_windows[coin]['X_VALS'], d[coin]['emas_short'], color='green', linewidth=0.5, label='ema short')
 
-            self.coin_windows[coin]['PLOT_B'].plot(self.coin_windows[coin]['X_VALS'], self.zero_list, color='blue', linestyle=':', linewidth=0.5)
-            self.coin_windows[coin]['PLOT_B'].plot(self.coin_windows[coin]['X_VALS'], d[coin]['macds'], color='green', linewidth=0.5, label='macd')
-            self.coin_windows[coin]['PLOT_B'].plot(self.coin_windows[coin]['X_VALS'], d[coin]['macds_signal'], color='red', linewidth=0.5, label='signal')
+    # keeps some room around the data so that small moves do not change the
+    # axis, returns True if the limits had to change
+    def fitLimits(self, plot, lines):
+        values = np.concatenate([np.asarray(line.get_ydata(), dtype=np.float64) for line in lines])
+        if not(np.isfinite(values).any()):
+            return False
 
-            self.coin_windows[coin]['PLOT_C'].plot(self.coin_windows[coin]['X_VALS'], self.rsi_crossover_list, color='orange', linestyle=':', linewidth=0.5)
-            self.coin_windows[coin]['PLOT_C'].plot(self.coin_windows[coin]['X_VALS'], self.rsi_oversold_list, color='blue', linestyle=':', linewidth=0.5)
-            self.coin_windows[coin]['PLOT_C'].plot(self.coin_windows[coin]['X_VALS'], self.rsi_overbought_list, color='blue', linestyle=':', linewidth=0.5)
-            self.coin_windows[coin]['PLOT_C'].plot(self.coin_windows[coin]['X_VALS'], d[coin]['rsis'], color='green', linewidth=0.5, label='rsi')
+        low = np.nanmin(values)
+        high = np.nanmax(values)
+        span = (high - low) or (abs(high) * 0.01) or 1.0
 
-            self.coin_windows[coin]['PLOT_A'].legend(loc='upper left')
-            self.coin_windows[coin]['PLOT_B'].legend(loc='upper left')
-            self.coin_windows[coin]['PLOT_C'].legend(loc='upper left')
+        bottom, top = plot.get_ylim()
+        if (low < bottom) or (high > top) or (span < (top - bottom) * 0.5):
+            plot.set_ylim([low - span * 0.1, high + span * 0.1])
+            return True
 
-            self.coin_windows[coin]['CANVAS'].draw()
+        return False
@@ -0,0 +1,84 @@
+# ================================================
+#   FILE: headless.py
+#
+#   Takes the place of the gui process when the app runs without windows
+#   (main.py --headless, tools/loadtest.py). Drains the display messages of
+#   every data worker as they arrive and reads the shared buffers the way
+#   the gui does, but draws nothing. The data workers never block on a full
+#   Pipe and the display stage keeps its latency metrics.
+#
+
+
+# ==== IMPORTS
+from resources.messageloop import MessageLoop
+from resources.message import Dispatcher, DISPLAY_DATA, DISPLAY_UPDATE
+from resources.metrics import Metrics
+
+import time
+
+
+
+
+class HeadlessGUI:
+    def __init__(self, app_vars, d_conns, t_conn, buffers=None):
+        self.data_connections = d_conns     # one Pipe per data worker
+        self.trader_connection = t_conn
+
+        # shared memory buffers written by the data process, None --> pickled data
+        self.buffers = buffers
+
+        self.app_variables = app_vars
+
+        # message handlers by opcode
+        self.dispatcher = Dispatcher()
+        self.dispatcher.register(DISPLAY_DATA, self.handleDisplayData)
+        self.dispatcher.register(DISPLAY_UPDATE, self.handleDisplayUpdate)
+
+        self.metrics = Metrics('headless', app_vars.get('metrics_dir'))
+        self.loop = None
+
+
+
+    # mainloop
+    def start(self):
+        self.loop = MessageLoop()
+        for conn in self.data_connections:
+            self.loop.addConnection(conn, self.dispatcher.dispatch)
+        self.loop.addConnection(self.trader_connection, self.dispatcher.dispatch)
+
+        if self.app_variables.get('metrics_dir'):
+            self.loop.addTimer(self.app_variables['metrics_interval'], self.writeMetrics)
+
+        self.loop.run()
+
+
+
+    def writeMetrics(self):
+        self.metrics.set('pipe_backlog', self.loop.backlog)
+        self.metrics.set('pipe_backlog_max', self.loop.max_backlog)
+        self.metrics.write()
+
+
+
+    def handleDisplayData(self, m):
+        self.metrics.inc('display_updates_total', len(m.data['coins']))
+        self.traceDisplay(m)
+
+
+
+    # the snapshots are read out of the shared buffers like the gui reads them
+    def handleDisplayUpdate(self, m):
+        for coin in m.seqs:
+            self.buffers.read(coin)
+
+        self.metrics.inc('display_updates_total', len(m.seqs))
+        self.traceDisplay(m)
+
+
+
+    # nothing is drawn, so the data is on display as soon as it is read
+    def traceDisplay(self, m):
+        if m.trace:
+            now = time.monotonic()
+            self.metrics.observe('ipc_seconds', now - m.trace[-1], route='data-gui')
+            self.metrics.observe('pipeline_seconds', now - m.trace[0], stage='display')
@@ -7,72 +7,192 @@
 
 
 # ==== IMPORTS
-from multiprocessing import Process, Pipe
+import time
+LAUNCHED = time.monotonic()     # for --profile-startup
 
-from data import Data
-from gui import GUI
-from trader import Trader
+from multiprocessing import Process, Pipe
+from resources.sharding import HashRing
 
+import argparse
+import importlib
 import os
-
-
-
+import sys
+
+
+
+# ==== APP VARIABLES
+
+# shared by the app and the offline tools (backtest, optimizer)
+APP_VARIABLES = {
+    'coins': ['btcusd', 'ethusd', 'ltcusd', 'filusd', 'linkusd', 'oxtusd', 'renusd'],
+    'timeframe': '1m',
+    'resample_timeframes': [],  # e.g. ['5m', '15m', '1h'] built from the 1m candles, read with Data.timeframeValues
+    'data_workers': 2,          # data processes, coins are split between them by consistent hashing
+    'indicator_backend': 'streaming',    # 'streaming', 'numpy' or 'python'
+    'display_window': 60,
+    'gui_transport': 'pipe',    # 'pipe' --> pickled data, 'shm' --> shared memory buffers
+    'candle_history': 1440,     # candles kept in memory per coin by the data process
+    'indicator_cache_bytes': 0,     # indicator results kept by candle fingerprint, 0 --> off (rarely hits live)
+    'candle_store': 'database/candles',     # memory-mapped candle files, None --> off
+    'periods_long': 26,
+    'periods_short': 12,
+    'periods_signal': 9,
+    'periods_rsi': 20,
+    'ema_smoothing': 2,
+    'rsi_crossover': 50,
+    'rsi_oversold': 25,
+    'rsi_overbought': 75,
+    'strategies': None,         # {id: {'buy': [[kind, rule]], 'sell': ...}} traded side by side, None --> DEFAULT_STRATEGIES in resources/strategies.py
+    'stop_loss_percent': 0.01,
+    'max_positions_per_coin': 1,
+    'journal': 'database/journal.db',   # sqlite trade journal
+    'journal_sync_interval': 5,         # seconds between syncs to disk, 0 --> every trade
+    'effects_queue_size': 64,           # queued prints before they are dropped
+    'sounds': True,                     # buy / sell notification sounds
+    'metrics_dir': 'database/metrics',  # {process}.prom stats files, None --> off
+    'metrics_interval': 10,             # seconds between writes
+    'base_url': 'https://api.gemini.com/',     # rest api, tools/mock_exchange.py serves a local one
+    'pull_interval': 60,        # seconds between candle pulls
+    'api_rate_limit': 2.0,      # requests per second, public api allows 120 / minute
+    'api_burst': 5,
+    'fetch_workers': 8,
+    'connect_timeout': 3.05,    # seconds
+    'read_timeout': 10,         # seconds
+    'request_retries': 3,
+    'market_data': 'rest',      # 'rest' or 'stream' --> WebSocket top of book
+    'ws_url': 'wss://api.gemini.com/v2/marketdata',
+    'quote_max_age': 5,         # seconds before a streamed quote falls back to REST
+    'round_amounts': {
+        'btcusd': 2,
+        'ethusd': 2,
+        'ltcusd': 2,
+        'filusd': 4,
+        'linkusd': 5,
+        'oxtusd': 5,
+        'renusd': 5
+    }
+}
+
+
+
+# ==== PROCESSES
+
+# process name --> (module, class), each module is only imported by its own
+# process so the data and trader processes never load Tk or matplotlib
+PROCESSES = {
+    'data': ('data', 'Data'),
+    'trader': ('trader', 'Trader'),
+    'gui': ('gui', 'GUI'),
+    'headless': ('headless', 'HeadlessGUI')
+}
+
+# modules worth knowing about when they show up in a process
+HEAVY_MODULES = ('tkinter', 'matplotlib', 'numpy', 'pandas', 'requests', 'playsound')
+
+
+
+# process target --> imports and creates the client, then runs its mainloop
+# label --> name printed for --profile-startup, defaults to the process name
+def runProcess(name, args, profile=False, label=None):
+    start = time.monotonic()
+    module, cls = PROCESSES[name]
+    client_class = getattr(importlib.import_module(module), cls)
+
+    imported = time.monotonic()
+    client = client_class(*args)
+    created = time.monotonic()
+
+    if profile:
+        heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+        print(f"STARTUP[{label or name}]::import {imported - start:.3f}s   init {created - imported:.3f}s   "
+              f"ready {created - LAUNCHED:.3f}s after launch   loaded: {', '.join(heavy) or '-'}")
+
+    client.start()
+
+
+
+# headless --> the display data is only drained and timed, nothing is drawn
+# app_variables --> defaults to APP_VARIABLES
 class MainApp:
-    def __init__(self):
+    def __init__(self, profile=False, headless=False, app_variables=None):
 
         # app variables
-        app_variables = {
-            'coins': ['btcusd', 'ethusd', 'ltcusd', 'filusd', 'linkusd', 'oxtusd', 'renusd'],
-            'timeframe': '1m',
-            'display_window': 60,
-            'periods_long': 26,
-            'periods_short': 12,
-            'periods_signal': 9,
-            'periods_rsi': 20,
-            'ema_smoothing': 2,
-            'rsi_crossover': 50,
-            'rsi_oversold': 25,
-            'rsi_overbought': 75,
-            'stop_loss_percent': 0.01,
-            'round_amounts': {
-                'btcusd': 2,
-                'ethusd': 2,
-                'ltcusd': 2,
-                'filusd': 4,
-                'linkusd': 5,
-                'oxtusd': 5,
-                'renusd': 5
-            }
-        }
+        app_variables = dict(app_variables or APP_VARIABLES)
 
         # create Pipe connections
-        dt_conn, td_conn = Pipe()
-        dg_conn, gd_conn = Pipe()
         gt_conn, tg_conn = Pipe()
 
-        # initialize client classes
-        data_client = Data(app_variables, dt_conn, dg_conn)
-        trader_client = Trader(app_variables, td_conn, tg_conn)
-        gui_client = GUI(app_variables, gd_conn, gt_conn)
+        # shared memory blocks for the indicator data shown by the gui
+        self.buffers = None
+        if (app_variables['gui_transport'] == 'shm'):
+            from resources.sharedbuffers import IndicatorBuffers
+            self.buffers = IndicatorBuffers(app_variables['coins'], app_variables['display_window'])
 
-        self.data_process = Process(target=data_client.start, args=())
-        self.trader_process = Process(target=trader_client.start, args=())
-        self.gui_process = Process(target=gui_client.start, args=())
+        # one data process per worker that owns coins, each only sees its
+        # own coins and has its own Pipes to the trader and the gui
+        shards = HashRing(range(0, app_variables['data_workers'])).assign(app_variables['coins'])
 
+        self.data_processes = []
+        td_conns = {}
+        gd_conns = []
+        for worker in shards:
+            if not(shards[worker]):
+                continue
 
+            dt_conn, td_conns[worker] = Pipe()
+            dg_conn, gd_conn = Pipe()
+            gd_conns.append(gd_conn)
 
-    def start(self):
-        # start processes
-        self.data_process.start()
+            worker_variables = dict(app_variables, coins=shards[worker], data_worker=worker)
+            self.data_processes.append(Process(target=runProcess, args=('data', (worker_variables, dt_conn, dg_conn, self.buffers), profile, f'data-{worker}')))
+
+        # the clients are created inside their own processes
+        self.trader_process = Process(target=runProcess, args=('trader', (app_variables, td_conns, tg_conn), profile))
+        self.gui_process = Process(target=runProcess, args=(('headless' if headless else 'gui'), (app_variables, gd_conns, gt_conn, self.buffers), profile))
+
+
+
+    # starts the processes without waiting on them
+    def launch(self):
+        for process in self.data_processes:
+            process.start()
         self.trader_process.start()
         self.gui_process.start()
 
+
+
+    def start(self):
+        self.launch()
         self.gui_process.join()
 
+        if self.buffers:
+            self.buffers.close()
+
+
+
+    # ends every process, for runs that are not closed from the gui --> in
+    # pipeline order so nothing writes to a Pipe whose reader is gone. The
+    # trader handles the SIGTERM and writes out its queued trades first.
+    def stop(self):
+        for process in [self.trader_process] + self.data_processes + [self.gui_process]:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+        if self.buffers:
+            self.buffers.close()
+
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile-startup', action='store_true', help='print import and init time for each process')
+    parser.add_argument('--headless', action='store_true', help='run without the gui windows')
+    args = parser.parse_args()
+
     os.system('clear')
 
-    app = MainApp()
+    app = MainApp(args.profile_startup, args.headless)
+    if args.profile_startup:
+        print(f'STARTUP[main]::ready {time.monotonic() - LAUNCHED:.3f}s after launch')
     app.start()
@@ -0,0 +1,519 @@
+# ================================================
+#   FILE: optimize.py
+#
+#   Parameter sweep over the strategy settings in APP_VARIABLES
+#   (periods_long, periods_short, periods_signal, periods_rsi, rsi_crossover,
+#   stop_loss_percent) on stored candles. Runs a grid or random search on a
+#   process pool and prints a table ranked by PnL.
+#
+#       python optimize.py
+#       python optimize.py --random 2000 --workers 8
+#       python optimize.py --candles database/history --param periods_rsi=10,14,20
+#
+#   The candles are copied once into a shared memory block that every worker
+#   maps, nothing is copied per task. The indicators are computed for the
+#   whole history at once with NumPy, giving the same last two values the
+#   streaming IndicatorEngine gives live, and the running EMAs are cached per
+#   period so parameter sets that share a period reuse them. Combinations are
+#   sorted so that each worker gets runs of tasks sharing their periods.
+#
+#   The buy and sell signals come from the strategy of app_variables
+#   ['strategies'] picked with --strategy (DEFAULT_STRATEGIES without any),
+#   its compiled rule graph evaluated over every candle at once. The rules
+#   can look one candle back (prev), as far as the indicator series go.
+#
+#   Trades are simulated like backtest.py with one position per coin: buys
+#   and signal sells at the close, trailing stops checked against the low.
+#
+
+
+# ==== IMPORTS
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from numpy.lib.stride_tricks import sliding_window_view
+
+from backtest import loadCandles
+from main import APP_VARIABLES
+from resources.indicators import IndicatorEngine
+from resources.strategies import DEFAULT_STRATEGIES, StrategyEngine
+
+import argparse
+import csv
+import itertools
+import os
+import random
+import time
+import numpy as np
+
+
+
+
+PARAMETERS = ('periods_long', 'periods_short', 'periods_signal', 'periods_rsi', 'rsi_crossover', 'stop_loss_percent')
+
+GRID = {
+    'periods_long': [20, 26, 34],
+    'periods_short': [8, 12, 16],
+    'periods_signal': [7, 9, 12],
+    'periods_rsi': [14, 20],
+    'rsi_crossover': [45, 50, 55],
+    'stop_loss_percent': [0.005, 0.01, 0.02]
+}
+
+# ranges for the random search --> (low, high), ints for periods
+RANGES = {
+    'periods_long': (18, 40),
+    'periods_short': (5, 17),
+    'periods_signal': (5, 14),
+    'periods_rsi': (7, 28),
+    'rsi_crossover': (40, 60),
+    'stop_loss_percent': (0.003, 0.03)
+}
+
+FIELDS = ('open', 'low', 'close')
+
+# candles after an entry checked for a stop in one vectorized pass
+HORIZON = 64
+
+
+
+
+# ==== WORKER STATE
+
+# set in every worker by attachWorker
+PRICES = {}             # coin --> {'open', 'low', 'close'} zero copy arrays
+BASE_VARIABLES = {}
+STRATEGY = None         # strategy id the signals come from
+CACHE = OrderedDict()   # (kind, coin, ...) --> array, least recently used first
+CACHE_BYTES = 256 * 2 ** 20
+
+
+
+def attachWorker(name, layout, app_vars, strategy):
+    global SHARED, STRATEGY
+    SHARED = shared_memory.SharedMemory(name=name)
+    BASE_VARIABLES.update(app_vars)
+    STRATEGY = strategy
+
+    for coin, (offset, n) in layout.items():
+        PRICES[coin] = {}
+        for i, field in enumerate(FIELDS):
+            PRICES[coin][field] = np.ndarray((n,), dtype=np.float64, buffer=SHARED.buf, offset=offset + i * n * 8)
+
+
+
+# results shared between parameter sets, kept under CACHE_BYTES per worker
+def cached(key, build):
+    if key in CACHE:
+        CACHE.move_to_end(key)
+        return CACHE[key]
+
+    value = build()
+    CACHE[key] = value
+    while (sum(cacheSize(v) for v in CACHE.values()) > CACHE_BYTES) and (len(CACHE) > 1):
+        CACHE.popitem(last=False)
+    return value
+
+
+
+def cacheSize(value):
+    if isinstance(value, tuple):
+        return sum(v.nbytes for v in value)
+    return value.nbytes
+
+
+
+
+# ==== INDICATORS FOR THE WHOLE HISTORY
+
+# running ema over a series, seeded with its first value
+def runningEMA(values, periods, smoothing):
+    k = smoothing / (1 + periods)
+    a = 1 - k
+
+    out = np.empty(len(values))
+    last = values[0]
+    for i, value in enumerate(values.tolist()):
+        last = k * value + a * last
+        out[i] = last
+    return out
+
+
+
+# sliding sum over `periods` values ending at each index (nan before that)
+def slidingSum(values, periods):
+    out = np.full(len(values), np.nan)
+    out[(periods - 1):] = sliding_window_view(values, periods).sum(axis=1)
+    return out
+
+
+
+# the last two values of every indicator the live engine would give with the
+# window ending at each candle --> {name: (current, previous)} arrays
+def indicatorSeries(coin, app_vars):
+    prices = PRICES[coin]
+    close = prices['close']
+    w = app_vars['display_window']
+    smoothing = app_vars['ema_smoothing']
+    p_long = app_vars['periods_long']
+    p_short = app_vars['periods_short']
+    p_signal = app_vars['periods_signal']
+    p_rsi = app_vars['periods_rsi']
+
+    engine = IndicatorEngine(app_vars)
+
+    def shift(values, n):
+        out = np.full(len(values), np.nan)
+        out[n:] = values[:(len(values) - n)]
+        return out
+
+    # ema with the moving sma seed --> T[n] + a^W * (seed - T[n - W])
+    def emaPair(periods):
+        t = cached(('ema', coin, periods), lambda: runningEMA(close, periods, smoothing))
+        seed = shift(cached(('sum', coin, periods), lambda: slidingSum(close, periods)), w) / periods
+        a = 1 - smoothing / (1 + periods)
+        delta = seed - shift(t, w)
+        return t, delta, (t + a ** w * delta), (shift(t, 1) + a ** (w - 1) * delta)
+
+    t_long, delta_long, ema_long, ema_long_prev = emaPair(p_long)
+    t_short, delta_short, ema_short, ema_short_prev = emaPair(p_short)
+
+    # the signal ema is linear, so it is the difference of the signal emas
+    # of the two running emas, each cached per (period, signal period)
+    g = (cached(('signal', coin, p_short, p_signal), lambda: runningEMA(t_short, p_signal, smoothing))
+         - cached(('signal', coin, p_long, p_signal), lambda: runningEMA(t_long, p_signal, smoothing)))
+    m = t_short - t_long
+    a = 1 - smoothing / (1 + p_signal)
+    start = shift(m, w - 1) - shift(g, w - 1)
+
+    def signalAt(i, g_at):
+        return g_at + a ** i * start + delta_short * engine.carry_short[i] - delta_long * engine.carry_long[i]
+
+    signal = signalAt(w - 1, g)
+    signal_prev = signalAt(max(w - 2, 1), shift(g, 1) if (w > 2) else g)
+
+    # rsi over the candle bodies
+    def rsiSeries():
+        chng = prices['open'] - close
+        avg_up = slidingSum(np.where(chng > 0, 0.0, -chng), p_rsi) / p_rsi
+        avg_down = slidingSum(np.where(chng > 0, chng, 0.0), p_rsi) / p_rsi
+        rs = avg_up / np.where(avg_down == 0, 1, avg_down)
+        return 100 - (100 / (1 + rs))
+
+    rsi = cached(('rsi', coin, p_rsi), rsiSeries)
+
+    return {
+        'close_prices': (close, shift(close, 1)),
+        'emas_long': (ema_long, ema_long_prev),
+        'emas_short': (ema_short, ema_short_prev),
+        'macds': (ema_short - ema_long, ema_short_prev - ema_long_prev),
+        'macds_signal': (signal, signal_prev),
+        'rsis': (rsi, shift(rsi, 1))
+    }
+
+
+
+# the strategies of the app variables compiled with one parameter set, the
+# rule constants (rsi_crossover) depend on it
+def strategyEngine(app_vars, strategy):
+    engine = StrategyEngine(app_vars.get('strategies') or DEFAULT_STRATEGIES, app_vars)
+    if strategy not in engine.rules:
+        raise ValueError(f'unknown strategy {strategy}, expected one of {", ".join(engine.rules)}')
+
+    # indicatorSeries only gives the current and the previous value
+    if (engine.depth > 2):
+        raise ValueError(f'the strategies look back {engine.depth - 1} candles, the sweep supports 1')
+
+    return engine
+
+
+
+# Data.evaluateMarketConditions for every candle at once
+# returns (buy indices, sell indices) from the first candle with full history
+def signalIndices(coin, app_vars, engine, strategy):
+    s = indicatorSeries(coin, app_vars)
+    close = s['close_prices'][0]
+
+    # the comparisons are False on the nan values before the history is full
+    inputs = {(name, lag): s[name][lag] for name, lag in engine.inputs}
+    buy, sell = engine.evaluateArrays(strategy, inputs, len(close))
+
+    valid = np.zeros(len(close), dtype=bool)
+    valid[(IndicatorEngine(app_vars).required - 1):] = True
+
+    return np.flatnonzero(buy & valid), np.flatnonzero(sell & valid)
+
+
+
+
+# ==== TRADE SIMULATION
+
+# StopEngine.calculateStop for arrays of highs, values that land on a rounding
+# tie go through the python round so they round the same as live
+def trailingStops(highs, percent, digits):
+    values = highs - (highs * percent)
+    stops = np.round(values, digits)
+
+    scaled = values * 10 ** digits
+    tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if tie.any():
+        ties, where = np.unique(values[tie], return_inverse=True)
+        stops[tie] = np.array([round(value, digits) for value in ties.tolist()])[where]
+    return stops
+
+
+
+# first candle in [j, end) whose low goes under the stop trailing the highest
+# close, starting from the high `top` --> None if the stop is not hit
+def scanStop(close, low, j, end, top, percent, digits):
+    chunk = HORIZON
+    while (j < end):
+        k = min(end, j + chunk)
+        highs = np.maximum.accumulate(np.concatenate(([top], close[j:(k - 1)])))
+        hit = np.flatnonzero(low[j:k] < trailingStops(highs, percent, digits))
+        if len(hit):
+            return j + int(hit[0])
+        top = max(highs[-1], close[k - 1])
+        j = k
+        chunk *= 2
+    return None
+
+
+
+# stop loss exit candle for a position opened at each entry, looking no
+# further than its limit candle --> n if the stop is not hit by then
+# the first HORIZON candles are checked for every entry at once
+def stopExits(close, low, entries, limits, percent, digits):
+    n = len(close)
+    steps = np.arange(HORIZON)
+
+    highs = np.maximum.accumulate(close[np.minimum(entries[:, None] + steps, n - 1)], axis=1)
+    after = entries[:, None] + steps + 1
+    hit = (low[np.minimum(after, n - 1)] < trailingStops(highs, percent, digits)) & (after <= limits[:, None]) & (after < n)
+
+    found = hit.any(axis=1)
+    exits = np.where(found, entries + 1 + hit.argmax(axis=1), n)
+
+    for row in np.flatnonzero(~found & (entries + HORIZON < np.minimum(limits, n - 1))):
+        end = min(int(limits[row]) + 1, n)
+        stop = scanStop(close, low, int(entries[row]) + HORIZON + 1, end, highs[row, -1], percent, digits)
+        if (stop is not None):
+            exits[row] = stop
+
+    return exits
+
+
+
+# first signal sell after each entry that does not sell at a loss (the
+# trader skips those) --> n if none
+# looks at the next `width` sells of every open entry at once, widening the
+# block for the entries still open (long slides)
+def sellExits(close, entries, sells):
+    n = len(close)
+    exits = np.full(len(entries), n)
+    bids = close[entries]
+    sell_closes = np.append(close[sells], -np.inf)
+
+    rows = np.arange(len(entries))
+    k = np.searchsorted(sells, entries, side='right')
+    width = 4
+
+    while len(rows):
+        block = np.minimum(k[:, None] + np.arange(width), len(sells))
+        ok = sell_closes[block] >= bids[rows, None]
+
+        found = ok.any(axis=1)
+        exits[rows[found]] = sells[block[found, ok[found].argmax(axis=1)]]
+
+        k = k + width
+        keep = ~found & (k < len(sells))
+        rows = rows[keep]
+        k = k[keep]
+        width *= 4
+
+    return exits
+
+
+
+# one position at a time --> list of percent returns
+# the exits are worked out for every buy signal, then the positions are
+# chained: the next one opens on the first buy signal after the last exit
+def simulate(coin, app_vars, buys, sells):
+    if not len(buys):
+        return []
+
+    prices = PRICES[coin]
+    close = prices['close']
+    n = len(close)
+
+    sold = sellExits(close, buys, sells)
+    stops = stopExits(close, prices['low'], buys, sold, app_vars['stop_loss_percent'], app_vars['round_amounts'][coin])
+
+    bids = close[buys]
+    stop_returns = ((prices['low'][np.minimum(stops, n - 1)] - bids) / bids).tolist()
+    sell_returns = ((close[np.minimum(sold, n - 1)] - bids) / bids).tolist()
+
+    entries = buys.tolist()
+    stops = stops.tolist()
+    sold = sold.tolist()
+
+    returns = []
+    i = 0
+    while (i < len(entries)):
+        # stops are checked before the signals on the same candle, and a buy
+        # signal on the stop candle still opens a new position
+        if (stops[i] < n):
+            returns.append(stop_returns[i])
+            t = stops[i]
+        elif (sold[i] < n):
+            returns.append(sell_returns[i])
+            t = sold[i] + 1
+        else:
+            break
+
+        i = bisect_left(entries, t, i + 1)
+
+    return returns
+
+
+
+# runs a batch of parameter sets in a worker --> [(params, trades, wins, pnl %)]
+def runBatch(batch):
+    out = []
+    for params in batch:
+        app_vars = dict(BASE_VARIABLES)
+        app_vars.update(params)
+        engine = strategyEngine(app_vars, STRATEGY)
+
+        returns = []
+        for coin in PRICES:
+            key = ('signals', coin) + tuple(app_vars[p] for p in PARAMETERS[:-1])
+            buys, sells = cached(key, lambda: signalIndices(coin, app_vars, engine, STRATEGY))
+            returns += simulate(coin, app_vars, buys, sells)
+
+        wins = sum(1 for r in returns if r > 0)
+        out.append((params, len(returns), wins, sum(returns) * 100))
+
+    return out
+
+
+
+
+# ==== SWEEP
+
+def gridCombinations(grid):
+    for values in itertools.product(*(grid[p] for p in PARAMETERS)):
+        params = dict(zip(PARAMETERS, values))
+        if (params['periods_short'] < params['periods_long']):
+            yield params
+
+
+
+def randomCombinations(count, seed):
+    rng = random.Random(seed)
+    out = []
+    while (len(out) < count):
+        params = {}
+        for p in PARAMETERS:
+            low, high = RANGES[p]
+            params[p] = rng.randint(low, high) if isinstance(low, int) else round(rng.uniform(low, high), 4)
+        if (params['periods_short'] < params['periods_long']):
+            out.append(params)
+    return out
+
+
+
+# copies the candles into one shared block --> (block, {coin: (offset, n)})
+def shareCandles(candles):
+    layout = {}
+    size = 0
+    for coin in candles:
+        layout[coin] = (size, len(candles[coin]))
+        size += len(FIELDS) * len(candles[coin]) * 8
+
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for coin in candles:
+        offset, n = layout[coin]
+        array = np.array(candles[coin], dtype=np.float64)
+        for i, column in enumerate((1, 3, 4)):      # open, low, close
+            np.ndarray((n,), dtype=np.float64, buffer=block.buf, offset=offset + i * n * 8)[:] = array[:, column]
+
+    return block, layout
+
+
+
+def sweep(app_vars, candles, combinations, workers, strategy):
+    # a strategy the sweep can't run fails here instead of in every worker
+    strategyEngine(app_vars, strategy)
+
+    # sort so that neighbouring tasks share their periods
+    combinations = sorted(combinations, key=lambda params: tuple(params[p] for p in PARAMETERS))
+    size = max(1, len(combinations) // (workers * 8))
+    batches = [combinations[i:(i + size)] for i in range(0, len(combinations), size)]
+
+    block, layout = shareCandles(candles)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=attachWorker, initargs=(block.name, layout, app_vars, strategy)) as pool:
+            results = [row for batch in pool.map(runBatch, batches) for row in batch]
+    finally:
+        block.close()
+        block.unlink()
+
+    results.sort(key=lambda row: row[3], reverse=True)
+    return results
+
+
+
+def writeResults(results, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(list(PARAMETERS) + ['trades', 'win-percent', 'pnl-percent'])
+        for params, trades, wins, pnl in results:
+            writer.writerow([params[p] for p in PARAMETERS] + [trades, round(wins / trades * 100, 2) if trades else 0, round(pnl, 4)])
+
+
+
+def printResults(results, top):
+    names = ['long', 'short', 'signal', 'rsi', 'cross', 'sl %']
+    print(''.join(f'{name:>8}' for name in names) + f"{'TRADES':>8}{'WIN %':>8}{'PNL %':>10}")
+    for params, trades, wins, pnl in results[:top]:
+        row = ''.join(f'{params[p]:>8}' for p in PARAMETERS[:-1]) + f"{params['stop_loss_percent'] * 100:>8.2f}"
+        print(row + f"{trades:>8}{(wins / trades * 100 if trades else 0):>8.1f}{pnl:>10.2f}")
+
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='parameter sweep over the strategy settings')
+    parser.add_argument('--candles', default=APP_VARIABLES['candle_store'], help='directory with {coin}.json or candle store files')
+    parser.add_argument('--coins', nargs='*', help='defaults to the coins in APP_VARIABLES')
+    parser.add_argument('--random', type=int, help='random search with this many combinations instead of the grid')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--strategy', help='strategy id in the strategies app variable, defaults to the first one')
+    parser.add_argument('--param', action='append', default=[], help='override a grid axis, e.g. periods_rsi=10,14,20')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--out', default='database/sweep_results.csv')
+    args = parser.parse_args()
+
+    app_variables = dict(APP_VARIABLES)
+    if args.coins:
+        app_variables['coins'] = args.coins
+
+    grid = dict(GRID)
+    for override in args.param:
+        name, _, values = override.partition('=')
+        grid[name] = [float(v) if '.' in v else int(v) for v in values.split(',')]
+
+    combinations = randomCombinations(args.random, args.seed) if args.random else list(gridCombinations(grid))
+    candles = loadCandles(args.candles, app_variables['coins'], app_variables['timeframe'])
+
+    start = time.perf_counter()
+    strategy = args.strategy or next(iter(app_variables.get('strategies') or DEFAULT_STRATEGIES))
+    results = sweep(app_variables, candles, combinations, args.workers, strategy)
+    elapsed = time.perf_counter() - start
+
+    print(f'{len(results)} combinations in {elapsed:.1f}s ({len(results) / elapsed * 60:,.0f} / minute)')
+    printResults(results, args.top)
+    writeResults(results, args.out)
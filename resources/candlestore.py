@@ -0,0 +1,298 @@
+# ================================================
+#   FILE: resources/candlestore.py
+#
+#   Local candle history on disk, one memory-mapped file per coin and
+#   timeframe (database/candles/{coin}_{timeframe}.candles):
+#
+#       [header: 64 bytes][time: int64 x capacity][open][high][low][close][volume]
+#
+#   with every column stored as `capacity` fixed-width values, oldest first.
+#   The trader is the only writer: candles newer than the last stored one are
+#   appended, a stored candle with the same timestamp is overwritten in place
+#   (the current minute gets revised), older candles that were never stored
+#   are dropped since the file is append-only. When a file is full it is
+#   copied into one with twice the capacity and swapped in with os.replace.
+#
+#   The row count in the header is written after the rows, so readers in
+#   other processes only see complete rows. Range reads return memoryview
+#   slices of the mapped file, nothing is copied until the caller does.
+#
+
+
+# ==== IMPORTS
+from bisect import bisect_left
+
+import json
+import mmap
+import os
+import struct
+import sys
+
+
+
+
+MAGIC = b'PALC'
+VERSION = 1
+HEADER = struct.Struct('<4sHHqq')       # magic, version, column count, count, capacity
+HEADER_SIZE = 64
+COUNT = struct.Struct('<q')
+COUNT_OFFSET = 8
+
+COLUMNS = (('time', 'q'), ('open', 'd'), ('high', 'd'), ('low', 'd'), ('close', 'd'), ('volume', 'd'))
+INITIAL_CAPACITY = 4096
+
+
+
+
+# ==== SINGLE FILE
+
+class CandleFile:
+    def __init__(self, path, writable=False, capacity=INITIAL_CAPACITY):
+        self.path = path
+        self.writable = writable
+
+        self.file = None
+        self.mm = None
+        self.columns = {}
+        self.capacity = 0
+        self.inode = None
+
+        if writable and not os.path.exists(path):
+            self.create(path, capacity, 0)
+
+        self.open()
+
+
+
+    # writes an empty file, or a copy of the first n rows of this one
+    def create(self, path, capacity, n):
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS), n, capacity).ljust(HEADER_SIZE, b'\0'))
+            f.truncate(HEADER_SIZE + len(COLUMNS) * capacity * 8)
+
+            for i, (name, _) in enumerate(COLUMNS):
+                if n:
+                    f.seek(HEADER_SIZE + i * capacity * 8)
+                    f.write(self.columns[name][:n])
+
+
+
+    def open(self):
+        self.file = open(self.path, 'r+b' if self.writable else 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=(mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ))
+        self.inode = os.fstat(self.file.fileno()).st_ino
+
+        magic, version, columns, _, capacity = HEADER.unpack_from(self.mm, 0)
+        if (magic != MAGIC) or (version != VERSION) or (columns != len(COLUMNS)):
+            self.close()
+            raise ValueError(f'{self.path} is not a candle file')
+
+        self.capacity = capacity
+        view = memoryview(self.mm)
+        for i, (name, fmt) in enumerate(COLUMNS):
+            start = HEADER_SIZE + i * capacity * 8
+            self.columns[name] = view[start:(start + capacity * 8)].cast(fmt)
+
+
+
+    # views handed out by read() keep the map open until they are released
+    def close(self):
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+
+        if self.mm is not None:
+            try:
+                self.mm.close()
+            except BufferError:
+                pass
+            self.mm = None
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+
+    # readers pick up a file the writer has grown and swapped in
+    def refresh(self):
+        try:
+            if (os.stat(self.path).st_ino != self.inode):
+                self.close()
+                self.open()
+        except FileNotFoundError:
+            pass
+
+
+
+    def count(self):
+        return COUNT.unpack_from(self.mm, COUNT_OFFSET)[0]
+
+
+
+    # index of the first row at or after a timestamp
+    def find(self, ts, n):
+        return bisect_left(self.columns['time'], ts, 0, n)
+
+
+
+    # rows with start <= time < end --> {column: memoryview}, zero copy
+    def read(self, start=None, end=None):
+        if not(self.writable):
+            self.refresh()
+
+        n = self.count()
+        i = 0 if (start is None) else self.find(start, n)
+        j = n if (end is None) else self.find(end, n)
+
+        return {name: self.columns[name][i:max(i, j)] for name, _ in COLUMNS}
+
+
+
+    # appends candles newer than the last stored one and overwrites revised
+    # ones, in any order --> number of rows added
+    def append(self, candles):
+        n = self.count()
+        times = self.columns['time']
+        last = times[n - 1] if n else None
+
+        added = 0
+        changed = False
+        for candle in sorted(candles, key=lambda candle: candle[0]):
+            if (last is None) or (candle[0] > last):
+                if (n == self.capacity):
+                    self.grow(n)
+                    times = self.columns['time']
+
+                self.writeRow(n, candle)
+                n += 1
+                added += 1
+                last = candle[0]
+                changed = True
+                continue
+
+            i = self.find(candle[0], n)
+            if (i < n) and (times[i] == candle[0]) and (self.row(i) != list(candle[:len(COLUMNS)])):
+                self.writeRow(i, candle)
+                changed = True
+
+        if changed:
+            COUNT.pack_into(self.mm, COUNT_OFFSET, n)
+            self.mm.flush()
+
+        return added
+
+
+
+    def writeRow(self, i, candle):
+        self.columns['time'][i] = int(candle[0])
+        for (name, _), value in zip(COLUMNS[1:], candle[1:]):
+            self.columns[name][i] = float(value)
+
+
+
+    def row(self, i):
+        return [self.columns[name][i] for name, _ in COLUMNS]
+
+
+
+    # copies the rows into a file with twice the capacity
+    def grow(self, n):
+        tmp = self.path + '.tmp'
+        self.create(tmp, self.capacity * 2, n)
+
+        self.close()
+        os.replace(tmp, self.path)
+        self.open()
+
+
+
+
+# ==== STORE
+
+class CandleStore:
+    def __init__(self, directory, timeframe, readonly=False):
+        self.directory = directory
+        self.timeframe = timeframe
+        self.readonly = readonly
+        self.files = {}
+
+        if not(readonly):
+            os.makedirs(directory, exist_ok=True)
+
+
+
+    def path(self, coin):
+        return os.path.join(self.directory, f'{coin}_{self.timeframe}.candles')
+
+
+
+    # None --> nothing stored for the coin yet (read only)
+    def file(self, coin):
+        if coin not in self.files:
+            if self.readonly and not os.path.exists(self.path(coin)):
+                return None
+            self.files[coin] = CandleFile(self.path(coin), writable=not(self.readonly))
+        return self.files[coin]
+
+
+
+    # candles --> [[time, open, high, low, close, volume], ...] in any order
+    def append(self, coin, candles):
+        if not(candles):
+            return 0
+        return self.file(coin).append(candles)
+
+
+
+    # rows with start <= time < end (ms) --> {column: memoryview} oldest first
+    def read(self, coin, start=None, end=None):
+        file = self.file(coin)
+        if (file is None):
+            return {name: memoryview(b'').cast(fmt) for name, fmt in COLUMNS}
+        return file.read(start, end)
+
+
+
+    # the newest `limit` candles from `since` on, in the v2/candles format
+    # the rest of the app uses --> [[time, open, high, low, close, volume], ...]
+    # newest first
+    def candles(self, coin, limit=None, since=None):
+        columns = self.read(coin, since)
+        n = len(columns['time'])
+        i = 0 if (limit is None) else max(0, n - limit)
+
+        rows = [list(row) for row in zip(*(columns[name][i:n] for name, _ in COLUMNS))]
+        rows.reverse()
+        return rows
+
+
+
+    def last(self, coin):
+        columns = self.read(coin)
+        return columns['time'][-1] if len(columns['time']) else None
+
+
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+
+
+
+
+# imports {coin}.json candle files (v2/candles format) into the store
+#   python -m resources.candlestore <json dir> [store dir] [timeframe]
+if __name__ == '__main__':
+    source = sys.argv[1]
+    store = CandleStore(sys.argv[2] if len(sys.argv) > 2 else 'database/candles', sys.argv[3] if len(sys.argv) > 3 else '1m')
+
+    for name in sorted(os.listdir(source)):
+        if name.endswith('.json'):
+            with open(os.path.join(source, name)) as f:
+                candles = json.load(f)
+            coin = name[:-len('.json')]
+            print(f'{coin}: {store.append(coin, candles)} candles added, {len(store.read(coin)["time"])} stored')
+
+    store.close()
@@ -0,0 +1,114 @@
+# ================================================
+#   FILE: resources/effects.py
+#
+#   Side effects of the trader (sounds, console output, journal records) run
+#   on a worker thread so the order path never waits on them. Each executor
+#   has a bounded queue and every task is submitted with a policy:
+#
+#       'drop'      --> skipped when the queue is full (sounds, event prints)
+#       'coalesce'  --> replaces the queued task with the same key, only the
+#                       newest one runs (the active orders table)
+#       'keep'      --> never dropped, queued even past the bound (journal)
+#
+#   stats() gives the queue depth and counters for each policy.
+#
+
+
+# ==== IMPORTS
+from collections import deque
+
+import atexit
+import threading
+
+
+
+
+class SideEffects:
+    def __init__(self, name, maxsize=64):
+        self.name = name
+        self.maxsize = maxsize
+
+        self.queue = deque()        # [key, func, args]
+        self.keyed = {}             # coalesce key --> its queued entry
+        self.cond = threading.Condition()
+        self.closed = False
+
+        self.submitted = 0
+        self.done = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_depth = 0
+
+        self.thread = threading.Thread(target=self.run, name=f'effects-{name}', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+
+
+    # queues func(*args), never blocks --> False if the task was dropped
+    def submit(self, func, *args, policy='drop', key=None):
+        with self.cond:
+            self.submitted += 1
+
+            if (policy == 'coalesce') and (key in self.keyed):
+                self.keyed[key][1:] = [func, args]
+                self.coalesced += 1
+                return True
+
+            if (policy != 'keep') and (len(self.queue) >= self.maxsize):
+                self.dropped += 1
+                return False
+
+            entry = [key if (policy == 'coalesce') else None, func, args]
+            if (entry[0] is not None):
+                self.keyed[key] = entry
+
+            self.queue.append(entry)
+            self.max_depth = max(self.max_depth, len(self.queue))
+            self.cond.notify()
+            return True
+
+
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not(self.queue) and not(self.closed):
+                    self.cond.wait()
+                if not(self.queue):
+                    return
+
+                key, func, args = self.queue.popleft()
+                if (key is not None):
+                    del self.keyed[key]
+
+            try:
+                func(*args)
+            except Exception as e:
+                self.errors += 1
+                print(f'{self.name}: {e}')
+
+            self.done += 1
+
+
+
+    # runs what is still queued and stops the worker
+    def close(self, timeout=5):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join(timeout)
+
+
+
+    def stats(self):
+        return {
+            'depth': len(self.queue),
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'done': self.done,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'errors': self.errors
+        }
@@ -0,0 +1,112 @@
+# ================================================
+#   FILE: resources/fetcher.py
+#
+#   Concurrent candle fetcher used by the trader process. Requests for every
+#   coin run on a thread pool and share a token bucket, so the total time
+#   depends on the exchange's rate limit instead of one second per coin.
+#   Requests go through the trader's ExchangeClient (timeouts, pooled
+#   connections) and failed requests are retried a bounded number of times
+#   with exponential backoff, taking a new token for every attempt.
+#
+
+
+# ==== IMPORTS
+from concurrent.futures import ThreadPoolExecutor
+
+import random
+import threading
+import time
+
+
+
+
+# ==== RATE LIMITER
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)         # tokens added per second
+        self.burst = float(burst)       # max tokens held at once
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+
+
+    # takes a token if one is available --> 0, otherwise the seconds until
+    # there is one
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+            if (self.tokens >= 1):
+                self.tokens -= 1
+                return 0
+
+            return (1 - self.tokens) / self.rate
+
+
+
+    # blocks until a token is available and takes it
+    def acquire(self):
+        while True:
+            wait = self.take()
+            if not(wait):
+                return
+
+            time.sleep(wait)
+
+
+
+
+# ==== FETCHER
+
+class CandleFetcher:
+    def __init__(self, client, rate=2.0, burst=5, workers=8, retries=3, backoff=0.5):
+        self.client = client    # trader.ExchangeClient, handles timeouts
+        self.bucket = TokenBucket(rate, burst)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+        self.retries = retries
+        self.backoff = backoff
+
+
+
+    # pulls candles for every coin concurrently
+    # returns {coin: candles}, coins that failed every retry are left out
+    def fetch(self, coins, timeframe):
+        futures = {coin: self.pool.submit(self.fetchCoin, coin, timeframe) for coin in coins}
+
+        out_data = {}
+        for coin in futures:
+            try:
+                out_data[coin] = futures[coin].result()
+            except Exception as e:
+                print(f'{coin}: {e}')
+
+        return out_data
+
+
+
+    # pulls candles for a single coin, retrying with exponential backoff
+    def fetchCoin(self, coin, timeframe):
+        endpoint = f"v2/candles/{coin}/{timeframe}"
+
+        for attempt in range(0, self.retries + 1):
+            self.bucket.acquire()
+
+            try:
+                return self.client.get(endpoint, 'v2/candles')
+
+            except Exception:
+                if (attempt == self.retries):
+                    raise
+
+            # backoff with jitter so retries from different threads spread out
+            time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+
+
+    def close(self):
+        self.pool.shutdown(wait=False)
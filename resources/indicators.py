@@ -0,0 +1,408 @@
+# ================================================
+#   FILE: resources/indicators.py
+#
+#   Streaming indicator engine used by the data process. Keeps EMA, MACD,
+#   MACD signal and RSI state per coin and only applies candles that are
+#   newer than the last one it saw, instead of recomputing the whole window
+#   every refresh. Output arrays match Data.calculateFull* exactly (up to
+#   floating point rounding).
+#
+#   The full-recompute EMAs are seeded with the SMA of the `periods` candles
+#   just before the display window, so the seed moves every candle. Since an
+#   EMA is linear, that moving seed only adds a decaying term to a normal
+#   running EMA:
+#
+#       ema[i] = T[i] + (1 - k)^(i + 1) * (seed - T[-1])
+#
+#   where T is the running EMA, so the state update stays O(1) per candle and
+#   only building the output arrays is O(display_window).
+#
+
+
+# ==== IMPORTS
+from collections import deque, OrderedDict
+
+
+
+
+# ==== STATE FOR A SINGLE COIN
+
+class IndicatorState:
+    def __init__(self, window, p_long, p_short, p_rsi):
+        self.window = window
+        self.p_long = p_long
+        self.p_short = p_short
+        self.p_rsi = p_rsi
+
+        self.count = 0          # number of candles applied
+        self.last_ts = None     # timestamp of the newest applied candle
+        self.prev = None        # copy of the state before the newest candle
+
+        # raw prices, long enough to slide the ema seed windows
+        maxlen = window + max(p_long, p_short, p_rsi) + 1
+        self.closes = deque(maxlen=maxlen)
+        self.opens = deque(maxlen=maxlen)
+
+        # running emas over every candle seen --> T[N-W-1] .. T[N-1]
+        self.t_long = deque(maxlen=window + 1)
+        self.t_short = deque(maxlen=window + 1)
+
+        # running macd signal ema over the running macd --> G[N-W] .. G[N-1]
+        self.t_signal = deque(maxlen=window)
+
+        # sums of the closes the full recompute would use as ema seeds
+        self.seed_long = 0.0
+        self.seed_short = 0.0
+
+        # rolling sums of candle body moves for the rsi
+        self.up_sum = 0.0
+        self.down_sum = 0.0
+        self.down_count = 0
+        self.rsis = deque(maxlen=window)
+
+
+
+    # shallow copy with independent buffers, used to undo the newest candle
+    def copy(self):
+        state = IndicatorState.__new__(IndicatorState)
+        state.__dict__.update(self.__dict__)
+        state.prev = None
+
+        for name in ('closes', 'opens', 't_long', 't_short', 't_signal', 'rsis'):
+            setattr(state, name, deque(getattr(self, name), maxlen=getattr(self, name).maxlen))
+
+        return state
+
+
+
+
+# ==== ENGINE
+
+class IndicatorEngine:
+    def __init__(self, app_vars):
+        self.app_variables = app_vars
+        self.states = {}
+
+        self.window = app_vars['display_window']
+        self.p_long = app_vars['periods_long']
+        self.p_short = app_vars['periods_short']
+        self.p_signal = app_vars['periods_signal']
+        self.p_rsi = app_vars['periods_rsi']
+
+        # candles needed before the outputs line up with the full recompute
+        self.required = self.window + max(self.p_long, self.p_short, self.p_rsi)
+
+        smoothing = app_vars['ema_smoothing']
+        self.k_long = smoothing / (1 + self.p_long)
+        self.k_short = smoothing / (1 + self.p_short)
+        self.k_signal = smoothing / (1 + self.p_signal)
+
+        # decay of the seed correction for each position in the window
+        self.decay_long = [(1 - self.k_long) ** (i + 1) for i in range(0, self.window)]
+        self.decay_short = [(1 - self.k_short) ** (i + 1) for i in range(0, self.window)]
+        self.decay_signal = [(1 - self.k_signal) ** i for i in range(0, self.window)]
+
+        # the signal line is an ema of the macd, so the ema seed corrections
+        # pass through it as fixed sequences
+        self.carry_long = self.signalOf(self.decay_long)
+        self.carry_short = self.signalOf(self.decay_short)
+
+
+
+    # runs the macd signal recursion over a sequence, seeded with its first value
+    def signalOf(self, seq):
+        out = [seq[0]]
+        for value in seq[1:]:
+            out.append(self.k_signal * value + (1 - self.k_signal) * out[-1])
+        return out
+
+
+
+    # drops the state for a coin, next update rebuilds it from scratch
+    def reset(self, coin):
+        self.states.pop(coin, None)
+
+
+
+    # applies any new or revised candles for a coin and returns the same dict
+    # Data.calculateData builds, or None if there is not enough history yet
+    #   candles --> [[time, open, high, low, close, volume], ...] newest first
+    def update(self, coin, candles):
+        if not candles:
+            return self.values(coin)
+
+        state = self.states.get(coin)
+
+        if (state is None) or (candles[0][0] < state.last_ts):
+            return self.rebuild(coin, candles)
+
+        # collect candles newer than the last one applied --> oldest first
+        new = []
+        revised = None
+        for candle in candles:
+            if (candle[0] > state.last_ts):
+                new.append(candle)
+            else:
+                if (candle[0] == state.last_ts):
+                    revised = candle
+                break
+
+        # no overlap with what was applied before --> missing candles
+        if new and (revised is None):
+            return self.rebuild(coin, candles)
+
+        new.reverse()
+
+        if (revised is not None) and ((revised[1] != state.opens[-1]) or (revised[4] != state.closes[-1])):
+            if (state.prev is None):
+                return self.rebuild(coin, candles)
+            state = state.prev
+            self.states[coin] = state
+            new = [revised] + new
+
+        for i, candle in enumerate(new):
+            if (i == len(new) - 1):
+                prev = state.copy()
+                self.push(state, candle)
+                state.prev = prev
+            else:
+                self.push(state, candle)
+
+        return self.values(coin)
+
+
+
+    # applies one final candle for a coin, oldest first, without keeping the
+    # undo copy --> used when replaying history where candles never change
+    def append(self, coin, candle):
+        state = self.states.get(coin)
+        if (state is None):
+            state = IndicatorState(self.window, self.p_long, self.p_short, self.p_rsi)
+            self.states[coin] = state
+
+        self.push(state, candle)
+        state.prev = None
+
+
+
+    # rebuilds the state for a coin from a full candle list
+    def rebuild(self, coin, candles):
+        state = IndicatorState(self.window, self.p_long, self.p_short, self.p_rsi)
+        self.states[coin] = state
+
+        history = candles[:(self.required + 1)]
+        history.reverse()
+
+        for candle in history[:-1]:
+            self.push(state, candle)
+
+        if history:
+            prev = state.copy()
+            self.push(state, history[-1])
+            state.prev = prev
+
+        return self.values(coin)
+
+
+
+    # applies one candle to the state of a coin
+    def push(self, s, candle):
+        w = self.window
+        o = candle[1]
+        c = candle[4]
+
+        s.closes.append(c)
+        s.opens.append(o)
+        n = len(s.closes)
+
+        # running emas and macd signal
+        if (s.count == 0):
+            t_long = c
+            t_short = c
+            t_signal = 0.0
+        else:
+            t_long = self.k_long * c + (1 - self.k_long) * s.t_long[-1]
+            t_short = self.k_short * c + (1 - self.k_short) * s.t_short[-1]
+            t_signal = self.k_signal * (t_short - t_long) + (1 - self.k_signal) * s.t_signal[-1]
+
+        s.t_long.append(t_long)
+        s.t_short.append(t_short)
+        s.t_signal.append(t_signal)
+
+        # slide the seed windows --> closes[N-W-P .. N-W-1]
+        if (n > w):
+            s.seed_long += s.closes[-(w + 1)]
+            s.seed_short += s.closes[-(w + 1)]
+        if (n > w + self.p_long):
+            s.seed_long -= s.closes[-(w + self.p_long + 1)]
+        if (n > w + self.p_short):
+            s.seed_short -= s.closes[-(w + self.p_short + 1)]
+
+        # slide the rsi window
+        up, down = self.bodyMove(o, c)
+        s.up_sum += up
+        s.down_sum += down
+        s.down_count += (down > 0)
+
+        if (n > self.p_rsi):
+            up, down = self.bodyMove(s.opens[-(self.p_rsi + 1)], s.closes[-(self.p_rsi + 1)])
+            s.up_sum -= up
+            s.down_sum -= down
+            s.down_count -= (down > 0)
+
+        s.count += 1
+        s.last_ts = candle[0]
+
+        # re-sum now and then so the rolling sums do not drift
+        if (s.count % s.closes.maxlen == 0):
+            self.resum(s)
+
+        if (s.count >= self.p_rsi):
+            avg_up = s.up_sum / self.p_rsi
+            avg_down = 0 if (s.down_count == 0) else (s.down_sum / self.p_rsi)
+            rs = avg_up / (1 if avg_down == 0 else avg_down)
+            s.rsis.append(100 - (100 / (1 + rs)))
+
+
+
+    # split a candle body into an up and down move, same as calculateFullRSIs
+    def bodyMove(self, o, c):
+        chng = o - c
+        if (chng > 0):
+            return 0.0, chng
+        return -chng, 0.0
+
+
+
+    # recompute the rolling sums exactly from the price buffers
+    def resum(self, s):
+        w = self.window
+        closes = list(s.closes)
+        opens = list(s.opens)
+        n = len(closes)
+
+        s.seed_long = sum(closes[max(0, n - w - self.p_long):max(0, n - w)])
+        s.seed_short = sum(closes[max(0, n - w - self.p_short):max(0, n - w)])
+
+        moves = [self.bodyMove(o, c) for o, c in zip(opens[-self.p_rsi:], closes[-self.p_rsi:])]
+        s.up_sum = sum(m[0] for m in moves)
+        s.down_sum = sum(m[1] for m in moves)
+        s.down_count = sum(1 for m in moves if m[1] > 0)
+
+
+
+    # builds the output arrays for a coin, only the last n values if given
+    def values(self, coin, n=None):
+        s = self.states.get(coin)
+        if (s is None) or (s.count < self.required):
+            return None
+
+        w = self.window
+        n = w if (n is None) else min(n, w)
+        start = w - n
+
+        delta_long = s.seed_long / self.p_long - s.t_long[0]
+        delta_short = s.seed_short / self.p_short - s.t_short[0]
+        delta_signal = (s.t_short[1] - s.t_long[1]) - s.t_signal[0]
+
+        emas_long = [s.t_long[i + 1] + self.decay_long[i] * delta_long for i in range(start, w)]
+        emas_short = [s.t_short[i + 1] + self.decay_short[i] * delta_short for i in range(start, w)]
+        macds = [emas_short[i] - emas_long[i] for i in range(0, n)]
+
+        # the full recompute pads the first signal value with the second one
+        def signal(i):
+            i = max(i, 1)
+            return (s.t_signal[i] + self.decay_signal[i] * delta_signal
+                    + delta_short * self.carry_short[i] - delta_long * self.carry_long[i])
+
+        # last n values of a buffer, indexing near the end of a deque is cheap
+        def tail(buffer):
+            return [buffer[i] for i in range(len(buffer) - n, len(buffer))]
+
+        return {
+            'close_prices': tail(s.closes),
+            'emas_long': emas_long,
+            'emas_short': emas_short,
+            'macds': macds,
+            'macds_signal': [signal(i) for i in range(start, w)],
+            'rsis': tail(s.rsis)
+        }
+
+
+
+
+# ==== RESULT CACHE
+
+# newest candles that can still change
+REVISED = 3
+
+
+
+# indicator outputs by candle fingerprint, least recently used entries are
+# dropped once the estimated size passes max_bytes. Live candles rarely come
+# back to a state seen before, so it is off (0) by default and key() is only
+# used to spot unchanged candles. It pays off when the same candle states are
+# sent again, e.g. a trader that restarts and resends the whole history.
+class IndicatorCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.enabled = (max_bytes > 0)
+        self.entries = OrderedDict()    # key --> (values, size)
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.unchanged = 0      # counted by the caller, same key as last time
+
+
+
+    # (coin, timeframe, newest time, oldest time, count, hash of the newest
+    # candles, parameters) for the candles the indicators are computed from
+    # only the newest candles are ever revised (the trader resends the last
+    # one, the resampler the last two bars), so only those are hashed
+    def key(self, coin, timeframe, candles, params):
+        if not(candles):
+            return (coin, timeframe, None, params)
+        return (coin, timeframe, candles[0][0], candles[-1][0], len(candles), hash(tuple(map(tuple, candles[:REVISED]))), params)
+
+
+
+    # None on a miss
+    def get(self, key):
+        if not(self.enabled):
+            return None
+
+        entry = self.entries.get(key)
+        if (entry is None):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+
+
+    def put(self, key, values):
+        if not(self.enabled):
+            return
+
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+
+        size = self.sizeOf(values)
+        self.entries[key] = (values, size)
+        self.bytes += size
+
+        while (self.bytes > self.max_bytes) and (len(self.entries) > 1):
+            self.bytes -= self.entries.popitem(last=False)[1][1]
+
+
+
+    # rough size in bytes, a list of floats costs a pointer and a float
+    # object per value
+    def sizeOf(self, values):
+        size = 256
+        for series in values.values():
+            size += series.nbytes if hasattr(series, 'nbytes') else (len(series) * 32)
+        return size
@@ -0,0 +1,218 @@
+# ================================================
+#   FILE: resources/journal.py
+#
+#   Trade journal of the trader process, a SQLite database in WAL mode
+#   (database/journal.db). record() only puts the trade on a queue, a writer
+#   thread inserts whatever is queued in one transaction, so selling never
+#   waits on file I/O.
+#
+#   sync_interval sets how often the data is forced to disk: 0 --> fsync on
+#   every commit, N --> commits are not synced and the WAL is checkpointed
+#   (synced) every N seconds, so at most N seconds of trades are lost if the
+#   machine goes down.
+#
+#   Trades are indexed by coin, strategy and close time, queryTrades() reads
+#   them from any process while the trader keeps writing.
+#
+#       python -m resources.journal [database/journal.db] [--coin btcusd] [--strategy default] [--csv out.csv]
+#
+
+
+# ==== IMPORTS
+import argparse
+import atexit
+import csv
+import queue
+import sqlite3
+import threading
+import time
+
+
+
+
+COLUMNS = ('coin', 'strategy', 'buy_type', 'sell_type', 'buy_price', 'sell_price', 'timeframe', 'sl_percent',
+           'opened_at', 'closed_at', 'buy_latency', 'sell_latency', 'recorded_at')
+
+SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    coin TEXT NOT NULL,
+    strategy TEXT,          -- id of the strategy that traded it, manual for the gui buttons
+    buy_type TEXT,
+    sell_type TEXT,
+    buy_price REAL,
+    sell_price REAL,
+    timeframe TEXT,
+    sl_percent REAL,
+    opened_at REAL,         -- unix time
+    closed_at REAL,
+    buy_latency REAL,       -- seconds from the signal to the fill
+    sell_latency REAL,
+    recorded_at REAL        -- when the writer got to it
+);
+CREATE INDEX IF NOT EXISTS trades_coin_time ON trades (coin, closed_at);
+CREATE INDEX IF NOT EXISTS trades_time ON trades (closed_at);
+'''
+
+# journals written before trades carried a strategy
+MIGRATIONS = (
+    ('strategy', "ALTER TABLE trades ADD COLUMN strategy TEXT"),
+)
+
+INDEXES = '''
+CREATE INDEX IF NOT EXISTS trades_strategy_time ON trades (strategy, closed_at);
+'''
+
+INSERT = f"INSERT INTO trades ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+
+
+def connect(path):
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(trades)')}
+    for column, sql in MIGRATIONS:
+        if (column not in columns):
+            conn.execute(sql)
+    conn.executescript(INDEXES)
+    return conn
+
+
+
+
+# ==== WRITER
+
+class TradeJournal:
+    def __init__(self, path, sync_interval=5):
+        self.path = path
+        self.sync_interval = sync_interval
+
+        self.queue = queue.Queue()
+        self.written = 0
+
+        # the connection belongs to the writer thread
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+
+
+    # trade --> dict with the COLUMNS keys, recorded_at is filled in
+    def record(self, trade):
+        self.queue.put(trade)
+
+
+
+    # blocks until everything recorded so far is written
+    def flush(self):
+        self.queue.join()
+
+
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+
+    def run(self):
+        conn = connect(self.path)
+        conn.execute('PRAGMA synchronous=' + ('FULL' if (self.sync_interval == 0) else 'NORMAL'))
+        last_sync = time.monotonic()
+
+        while True:
+            timeout = None if (self.sync_interval == 0) else max(0, last_sync + self.sync_interval - time.monotonic())
+            try:
+                batch = [self.queue.get(timeout=timeout)]
+            except queue.Empty:
+                batch = []
+
+            # take everything else that is already queued
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            trades = [trade for trade in batch if trade is not None]
+            if trades:
+                now = time.time()
+                rows = [tuple(now if (name == 'recorded_at') else trade.get(name) for name in COLUMNS) for trade in trades]
+                with conn:
+                    conn.executemany(INSERT, rows)
+                self.written += len(rows)
+
+            if (self.sync_interval) and (time.monotonic() - last_sync >= self.sync_interval):
+                conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+                last_sync = time.monotonic()
+
+            for _ in batch:
+                self.queue.task_done()
+
+            if (None in batch):
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                conn.close()
+                return
+
+
+
+
+# ==== QUERIES
+
+# trades closed in [start, end) (unix time), oldest first --> [dict]
+def queryTrades(path, coin=None, start=None, end=None, strategy=None):
+    where = []
+    args = []
+    if (coin is not None):
+        where.append('coin = ?')
+        args.append(coin)
+    if (strategy is not None):
+        where.append('strategy = ?')
+        args.append(strategy)
+    if (start is not None):
+        where.append('closed_at >= ?')
+        args.append(start)
+    if (end is not None):
+        where.append('closed_at < ?')
+        args.append(end)
+
+    sql = f"SELECT {', '.join(COLUMNS)} FROM trades"
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY closed_at'
+
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return [dict(zip(COLUMNS, row)) for row in conn.execute(sql, args)]
+    finally:
+        conn.close()
+
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='query the trade journal')
+    parser.add_argument('path', nargs='?', default='database/journal.db')
+    parser.add_argument('--coin')
+    parser.add_argument('--strategy')
+    parser.add_argument('--since', type=float, help='unix time')
+    parser.add_argument('--csv', help='write the trades to a csv file instead of printing them')
+    args = parser.parse_args()
+
+    trades = queryTrades(args.path, args.coin, args.since, strategy=args.strategy)
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(trades)
+    else:
+        for trade in trades:
+            closed = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(trade['closed_at']))
+            percent = (trade['sell_price'] - trade['buy_price']) / trade['buy_price'] * 100
+            print(f"{closed}  {trade['coin'].upper():<8} {str(trade['strategy']):<12} {trade['buy_type']:>8} --> {trade['sell_type']:<8} {trade['buy_price']:>12} {trade['sell_price']:>12} {percent:>8.2f} %")
+        print(f'{len(trades)} trades')
@@ -0,0 +1,181 @@
+# ================================================
+#   FILE: resources/marketdata.py
+#
+#   Streaming market data for the trader process. Subscribes to the
+#   exchange's level 2 WebSocket feed for every active coin, keeps the order
+#   books in memory and caches the best bid / ask with a timestamp, so a
+#   price lookup is a dictionary read instead of an HTTP round trip.
+#
+#   Needs the websocket-client package, only imported when
+#   app_variables['market_data'] is 'stream'.
+#
+
+
+# ==== IMPORTS
+import json
+import threading
+import time
+import websocket
+
+
+
+
+# ==== TOP OF BOOK CACHE
+
+class TopOfBookCache:
+    def __init__(self):
+        self.quotes = {}        # coin --> (bid, ask, time of last change)
+        self.alive = 0.0        # time of the last message from the stream
+        self.lock = threading.Lock()
+
+
+
+    def set(self, coin, bid, ask):
+        with self.lock:
+            self.quotes[coin] = (bid, ask, time.monotonic())
+
+
+
+    # marks the stream as alive, quiet coins stay fresh while it is
+    def touch(self):
+        self.alive = time.monotonic()
+
+
+
+    # returns (bid, ask, age in seconds) or None if the coin has no quote or
+    # the quote is older than max_age
+    def get(self, coin, max_age):
+        with self.lock:
+            quote = self.quotes.get(coin)
+
+        if (quote is None) or (quote[0] is None) or (quote[1] is None):
+            return None
+
+        age = time.monotonic() - max(quote[2], self.alive)
+        if (age > max_age):
+            return None
+
+        return (quote[0], quote[1], age)
+
+
+
+
+# ==== ORDER BOOK FOR A SINGLE COIN
+
+class OrderBook:
+    def __init__(self):
+        self.bids = {}      # price --> quantity
+        self.asks = {}
+        self.best_bid = None
+        self.best_ask = None
+
+
+
+    # applies one level change, returns True if the best bid or ask moved
+    def apply(self, side, price, quantity):
+        book = self.bids if (side == 'buy') else self.asks
+
+        if (quantity == 0):
+            book.pop(price, None)
+        else:
+            book[price] = quantity
+
+        if (side == 'buy'):
+            best = self.best_bid
+            if (quantity > 0) and ((best is None) or (price > best)):
+                self.best_bid = price
+            elif (quantity == 0) and (price == best):
+                self.best_bid = max(book) if book else None
+            return (self.best_bid != best)
+
+        best = self.best_ask
+        if (quantity > 0) and ((best is None) or (price < best)):
+            self.best_ask = price
+        elif (quantity == 0) and (price == best):
+            self.best_ask = min(book) if book else None
+        return (self.best_ask != best)
+
+
+
+
+# ==== STREAM
+
+class MarketDataStream:
+    def __init__(self, url, coins, cache, on_update=None):
+        self.url = url
+        self.coins = coins
+        self.cache = cache
+        self.on_update = on_update      # called with the coin when its top of book moves
+
+        self.books = {}
+        self.running = False
+        self.ws = None
+        self.thread = None
+
+
+
+    # runs the WebSocket connection on a daemon thread, reconnecting with
+    # backoff whenever it drops
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+
+    def stop(self):
+        self.running = False
+        if self.ws:
+            self.ws.close()
+
+
+
+    def run(self):
+        delay = 1
+        while self.running:
+            start = time.monotonic()
+
+            self.books = {}
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self.onOpen,
+                on_message=self.onMessage,
+                on_error=lambda ws, e: print(f'market data: {e}')
+            )
+            self.ws.run_forever(ping_interval=15, ping_timeout=10)
+
+            # reset the backoff after a connection that stayed up for a while
+            delay = 1 if ((time.monotonic() - start) > 60) else min(delay * 2, 30)
+            if self.running:
+                time.sleep(delay)
+
+
+
+    def onOpen(self, ws):
+        ws.send(json.dumps({
+            'type': 'subscribe',
+            'subscriptions': [{'name': 'l2', 'symbols': [coin.upper() for coin in self.coins]}]
+        }))
+
+
+
+    # l2_updates --> {'type': 'l2_updates', 'symbol': 'BTCUSD', 'changes': [['buy', '9122.04', '0.0012'], ...]}
+    # the first one for each symbol is a full snapshot of the book
+    def onMessage(self, ws, raw):
+        self.cache.touch()
+
+        msg = json.loads(raw)
+        if (msg.get('type') != 'l2_updates'):
+            return
+
+        coin = msg['symbol'].lower()
+        book = self.books.setdefault(coin, OrderBook())
+
+        moved = False
+        for side, price, quantity in msg['changes']:
+            moved = book.apply(side, float(price), float(quantity)) or moved
+
+        if moved:
+            self.cache.set(coin, book.best_bid, book.best_ask)
+            if self.on_update:
+                self.on_update(coin)
@@ -1,10 +1,196 @@
+# ================================================
+#   FILE: resources/message.py
+#
+#   Message protocol shared by the data, trader and gui processes. Every
+#   message has an integer opcode and is sent as raw bytes through the Pipe
+#   (send_bytes / recv_bytes). The frequent small messages (signals, display
+#   updates) are packed with struct, bulk payloads (candles, display data)
+#   are pickled behind the opcode byte. Handlers are picked from a table by
+#   opcode instead of matching on message strings.
+#
+#   Messages carry a trace, the time.monotonic() stamps of every stage they
+#   passed so far (the clock is shared by all processes of the machine):
+#
+#       candles     fetch start, fetched, sent (trader)
+#       signals     + received, computed (data)
+#       display     + received, computed (data)
+#
+#   each process turns the differences into the histograms of
+#   resources/metrics.py.
+#
 
 
+# ==== IMPORTS
+import pickle
+import struct
 
 
 
+
+# ==== OPCODES
+CALC_DATA = 1           # trader --> data     {coin: [candles]}
+DISPLAY_DATA = 2        # data --> gui        {'sent': time, 'coins': {coin: {series: [values]}}}
+DISPLAY_UPDATE = 3      # data --> gui        {coin: seq} for the shared buffers
+BUY_SIGNAL = 4          # data / gui --> trader   coin, kind (rule name), strategy id
+SELL_SIGNAL = 5         # data / gui --> trader
+TICK = 6                # market data thread --> trader, top of book moved
+CANDLES = 7             # fetch thread --> trader, a candle pull finished
+
+
+
+
+# ==== MESSAGE TYPES
+
+# generic message with a pickled payload
 class Message:
-    def __init__(self, m, d):
-        self.message = m
-        self.data = d
-        
+    __slots__ = ('op', 'data', 'trace')
+
+    def __init__(self, op, data=None, trace=()):
+        self.op = op
+        self.data = data
+        self.trace = trace
+
+
+
+# buy or sell signal for a coin, from a strategy of the data process or the
+# gui buttons ('manual')
+class Signal:
+    __slots__ = ('op', 'coin', 'kind', 'strategy', 'trace')
+
+    def __init__(self, op, coin, kind, strategy='manual', trace=()):
+        self.op = op
+        self.coin = coin
+        self.kind = kind
+        self.strategy = strategy
+        self.trace = trace
+
+
+
+# top of book moved for a coin
+class Tick:
+    __slots__ = ('op', 'coin')
+
+    def __init__(self, coin):
+        self.op = TICK
+        self.coin = coin
+
+
+
+# coins that were updated in the shared buffers, sent --> time.time() when
+# the data was written
+class DisplayUpdate:
+    __slots__ = ('op', 'seqs', 'sent', 'trace')
+
+    def __init__(self, seqs, sent=0.0, trace=()):
+        self.op = DISPLAY_UPDATE
+        self.seqs = seqs
+        self.sent = sent
+        self.trace = trace
+
+
+
+
+# ==== ENCODING
+
+OP = struct.Struct('B')
+SIGNAL = struct.Struct('BBBB')      # op, coin, kind and strategy length
+SEQ = struct.Struct('q')
+SENT = struct.Struct('d')
+
+
+
+# trace --> stamp count byte + one double per stamp
+def packTrace(trace):
+    return OP.pack(len(trace)) + struct.pack(f'{len(trace)}d', *trace)
+
+
+
+# --> (trace, index after it)
+def unpackTrace(raw, i):
+    n = raw[i]
+    return struct.unpack_from(f'{n}d', raw, i + 1), (i + 1 + 8 * n)
+
+
+
+def encode(msg):
+    if (msg.op == BUY_SIGNAL) or (msg.op == SELL_SIGNAL):
+        coin = msg.coin.encode()
+        kind = msg.kind.encode()
+        strategy = msg.strategy.encode()
+        return SIGNAL.pack(msg.op, len(coin), len(kind), len(strategy)) + coin + kind + strategy + packTrace(msg.trace)
+
+    if (msg.op == TICK):
+        return OP.pack(msg.op) + msg.coin.encode()
+
+    if (msg.op == DISPLAY_UPDATE):
+        out = [OP.pack(msg.op), SENT.pack(msg.sent), packTrace(msg.trace)]
+        for coin in msg.seqs:
+            name = coin.encode()
+            out.append(OP.pack(len(name)) + name + SEQ.pack(msg.seqs[coin]))
+        return b''.join(out)
+
+    return OP.pack(msg.op) + packTrace(msg.trace) + pickle.dumps(msg.data, pickle.HIGHEST_PROTOCOL)
+
+
+
+def decode(raw):
+    op = raw[0]
+
+    if (op == BUY_SIGNAL) or (op == SELL_SIGNAL):
+        _, n_coin, n_kind, n_strategy = SIGNAL.unpack_from(raw, 0)
+        i = SIGNAL.size
+        coin = raw[i:(i + n_coin)].decode()
+        kind = raw[(i + n_coin):(i + n_coin + n_kind)].decode()
+        strategy = raw[(i + n_coin + n_kind):(i + n_coin + n_kind + n_strategy)].decode()
+        trace, _ = unpackTrace(raw, i + n_coin + n_kind + n_strategy)
+        return Signal(op, coin, kind, strategy, trace)
+
+    if (op == TICK):
+        return Tick(raw[1:].decode())
+
+    if (op == DISPLAY_UPDATE):
+        sent = SENT.unpack_from(raw, 1)[0]
+        trace, i = unpackTrace(raw, 1 + SENT.size)
+        seqs = {}
+        while (i < len(raw)):
+            n = raw[i]
+            coin = raw[(i + 1):(i + 1 + n)].decode()
+            seqs[coin] = SEQ.unpack_from(raw, i + 1 + n)[0]
+            i += 1 + n + SEQ.size
+        return DisplayUpdate(seqs, sent, trace)
+
+    trace, i = unpackTrace(raw, 1)
+    return Message(op, pickle.loads(raw[i:]), trace)
+
+
+
+def sendMessage(conn, msg):
+    conn.send_bytes(encode(msg))
+
+
+
+def recvMessage(conn):
+    return decode(conn.recv_bytes())
+
+
+
+
+# ==== DISPATCH
+
+class Dispatcher:
+    def __init__(self):
+        self.table = {}
+
+
+
+    # calls handler(message) for every message with the opcode
+    def register(self, op, handler):
+        self.table[op] = handler
+
+
+
+    # messages with no handler are ignored
+    def dispatch(self, msg):
+        handler = self.table.get(msg.op)
+        if handler:
+            handler(msg)
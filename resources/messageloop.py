@@ -0,0 +1,128 @@
+# ================================================
+#   FILE: resources/messageloop.py
+#
+#   Event driven mainloop shared by the data and trader processes. Blocks on
+#   all of the Pipe connections at once with multiprocessing.connection.wait
+#   until a message arrives or the next timer is due, so an idle process uses
+#   no CPU.
+#
+
+
+# ==== IMPORTS
+from multiprocessing.connection import wait
+from resources.message import recvMessage
+
+import time
+
+
+
+
+# messages handled from one Pipe per wakeup, so a busy Pipe can not hold up
+# the other Pipes and the timers
+MAX_DRAIN = 256
+
+
+
+
+class MessageLoop:
+    def __init__(self):
+        self.handlers = {}      # connection --> handler(message)
+        self.timers = []        # [next run, interval, callback]
+        self.running = False
+
+        # messages that were waiting at the last wakeup, counted while they
+        # are drained
+        self.backlog = 0
+        self.max_backlog = 0
+
+
+
+    # calls handler(message) for every message received on the connection
+    def addConnection(self, conn, handler):
+        self.handlers[conn] = handler
+
+
+
+    # calls callback() every `interval` seconds, first run after `delay`
+    # seconds (defaults to one interval)
+    def addTimer(self, interval, callback, delay=None):
+        first = interval if (delay is None) else delay
+        self.timers.append([time.monotonic() + first, interval, callback])
+
+
+
+    # seconds until the next timer is due, None if there are no timers
+    def nextTimeout(self):
+        if not self.timers:
+            return None
+        return max(0, min(t[0] for t in self.timers) - time.monotonic())
+
+
+
+    # blocks until at least one connection is readable or a timer is due,
+    # then dispatches the messages waiting on every ready connection
+    def runOnce(self):
+        ready = wait(list(self.handlers), timeout=self.nextTimeout())
+
+        count = 0
+        for conn in ready:
+            count += self.drainConnection(conn)
+
+        if (ready):
+            self.backlog = count
+            self.max_backlog = max(self.max_backlog, count)
+
+        now = time.monotonic()
+        for timer in self.timers:
+            if (now >= timer[0]):
+                try:
+                    timer[2]()
+                except Exception as e:
+                    print(e)
+
+                # schedule from now so a slow callback does not pile up runs
+                timer[0] = max(timer[0] + timer[1], time.monotonic())
+
+
+
+    # handles the messages waiting on a Pipe, at most MAX_DRAIN --> count
+    def drainConnection(self, conn):
+        count = 0
+        handler = self.handlers[conn]
+
+        while (count < MAX_DRAIN):
+            try:
+                msg = recvMessage(conn)
+            except (EOFError, OSError):
+                # the other end of the Pipe is gone
+                self.handlers.pop(conn, None)
+                break
+
+            count += 1
+            try:
+                handler(msg)
+            except Exception as e:
+                print(e)
+
+            try:
+                if not(conn.poll()):
+                    break
+            except (EOFError, OSError):
+                self.handlers.pop(conn, None)
+                break
+
+        return count
+
+
+
+    # mainloop --> runs until stop() is called or nothing is left to wait on
+    def run(self):
+        self.running = True
+
+        while self.running and (self.handlers or self.timers):
+            self.runOnce()
+
+
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,214 @@
+# ================================================
+#   FILE: resources/metrics.py
+#
+#   Per process latency histograms, counters and gauges in the Prometheus
+#   text format. Every process keeps its own Metrics and writes them to
+#   {metrics_dir}/{process}.prom every metrics_interval seconds (the file is
+#   swapped in with os.replace, so it works with the node_exporter textfile
+#   collector as is). Running this module serves all of the files merged on
+#   localhost:
+#
+#       python -m resources.metrics [database/metrics] [--port 9108]
+#       curl localhost:9108/metrics
+#
+#   The latencies come from the monotonic stage timestamps every message
+#   carries (see the trace in resources/message.py): fetch --> ipc --> compute
+#   --> signal --> quote.
+#
+
+
+# ==== IMPORTS
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import argparse
+import os
+import threading
+
+
+
+
+# seconds, the +Inf bucket is implied
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# name --> (type, help), every metric is exported as palio_{name}
+METRICS = {
+    'fetch_seconds': ('histogram', 'time to pull the candles of every coin'),
+    'api_seconds': ('histogram', 'time of a single api request'),
+    'api_errors_total': ('counter', 'failed api requests'),
+    'api_latency_mean_seconds': ('gauge', 'mean time of the api requests since the start'),
+    'api_latency_max_seconds': ('gauge', 'slowest api request since the start'),
+    'ipc_seconds': ('histogram', 'time a message spent in the Pipe'),
+    'compute_seconds': ('histogram', 'indicator time per coin'),
+    'indicator_cache_total': ('counter', 'indicator cache lookups, unchanged --> same candles as the last refresh'),
+    'signals_total': ('counter', 'buy and sell signals'),
+    'signal_seconds': ('histogram', 'time from the candle fetch to the signal reaching the trader'),
+    'quote_seconds': ('histogram', 'time to get the price for an order'),
+    'pipeline_seconds': ('histogram', 'time from the candle fetch to the order, or to the chart being drawn'),
+    'render_seconds': ('histogram', 'time to draw the charts'),
+    'effects_queue_depth': ('gauge', 'side effects (sounds, prints, journal) waiting for their thread'),
+    'effects_queue_depth_max': ('gauge', 'largest effects_queue_depth so far'),
+    'effects_total': ('counter', 'side effects by result, dropped / coalesced --> the queue was full or had a newer one'),
+    'display_updates_total': ('counter', 'coin snapshots read by the headless gui'),
+    'pipe_backlog': ('gauge', 'messages waiting on the Pipes at the last read'),
+    'pipe_backlog_max': ('gauge', 'largest pipe_backlog so far')
+}
+
+
+
+
+# labels --> '{a="1",b="2"}'
+def formatLabels(labels):
+    if not(labels):
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+
+
+class Metrics:
+    def __init__(self, process, directory=None):
+        self.process = process
+        self.path = os.path.join(directory, f'{process}.prom') if directory else None
+
+        self.histograms = {}    # (name, labels) --> [bucket counts..., sum, count]
+        self.values = {}        # (name, labels) --> counter / gauge value
+
+        # api requests are recorded from the fetcher threads
+        self.lock = threading.Lock()
+
+
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            h = self.histograms.get(key)
+            if (h is None):
+                h = [0] * (len(BUCKETS) + 2)
+                self.histograms[key] = h
+
+            for i, bound in enumerate(BUCKETS):
+                if (value <= bound):
+                    h[i] += 1
+                    break
+            h[-2] += value
+            h[-1] += 1
+
+
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = value
+
+
+
+    # Prometheus text format, every series gets a process label
+    def render(self):
+        with self.lock:
+            series = {}
+            for (name, labels), h in self.histograms.items():
+                series.setdefault(name, []).append((labels, h))
+            for (name, labels), value in self.values.items():
+                series.setdefault(name, []).append((labels, value))
+
+            lines = []
+            for name in sorted(series):
+                kind, description = METRICS.get(name, ('untyped', name))
+                lines.append(f'# HELP palio_{name} {description}')
+                lines.append(f'# TYPE palio_{name} {kind}')
+
+                for labels, value in sorted(series[name], key=lambda s: s[0]):
+                    labels = (('process', self.process),) + labels
+
+                    if (kind != 'histogram'):
+                        lines.append(f'palio_{name}{formatLabels(labels)} {value}')
+                        continue
+
+                    total = 0
+                    for bound, count in zip(BUCKETS, value):
+                        total += count
+                        lines.append(f'palio_{name}_bucket{formatLabels(labels + (("le", bound),))} {total}')
+                    lines.append(f'palio_{name}_bucket{formatLabels(labels + (("le", "+Inf"),))} {value[-1]}')
+                    lines.append(f'palio_{name}_sum{formatLabels(labels)} {value[-2]}')
+                    lines.append(f'palio_{name}_count{formatLabels(labels)} {value[-1]}')
+
+            return '\n'.join(lines) + '\n'
+
+
+
+    # writes the stats file, readers never see a partial one
+    def write(self):
+        if not(self.path):
+            return
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp, self.path)
+
+
+
+
+# ==== ENDPOINT
+
+# every {process}.prom file in the directory, merged --> the samples of a
+# metric have to follow its one HELP and TYPE line
+def readAll(directory):
+    families = {}       # name --> [HELP, TYPE, samples...]
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.prom'):
+            continue
+
+        with open(os.path.join(directory, name)) as f:
+            family = None
+            for line in f.read().splitlines():
+                if line.startswith('# HELP ') or line.startswith('# TYPE '):
+                    family = families.setdefault(line.split()[2], [])
+                    if (len(family) < 2):
+                        family.append(line)
+                elif line and (family is not None):
+                    family.append(line)
+
+    return ''.join(line + '\n' for name in sorted(families) for line in families[name])
+
+
+
+def serve(directory, port):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if (self.path.split('?')[0] not in ('/', '/metrics')):
+                self.send_error(404)
+                return
+
+            body = readAll(directory).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    print(f'serving {directory} on http://127.0.0.1:{port}/metrics')
+    server.serve_forever()
+
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='serve the metrics files of every process on localhost')
+    parser.add_argument('directory', nargs='?', default='database/metrics')
+    parser.add_argument('--port', type=int, default=9108)
+    args = parser.parse_args()
+
+    serve(args.directory, args.port)
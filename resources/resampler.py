@@ -0,0 +1,200 @@
+# ================================================
+#   FILE: resources/resampler.py
+#
+#   Builds higher timeframe OHLCV bars (5m, 15m, 1h, ...) out of the base
+#   timeframe candles the trader already pulls, so no extra v2/candles
+#   requests are needed. Bars are in the same format as the candles
+#   [time, open, high, low, close, volume], timestamped at the start of their
+#   bucket and kept newest first.
+#
+#   Candles are added oldest first as they arrive. The bar of the current
+#   bucket is rebuilt from its member candles every time one of them arrives
+#   or is revised, the members of the previous bucket are kept as well so a
+#   late revision of its last candle still fixes the closed bar.
+#
+#   Off by default, app_variables['resample_timeframes'] turns it on in the
+#   data process, which keeps the indicators and signals of every timeframe
+#   (Data.timeframeValues / Data.timeframeSignals). Running this module
+#   checks them against the indicators computed from scratch on bars
+#   aggregated straight from the candles:
+#
+#       python -m resources.resampler
+#
+
+
+# ==== IMPORTS
+from collections import deque
+from itertools import islice
+
+
+
+
+UNITS = {'m': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000}
+
+
+
+# '15m' --> 900000 (ms)
+def timeframeMs(timeframe):
+    unit = timeframe[-1:]
+    if (unit not in UNITS) or not(timeframe[:-1].isdigit()) or (int(timeframe[:-1]) == 0):
+        raise ValueError(f'unknown timeframe: {timeframe}')
+    return int(timeframe[:-1]) * UNITS[unit]
+
+
+
+
+# ==== SINGLE TIMEFRAME
+
+class Series:
+    def __init__(self, ms, history):
+        self.ms = ms
+        self.bars = deque(maxlen=history)      # newest first
+        self.members = {}                       # bucket --> {time: candle}, last 2 buckets
+
+
+
+    # --> 'new' / 'current' if the newest bar changed, 'revised' if the
+    # previous (closed) bar changed, None if the candle is too old
+    def add(self, candle):
+        bucket = candle[0] - (candle[0] % self.ms)
+
+        if (self.bars) and (bucket < self.bars[0][0]):
+            if (bucket not in self.members) or (len(self.bars) < 2) or (self.bars[1][0] != bucket):
+                return None
+            self.members[bucket][candle[0]] = candle
+            self.bars[1] = self.build(bucket)
+            return 'revised'
+
+        self.members.setdefault(bucket, {})[candle[0]] = candle
+        bar = self.build(bucket)
+
+        if (self.bars) and (self.bars[0][0] == bucket):
+            self.bars[0] = bar
+            return 'current'
+
+        self.bars.appendleft(bar)
+        for old in [b for b in self.members if (b < bucket - self.ms)]:
+            del self.members[old]
+        return 'new'
+
+
+
+    def build(self, bucket):
+        candles = [self.members[bucket][ts] for ts in sorted(self.members[bucket])]
+        return [
+            bucket,
+            candles[0][1],
+            max(candle[2] for candle in candles),
+            min(candle[3] for candle in candles),
+            candles[-1][4],
+            sum(candle[5] for candle in candles)
+        ]
+
+
+
+
+# ==== RESAMPLER
+
+class Resampler:
+    def __init__(self, base, timeframes, history):
+        self.base = base
+        self.history = history
+        self.series = {}        # (coin, timeframe) --> Series
+
+        base_ms = timeframeMs(base)
+        self.timeframes = {}
+        for timeframe in timeframes:
+            ms = timeframeMs(timeframe)
+            if (ms <= base_ms) or (ms % base_ms):
+                raise ValueError(f'{timeframe} is not a multiple of the {base} candles')
+            self.timeframes[timeframe] = ms
+
+
+
+    # adds base candles for a coin, oldest first
+    # --> ({timeframes with a changed bar}, {timeframes where a closed bar was revised})
+    def add(self, coin, candles):
+        changed = set()
+        revised = set()
+
+        for candle in candles:
+            for timeframe, ms in self.timeframes.items():
+                key = (coin, timeframe)
+                if key not in self.series:
+                    self.series[key] = Series(ms, self.history)
+
+                result = self.series[key].add(candle)
+                if result:
+                    changed.add(timeframe)
+                if (result == 'revised'):
+                    revised.add(timeframe)
+
+        return changed, revised
+
+
+
+    # newest first, the last bar is still forming
+    def bars(self, coin, timeframe, limit=None):
+        series = self.series.get((coin, timeframe))
+        if (series is None):
+            return []
+        return list(islice(series.bars, limit))
+
+
+
+
+# ==== CHECK THE DATA PROCESS TIMEFRAMES
+
+if __name__ == '__main__':
+    import random
+    from data import Data
+    from main import APP_VARIABLES
+
+    app_variables = dict(APP_VARIABLES, **{
+        'resample_timeframes': ['5m', '15m'],
+        'candle_store': None,
+        'metrics_dir': None
+    })
+
+    class CheckData(Data):
+        def sendMessage(self, to, message):
+            pass
+
+    rng = random.Random(0)
+    price = 100.0
+    candles = []            # oldest first
+    for t in range(0, 1500):
+        close = round(price * (1 + rng.gauss(0, 0.005)), 4)
+        candles.append([t * 60000, price, max(price, close), min(price, close), close, rng.random()])
+        price = close
+
+    data = CheckData(app_variables, None, None)
+    for i in range(0, len(candles), 7):
+        data.calculateTimeframes({'btcusd': candles[i:(i + 7)][::-1]})
+
+    # revise the newest candle, the forming bars follow it
+    candles[-1] = candles[-1][:4] + [candles[-1][4] * 1.01, candles[-1][5]]
+    data.calculateTimeframes({'btcusd': [candles[-1]]})
+
+    needed = data.indicator_engine.required + 1
+    worst = 0.0
+    for timeframe in app_variables['resample_timeframes']:
+        ms = timeframeMs(timeframe)
+        buckets = {}
+        for candle in candles:
+            buckets.setdefault(candle[0] - (candle[0] % ms), []).append(candle)
+
+        bars = [[b, c[0][1], max(x[2] for x in c), min(x[3] for x in c), c[-1][4], sum(x[5] for x in c)] for b, c in sorted(buckets.items())]
+        expected = data.calculateCoinData(bars[::-1][:needed])
+        values = data.timeframeValues('btcusd', timeframe)
+        assert values is not None, timeframe
+
+        for series in expected:
+            assert len(expected[series]) == len(values[series]), (timeframe, series)
+            for a, b in zip(expected[series], values[series]):
+                worst = max(worst, abs(a - b) / max(1.0, abs(a)))
+
+        print(f'{timeframe}: {len(bars)} bars   signals {data.timeframeSignals("btcusd", timeframe)}')
+
+    print(f'max relative difference: {worst:.3e}')
+    assert worst < 1e-6
@@ -0,0 +1,59 @@
+# ================================================
+#   FILE: resources/sharding.py
+#
+#   Consistent hashing of coins onto the data workers. Every worker owns a
+#   number of points on a hash ring and a coin belongs to the worker of the
+#   first point at or after its own hash, so adding a worker (or a coin) only
+#   moves the coins that land on the new points instead of reshuffling all
+#   of them. md5 is used since hash() of a str changes with every process.
+#
+#   MainApp and the trader build the same ring from the worker count, so
+#   both agree on which worker gets which coin without sending the table.
+#
+
+
+# ==== IMPORTS
+from bisect import bisect_left
+
+import hashlib
+
+
+
+
+def hashOf(key):
+    return int.from_bytes(hashlib.md5(str(key).encode()).digest()[:8], 'big')
+
+
+
+
+class HashRing:
+    def __init__(self, nodes, replicas=64):
+        self.nodes = list(nodes)
+        self.ring = sorted((hashOf(f'{node}#{i}'), node) for node in self.nodes for i in range(0, replicas))
+        self.points = [point for point, _ in self.ring]
+
+
+
+    # worker of a coin
+    def node(self, key):
+        i = bisect_left(self.points, hashOf(key))
+        return self.ring[i % len(self.ring)][1]
+
+
+
+    # {node: [keys]} for every node, in the order the keys were given
+    def assign(self, keys):
+        out_data = {node: [] for node in self.nodes}
+        for key in keys:
+            out_data[self.node(key)].append(key)
+        return out_data
+
+
+
+    # splits a {coin: ...} dict by worker --> {node: {coin: ...}}, nodes
+    # without any of the coins are left out
+    def split(self, d):
+        out_data = {}
+        for key in d:
+            out_data.setdefault(self.node(key), {})[key] = d[key]
+        return out_data
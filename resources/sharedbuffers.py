@@ -0,0 +1,158 @@
+# ================================================
+#   FILE: resources/sharedbuffers.py
+#
+#   Shared memory transport for the indicator data going from the data
+#   process to the gui. Each coin gets one fixed-layout block:
+#
+#       [seq: int64][n: int64][close_prices][emas_long][emas_short][macds][macds_signal][rsis]
+#
+#   with every series stored as display_window float64 values. The writer
+#   bumps seq to an odd number while it writes and to the next even number
+#   when it is done (a seqlock), so the reader can tell a torn read and try
+#   again. Only a small "coin updated, seq N" message goes through the Pipe.
+#
+
+
+# ==== IMPORTS
+from multiprocessing import shared_memory
+
+import atexit
+import struct
+import sys
+
+
+
+
+SERIES = ('close_prices', 'emas_long', 'emas_short', 'macds', 'macds_signal', 'rsis')
+HEADER = struct.Struct('qq')
+
+
+
+
+class IndicatorBuffers:
+    def __init__(self, coins, window, names=None):
+        self.coins = coins
+        self.window = window
+        self.size = HEADER.size + len(SERIES) * window * 8
+
+        # names of the shared blocks, None --> create new ones
+        self.owner = names is None
+        self.names = names
+        self.blocks = None
+        self.views = None
+
+        if self.owner:
+            blocks = {coin: shared_memory.SharedMemory(create=True, size=self.size) for coin in coins}
+            self.names = {coin: blocks[coin].name for coin in coins}
+            self.setBlocks(blocks)
+
+
+
+    # only the block names are pickled, a spawned process attaches by name
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['owner'] = False
+        state['blocks'] = None
+        state['views'] = None
+        return state
+
+
+
+    def setBlocks(self, blocks):
+        self.blocks = blocks
+        self.views = {coin: blocks[coin].buf[HEADER.size:].cast('d') for coin in blocks}
+
+
+
+    # attaches to the blocks created by the owning process
+    def attach(self):
+        if self.blocks is not None:
+            return
+
+        # child processes share the owner's resource tracker, so attaching
+        # does not add a second registration that could unlink the blocks
+        blocks = {}
+        for coin in self.coins:
+            if (sys.version_info >= (3, 13)):
+                blocks[coin] = shared_memory.SharedMemory(name=self.names[coin], track=False)
+            else:
+                blocks[coin] = shared_memory.SharedMemory(name=self.names[coin])
+
+        self.setBlocks(blocks)
+
+        # release the views before the blocks get garbage collected at exit
+        atexit.register(self.close)
+
+
+
+    # writes the data for a coin and returns its new sequence number
+    #   d --> {'close_prices': [...], 'emas_long': [...], ...}
+    def write(self, coin, d):
+        self.attach()
+
+        buf = self.blocks[coin].buf
+        seq, _ = HEADER.unpack_from(buf, 0)
+        n = min(self.window, min(len(d[series]) for series in SERIES))
+        values = struct.Struct(f'{n}d')
+
+        HEADER.pack_into(buf, 0, seq + 1, n)
+
+        for i, series in enumerate(SERIES):
+            values.pack_into(buf, HEADER.size + i * self.window * 8, *d[series][-n:])
+
+        HEADER.pack_into(buf, 0, seq + 2, n)
+        return seq + 2
+
+
+
+    # returns the sequence number of a coin, odd while a write is in progress
+    def sequence(self, coin):
+        self.attach()
+        return HEADER.unpack_from(self.blocks[coin].buf, 0)[0]
+
+
+
+    # returns (seq, {series: memoryview of float64}) without copying, or
+    # (None, None) if no complete write is available. Callers that keep using
+    # the views should check sequence(coin) == seq afterwards.
+    def read(self, coin, attempts=3):
+        self.attach()
+
+        buf = self.blocks[coin].buf
+        view = self.views[coin]
+
+        for i in range(0, attempts):
+            seq, n = HEADER.unpack_from(buf, 0)
+            if (seq == 0) or (seq % 2):
+                continue
+
+            out = {}
+            for j, series in enumerate(SERIES):
+                start = j * self.window
+                out[series] = view[start:(start + n)]
+
+            if (HEADER.unpack_from(buf, 0)[0] == seq):
+                return seq, out
+
+        return None, None
+
+
+
+    # releases the views and closes the blocks, the owner also unlinks them
+    def close(self):
+        if self.blocks is None:
+            return
+
+        for coin in self.blocks:
+            try:
+                self.views[coin].release()
+                self.blocks[coin].close()
+            except BufferError:
+                # something still holds a view, the mapping goes away on exit
+                pass
+
+            if self.owner:
+                self.blocks[coin].unlink()
+
+        self.blocks = None
+        self.views = None
@@ -0,0 +1,111 @@
+# ================================================
+#   FILE: resources/stoploss.py
+#
+#   Trailing stop loss engine for the trader process. Keeps the stop prices
+#   of every open position in a sorted list of distinct levels per coin, so
+#   each price update only touches the ends of the list:
+#
+#       - levels above the price have been hit --> their positions are sold
+#       - levels below price * (1 - stop_loss_percent) are raised in bulk,
+#         merged into a single level at the new stop
+#
+#   Both are a bisect plus a slice, O(log n) per update plus the positions
+#   that actually trigger or move. Any number of positions per coin.
+#
+
+
+# ==== IMPORTS
+from bisect import bisect_left, bisect_right, insort
+
+
+
+
+class StopEngine:
+    def __init__(self, percent, round_amounts):
+        self.percent = percent
+        self.round_amounts = round_amounts
+
+        self.levels = {}        # coin --> sorted list of distinct stop prices
+        self.groups = {}        # coin --> {stop price: set of position ids}
+        self.stops = {}         # position id --> (coin, stop price)
+
+
+
+    # stop price for a position that was bought at `price`
+    def calculateStop(self, coin, price):
+        return round(price - (price * self.percent), self.round_amounts[coin])
+
+
+
+    # starts tracking a position, returns its stop price
+    def add(self, coin, position_id, price):
+        stop = self.calculateStop(coin, price)
+        self.place(coin, stop, {position_id})
+        return stop
+
+
+
+    # stops tracking a position (sold by a signal)
+    def remove(self, position_id):
+        coin, stop = self.stops.pop(position_id)
+        group = self.groups[coin][stop]
+        group.discard(position_id)
+
+        if not(group):
+            del self.groups[coin][stop]
+            self.levels[coin].pop(bisect_left(self.levels[coin], stop))
+
+
+
+    # current stop price of a position
+    def stop(self, position_id):
+        return self.stops[position_id][1]
+
+
+
+    # adds positions at a stop level, merging into the level if it exists
+    def place(self, coin, stop, ids):
+        levels = self.levels.setdefault(coin, [])
+        groups = self.groups.setdefault(coin, {})
+
+        if stop in groups:
+            groups[stop] |= ids
+        else:
+            groups[stop] = set(ids)
+            insort(levels, stop)
+
+        for position_id in ids:
+            self.stops[position_id] = (coin, stop)
+
+
+
+    # evaluates a new price for a coin --> returns the ids of the positions
+    # whose stop was hit (they are no longer tracked) and raises the trailing
+    # stops of the rest
+    def update(self, coin, price):
+        levels = self.levels.get(coin)
+        if not(levels):
+            return []
+
+        groups = self.groups[coin]
+
+        # stops above the price --> sell
+        triggered = []
+        i = bisect_right(levels, price)
+        for stop in levels[i:]:
+            for position_id in groups.pop(stop):
+                del self.stops[position_id]
+                triggered.append(position_id)
+        del levels[i:]
+
+        # stops below the new trailing stop --> raise them all to it
+        new_stop = self.calculateStop(coin, price)
+        j = bisect_left(levels, new_stop)
+        if (j > 0):
+            raised = set()
+            for stop in levels[:j]:
+                raised |= groups.pop(stop)
+            del levels[:j]
+            self.place(coin, new_stop, raised)
+
+        return triggered
@@ -0,0 +1,323 @@
+# ================================================
+#   FILE: resources/strategies.py
+#
+#   Declarative buy / sell rules, app_variables['strategies']:
+#
+#       {strategy id: {
+#           'params': {name: value},                    optional constants
+#           'buy':  [[kind, expression], ...],          in priority order
+#           'sell': [[kind, expression], ...]
+#       }}
+#
+#   Expressions are python syntax over the indicator values of the newest
+#   candle:
+#
+#       price, ema_long, ema_short, macd, macd_signal, rsi
+#       numbers, params of the strategy, numeric app variables (rsi_crossover)
+#       < > <= >= (chained too), and or not, + - * /
+#       prev(x)                 --> x one candle earlier
+#       crosses_above(a, b)     --> a > b and prev(a) < prev(b)
+#       crosses_below(a, b)     --> a < b and prev(a) > prev(b)
+#
+#   Every strategy is compiled into one shared rule graph, the same sub
+#   expression in several strategies is a single node. The graph is turned
+#   into python functions that compute every node once, on plain floats per
+#   coin or on numpy arrays with one value per coin when there are enough
+#   coins to be worth it, so N strategies cost little more than one. The
+#   first matching rule of a strategy, buys before sells, is its signal for
+#   the coin. The array version also runs over every candle of a history at
+#   once (optimize.py). numpy is only imported once arrays are needed.
+#
+
+
+# ==== IMPORTS
+from resources.message import BUY_SIGNAL, SELL_SIGNAL
+
+import ast
+
+
+
+
+# expression name --> Data.calculateData output series
+SERIES = {
+    'price': 'close_prices',
+    'ema_long': 'emas_long',
+    'ema_short': 'emas_short',
+    'macd': 'macds',
+    'macd_signal': 'macds_signal',
+    'rsi': 'rsis'
+}
+
+# the original hard-coded strategy
+DEFAULT_STRATEGIES = {
+    'default': {
+        'buy': [
+            ['macd', 'price > ema_short > ema_long and crosses_above(macd, macd_signal) and rsi > rsi_crossover'],
+            ['rsi', 'price > ema_short > ema_long and crosses_above(rsi, rsi_crossover) and macd > macd_signal'],
+            ['ema', 'price > ema_short > ema_long and not(prev(price) > prev(ema_short) > prev(ema_long)) and macd > macd_signal and rsi > rsi_crossover']
+        ],
+        'sell': [
+            ['macd', 'crosses_below(macd, macd_signal)'],
+            ['rsi', 'crosses_below(rsi, rsi_crossover)']
+        ]
+    }
+}
+
+COMPARE = {ast.Lt: '<', ast.Gt: '>', ast.LtE: '<=', ast.GtE: '>='}
+ARITHMETIC = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/'}
+
+# node operation --> python source, for floats and for numpy arrays
+OPERATIONS = {
+    '<': '{0} < {1}',
+    '>': '{0} > {1}',
+    '<=': '{0} <= {1}',
+    '>=': '{0} >= {1}',
+    '+': '{0} + {1}',
+    '-': '{0} - {1}',
+    '*': '{0} * {1}',
+    '/': '{0} / {1}',
+    'and': '{0} and {1}',
+    'or': '{0} or {1}',
+    'not': 'not {0}',
+    'neg': '-{0}'
+}
+
+VECTOR_OPERATIONS = dict(OPERATIONS, **{
+    'and': 'np.logical_and({0}, {1})',
+    'or': 'np.logical_or({0}, {1})',
+    'not': 'np.logical_not({0})'
+})
+
+# below this many coins the per coin functions are faster than gathering
+# the arrays
+VECTOR_MIN_COINS = 64
+
+
+
+
+class StrategyEngine:
+    def __init__(self, strategies, app_vars):
+        self.app_variables = app_vars
+
+        self.nodes = []         # (op, args), args of an operation are node indices
+        self.index = {}         # (op, args) --> node index
+        self.rules = {}         # strategy --> [(BUY_SIGNAL / SELL_SIGNAL, kind, node)]
+        self.ranges = {}        # strategy --> (first, last + 1) of its rules in the outputs
+
+        # values per series the rules need --> Data.calculateData output has
+        # to hold at least `depth` values
+        self.depth = 1
+
+        for strategy, spec in strategies.items():
+            params = spec.get('params', {})
+            self.rules[strategy] = []
+            for op, side in ((BUY_SIGNAL, 'buy'), (SELL_SIGNAL, 'sell')):
+                for kind, expression in spec.get(side, []):
+                    try:
+                        node = self.compile(ast.parse(expression, mode='eval').body, params, 0)
+                    except (SyntaxError, ValueError) as e:
+                        raise ValueError(f'strategy {strategy}, {side} {kind}: {e}')
+                    self.rules[strategy].append((op, kind, node))
+
+        outputs = []
+        for strategy, rules in self.rules.items():
+            self.ranges[strategy] = (len(outputs), len(outputs) + len(rules))
+            outputs += [node for _, _, node in rules]
+
+        # (series, lag) values the rules read
+        self.inputs = sorted({args for op, args in self.nodes if (op == 'series')})
+
+        # numpy and the array function, loaded the first time they are needed
+        self.np = None
+        self.vector = None
+
+        self.outputs = outputs
+        self.scalar = self.build(outputs, False)
+
+
+
+    # index of the node, shared with any identical one
+    def node(self, op, *args):
+        key = (op, args)
+        if key not in self.index:
+            self.index[key] = len(self.nodes)
+            self.nodes.append(key)
+        return self.index[key]
+
+
+
+    # expression tree --> node index, lag counts the prev() around it
+    def compile(self, e, params, lag):
+        if isinstance(e, ast.BoolOp):
+            op = 'and' if isinstance(e.op, ast.And) else 'or'
+            node = self.compile(e.values[0], params, lag)
+            for value in e.values[1:]:
+                node = self.node(op, node, self.compile(value, params, lag))
+            return node
+
+        if isinstance(e, ast.UnaryOp) and isinstance(e.op, (ast.Not, ast.USub)):
+            return self.node('not' if isinstance(e.op, ast.Not) else 'neg', self.compile(e.operand, params, lag))
+
+        # a < b < c --> a < b and b < c
+        if isinstance(e, ast.Compare):
+            terms = [self.compile(t, params, lag) for t in [e.left] + e.comparators]
+            node = None
+            for i, op in enumerate(e.ops):
+                if type(op) not in COMPARE:
+                    raise ValueError(f'unsupported comparison {type(op).__name__}')
+                test = self.node(COMPARE[type(op)], terms[i], terms[i + 1])
+                node = test if (node is None) else self.node('and', node, test)
+            return node
+
+        if isinstance(e, ast.BinOp) and (type(e.op) in ARITHMETIC):
+            return self.node(ARITHMETIC[type(e.op)], self.compile(e.left, params, lag), self.compile(e.right, params, lag))
+
+        if isinstance(e, ast.Constant) and isinstance(e.value, (int, float)) and not isinstance(e.value, bool):
+            return self.node('const', float(e.value))
+
+        if isinstance(e, ast.Name):
+            if e.id in SERIES:
+                self.depth = max(self.depth, lag + 1)
+                return self.node('series', SERIES[e.id], lag)
+            if e.id in params:
+                return self.node('const', float(params[e.id]))
+            if isinstance(self.app_variables.get(e.id), (int, float)):
+                return self.node('const', float(self.app_variables[e.id]))
+            raise ValueError(f'unknown name {e.id}')
+
+        if isinstance(e, ast.Call) and isinstance(e.func, ast.Name) and not(e.keywords):
+            name = e.func.id
+            if (name == 'prev') and (len(e.args) == 1):
+                return self.compile(e.args[0], params, lag + 1)
+
+            if (name in ('crosses_above', 'crosses_below')) and (len(e.args) == 2):
+                a, b = e.args
+                now, before = ('>', '<') if (name == 'crosses_above') else ('<', '>')
+                return self.node('and',
+                    self.node(now, self.compile(a, params, lag), self.compile(b, params, lag)),
+                    self.node(before, self.compile(a, params, lag + 1), self.compile(b, params, lag + 1)))
+
+        raise ValueError(f'unsupported expression {ast.unparse(e)}')
+
+
+
+    # python function for the graph, computes every node once in order
+    #   scalar --> f(values) with values = {series: [...]} of one coin, returns
+    #              the rule outputs
+    #   vector --> f(inputs, n) with inputs = {(series, lag): array of n},
+    #              returns a bool array of rule outputs x n
+    def build(self, outputs, vector):
+        operations = VECTOR_OPERATIONS if vector else OPERATIONS
+
+        lines = []
+        varying = set()         # nodes that depend on a series
+        for i, (op, args) in enumerate(self.nodes):
+            if (op == 'series'):
+                name, lag = args
+                if vector:
+                    lines.append(f'v{i} = inputs[{args!r}]')
+                else:
+                    lines.append(f'v{i} = values[{name!r}][{-1 - lag}]')
+                varying.add(i)
+            elif (op == 'const'):
+                lines.append(f'v{i} = {args[0]!r}')
+            else:
+                lines.append(f'v{i} = ' + operations[op].format(*(f'(v{a})' for a in args)))
+                if any(a in varying for a in args):
+                    varying.add(i)
+
+        if vector:
+            # rules without a series are the same for every value
+            terms = [f'v{node}' if (node in varying) else f'np.full(n, bool(v{node}))' for node in outputs]
+            lines.append(f"return np.array([{', '.join(terms)}], dtype=bool).reshape({len(outputs)}, n)")
+            source = 'def rules(inputs, n):\n'
+        else:
+            lines.append(f"return ({''.join(f'v{node}, ' for node in outputs)})")
+            source = 'def rules(values):\n'
+
+        source += ''.join(f'    {line}\n' for line in lines)
+        scope = {'np': self.np}
+        exec(compile(source, '<strategies>', 'exec'), scope)
+        return scope['rules']
+
+
+
+    # runs every strategy on the newest values of each coin
+    #   d --> {coin: Data.calculateData output}
+    # returns {coin: {strategy: (BUY_SIGNAL / SELL_SIGNAL, kind)}} for the
+    # coins with a signal
+    def evaluate(self, d):
+        if (len(d) >= VECTOR_MIN_COINS) and self.loadVector():
+            return self.evaluateVectorized(d)
+
+        out_data = {}
+        for coin in d:
+            outputs = self.scalar(d[coin])
+            for strategy, rules in self.rules.items():
+                first = self.ranges[strategy][0]
+                for i, (op, kind, _) in enumerate(rules):
+                    if outputs[first + i]:
+                        out_data.setdefault(coin, {})[strategy] = (op, kind)
+                        break
+
+        return out_data
+
+
+
+    # imports numpy and builds the array function on first use
+    # --> False without numpy
+    def loadVector(self):
+        if (self.vector is None):
+            try:
+                import numpy
+            except ImportError:
+                self.vector = False
+                return False
+
+            self.np = numpy
+            self.vector = self.build(self.outputs, True)
+
+        return bool(self.vector)
+
+
+
+    # every coin at once, first matching rule per coin with argmax
+    def evaluateVectorized(self, d):
+        np = self.np
+        coins = list(d)
+        inputs = {(name, lag): np.array([d[coin][name][-1 - lag] for coin in coins]) for name, lag in self.inputs}
+        outputs = self.vector(inputs, len(coins))
+
+        out_data = {}
+        for strategy, rules in self.rules.items():
+            first, last = self.ranges[strategy]
+            if (first == last):
+                continue
+
+            masks = outputs[first:last]
+            matched = masks.argmax(axis=0)
+            for i in np.flatnonzero(masks.any(axis=0)):
+                op, kind, _ = rules[matched[i]]
+                out_data.setdefault(coins[i], {})[strategy] = (op, kind)
+
+        return out_data
+
+
+
+    # buy and sell masks of one strategy over arrays of n values each, e.g.
+    # every candle of a coin's history
+    #   inputs --> {(series, lag): array} for every pair in self.inputs
+    # a candle with a matching buy rule never sells, like evaluate
+    def evaluateArrays(self, strategy, inputs, n):
+        if not(self.loadVector()):
+            raise ImportError('evaluateArrays needs numpy')
+
+        outputs = self.vector(inputs, n)
+        first, _ = self.ranges[strategy]
+        rows = {BUY_SIGNAL: [], SELL_SIGNAL: []}
+        for i, (op, _, _) in enumerate(self.rules[strategy]):
+            rows[op].append(first + i)
+
+        buy = outputs[rows[BUY_SIGNAL]].any(axis=0)
+        sell = ~buy & outputs[rows[SELL_SIGNAL]].any(axis=0)
+        return buy, sell
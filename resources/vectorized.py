@@ -0,0 +1,177 @@
+# ================================================
+#   FILE: resources/vectorized.py
+#
+#   NumPy backend for the indicator calculations. Packs the candles of every
+#   coin into 2-D arrays (coins x time) and computes the EMAs, MACD, MACD
+#   signal and RSI for all of them in one batched pass. The EMA recursions are
+#   written as a matrix product with a precomputed lower triangular weight
+#   matrix, so there are no per element Python loops.
+#
+#   Select with app_variables['indicator_backend'] = 'numpy'. Running this
+#   module checks the results against the pure Python Data.calculateFull*
+#   methods:
+#
+#       python -m resources.vectorized
+#
+
+
+# ==== IMPORTS
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+
+
+class BatchIndicators:
+    def __init__(self, app_vars):
+        self.app_variables = app_vars
+
+        self.window = app_vars['display_window']
+        self.p_long = app_vars['periods_long']
+        self.p_short = app_vars['periods_short']
+        self.p_signal = app_vars['periods_signal']
+        self.p_rsi = app_vars['periods_rsi']
+
+        # candles needed for every indicator to fill the display window
+        self.required = self.window + max(self.p_long, self.p_short, self.p_rsi)
+
+        self.ema_weights = {}
+        self.signal_weights = self.signalWeights(self.p_signal)
+
+
+
+    # weights so that (x @ weights.T) runs the ema recursion over each row of x
+    # and (seed * decay) adds the contribution of the starting value
+    def emaWeights(self, periods):
+        if periods not in self.ema_weights:
+            w = self.window
+            k = self.app_variables['ema_smoothing'] / (1 + periods)
+            a = 1 - k
+
+            steps = np.arange(w)
+            lags = steps[:, None] - steps[None, :]
+            weights = np.where(lags >= 0, k * a ** np.maximum(lags, 0), 0.0)
+            decay = a ** (steps + 1)
+
+            self.ema_weights[periods] = (weights, decay)
+
+        return self.ema_weights[periods]
+
+
+
+    # same as emaWeights but for the signal line, which is seeded with the
+    # first macd value instead of an sma
+    def signalWeights(self, periods):
+        w = self.window
+        k = self.app_variables['ema_smoothing'] / (1 + periods)
+        a = 1 - k
+
+        steps = np.arange(w)
+        lags = steps[:, None] - steps[None, :]
+        weights = np.where(lags >= 0, k * a ** np.maximum(lags, 0), 0.0)
+        weights[:, 0] = a ** steps
+
+        return weights
+
+
+
+    # calculates all indicators for every coin
+    #   d --> {coin: [candles newest first]}
+    # returns {coin: data} for the coins with enough history
+    def calculate(self, d):
+        coins = [coin for coin in d if len(d[coin]) >= self.required]
+        if not coins:
+            return {}
+
+        w = self.window
+        r = self.required
+
+        # pack the last `required` candles of each coin, oldest first
+        candles = np.array([d[coin][:r] for coin in coins], dtype=np.float64)[:, ::-1, :]
+        opens = candles[:, :, 1]
+        closes = candles[:, :, 4]
+        prices = closes[:, -w:]
+
+        def emas(periods):
+            weights, decay = self.emaWeights(periods)
+            seed = closes[:, (r - w - periods):(r - w)].sum(axis=1) / periods
+            return prices @ weights.T + seed[:, None] * decay[None, :]
+
+        emas_long = emas(self.p_long)
+        emas_short = emas(self.p_short)
+        macds = emas_short - emas_long
+
+        macds_signal = macds @ self.signal_weights.T
+        macds_signal[:, 0] = macds_signal[:, 1]
+
+        # rsi over the candle bodies in each `periods_rsi` window
+        chng = (opens - closes)[:, -(w + self.p_rsi - 1):]
+        down = np.where(chng > 0, chng, 0.0)
+        up = np.where(chng > 0, 0.0, -chng)
+        avg_up = sliding_window_view(up, self.p_rsi, axis=1).sum(axis=2) / self.p_rsi
+        avg_down = sliding_window_view(down, self.p_rsi, axis=1).sum(axis=2) / self.p_rsi
+        rs = avg_up / np.where(avg_down == 0, 1, avg_down)
+        rsis = 100 - (100 / (1 + rs))
+
+        out_data = {}
+        for i, coin in enumerate(coins):
+            out_data[coin] = {
+                'close_prices': prices[i].tolist(),
+                'emas_long': emas_long[i].tolist(),
+                'emas_short': emas_short[i].tolist(),
+                'macds': macds[i].tolist(),
+                'macds_signal': macds_signal[i].tolist(),
+                'rsis': rsis[i].tolist()
+            }
+
+        return out_data
+
+
+
+
+# ==== CHECK AGAINST THE PURE PYTHON BACKEND
+
+if __name__ == '__main__':
+    import random
+    from data import Data
+    from main import APP_VARIABLES
+
+    # the app defaults (the strategies need rsi_crossover and the like),
+    # nothing read from or written to disk
+    app_variables = dict(APP_VARIABLES, **{
+        'display_window': 60,
+        'periods_long': 26,
+        'periods_short': 12,
+        'periods_signal': 9,
+        'periods_rsi': 20,
+        'ema_smoothing': 2,
+        'candle_store': None,
+        'metrics_dir': None,
+        'resample_timeframes': []
+    })
+
+    rng = random.Random(0)
+    d = {}
+    for c in range(0, 50):
+        price = 100.0
+        candles = []
+        for t in range(0, 1440):
+            close = round(price * (1 + rng.gauss(0, 0.005)), 4)
+            candles.append([t * 60000, price, max(price, close), min(price, close), close, rng.random()])
+            price = close
+        candles.reverse()
+        d[f'coin{c}'] = candles
+
+    batch = BatchIndicators(app_variables).calculate(d)
+    data = Data(app_variables, None, None)
+
+    worst = 0.0
+    for coin in d:
+        expected = data.calculateCoinData(d[coin])
+        for key in expected:
+            assert len(expected[key]) == len(batch[coin][key]), key
+            for a, b in zip(expected[key], batch[coin][key]):
+                worst = max(worst, abs(a - b) / max(1.0, abs(a)))
+
+    print(f'max relative difference: {worst:.3e}')
+    assert worst < 1e-9
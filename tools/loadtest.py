@@ -0,0 +1,295 @@
+# ================================================
+#   FILE: tools/loadtest.py
+#
+#   Runs the whole app headless (MainApp with the headless gui) against
+#   tools/mock_exchange.py, once per symbol count, and reports throughput
+#   and latency from the metrics files the processes write:
+#
+#       pulls       candle pulls finished, fetch p50 / p95 (trader)
+#       coins/s     coin refreshes through the indicators (data workers)
+#       signals/s   buy and sell signals, signal p50 / p95 / p99 from the
+#                   candle fetch to the signal reaching the trader
+#       order p95   fetch to filled order, display p95 fetch to the headless gui
+#       api         requests per second the mock answered, 429s and 5xx
+#
+#   Every run waits --warmup seconds (the first pull sends the whole history)
+#   and then measures --duration seconds. A run is flagged SATURATED when the
+#   pulls no longer keep up with pull_interval, which is where the scaling
+#   limit is.
+#
+#       python -m tools.loadtest --symbols 10 100 1000 --duration 60
+#       python -m tools.loadtest --symbols 200 --latency 50 --jitter 20 --error-rate 0.02 --rate-limit 100
+#
+#   The output of the app processes goes to {dir}/app.log.
+#
+
+
+# ==== IMPORTS
+from multiprocessing import Process
+
+from benchmarks.market import coinNames
+from main import APP_VARIABLES, MainApp
+from resources.metrics import BUCKETS, readAll
+from tools.mock_exchange import runServer
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import urllib.request
+
+
+
+
+SAMPLE = re.compile(r'^(\w+?)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+
+
+
+# ==== METRICS
+
+# Prometheus text --> {(name, labels): value}, labels as a sorted tuple
+def parseSamples(text):
+    samples = {}
+    for line in text.splitlines():
+        match = SAMPLE.match(line)
+        if not(match) or line.startswith('#'):
+            continue
+
+        name, labels, value = match.groups()
+        samples[(name, tuple(sorted(LABEL.findall(labels or ''))))] = float(value)
+
+    return samples
+
+
+
+# every metrics file of the run
+def snapshot(directory):
+    if not os.path.isdir(directory):
+        return {}
+    return parseSamples(readAll(directory))
+
+
+
+# sum of the samples of a metric that have all of the labels, difference
+# between two snapshots
+def total(before, after, name, **labels):
+    def pick(samples):
+        return sum(value for (n, l), value in samples.items() if (n == name) and (set(labels.items()) <= set(l)))
+
+    return pick(after) - pick(before)
+
+
+
+# quantile of a histogram between two snapshots, interpolated inside the
+# bucket like histogram_quantile --> seconds, None without observations
+def quantile(before, after, name, q, **labels):
+    counts = [total(before, after, f'{name}_bucket', le=str(bound), **labels) for bound in BUCKETS]
+    count = total(before, after, f'{name}_count', **labels)
+    if not(count):
+        return None
+
+    rank = q * count
+    lower = 0.0
+    below = 0.0
+    for bound, cumulative in zip(BUCKETS, counts):
+        if (cumulative >= rank):
+            return lower + (bound - lower) * (rank - below) / max(cumulative - below, 1)
+        lower = bound
+        below = cumulative
+
+    return BUCKETS[-1]
+
+
+
+# max of a gauge over every process
+def peak(samples, name):
+    return max((value for (n, _), value in samples.items() if (n == name)), default=0)
+
+
+
+
+# ==== RUN
+
+def mockStats(port):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/stats', timeout=5) as response:
+        return json.load(response)
+
+
+
+# blocks until the mock answers
+def waitForMock(port, timeout=30):
+    end = time.monotonic() + timeout
+    while True:
+        try:
+            return mockStats(port)
+        except OSError:
+            if (time.monotonic() > end):
+                raise
+            time.sleep(0.1)
+
+
+
+# app variables for a run, every file goes to the run directory
+def appVariables(args, coins, directory):
+    return dict(APP_VARIABLES, **{
+        'coins': coins,
+        'base_url': f'http://127.0.0.1:{args.port}/',
+        'market_data': 'rest',
+        'pull_interval': args.pull_interval,
+        'api_rate_limit': args.api_rate_limit,
+        'api_burst': args.api_burst,
+        'fetch_workers': args.fetch_workers,
+        'data_workers': args.data_workers,
+        'indicator_backend': args.backend,
+        'gui_transport': args.transport,
+        'candle_store': None,
+        'journal': os.path.join(directory, 'journal.db'),
+        'metrics_dir': os.path.join(directory, 'metrics'),
+        'metrics_interval': 1,
+        'sounds': False,
+        'round_amounts': {coin: 6 for coin in coins}
+    })
+
+
+
+# one run with n symbols --> report dict
+def run(args, n, directory, log):
+    os.makedirs(directory, exist_ok=True)
+    coins = coinNames(n)
+    app_vars = appVariables(args, coins, directory)
+
+    # one new candle per pull unless --speed says otherwise
+    speed = args.speed or (60 / args.pull_interval)
+    mock = Process(target=runServer, args=('127.0.0.1', args.port, args.seed, args.history, speed), kwargs={
+        'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate,
+        'rate_limit': args.rate_limit, 'burst': args.burst
+    }, daemon=True)
+    mock.start()
+    waitForMock(args.port)
+
+    # the app processes inherit the redirected stdout
+    sys.stdout.flush()
+    stdout = os.dup(1)
+    os.dup2(log.fileno(), 1)
+    try:
+        app = MainApp(app_variables=app_vars, headless=True)
+        app.launch()
+
+        time.sleep(args.warmup)
+        before, api_before = snapshot(app_vars['metrics_dir']), mockStats(args.port)
+        time.sleep(args.duration)
+        after, api_after = snapshot(app_vars['metrics_dir']), mockStats(args.port)
+
+        app.stop()
+    finally:
+        sys.stdout.flush()
+        os.dup2(stdout, 1)
+        os.close(stdout)
+        mock.terminate()
+        mock.join()
+
+    def status(stats, prefix):
+        return sum(count for code, count in stats['status'].items() if code.startswith(prefix))
+
+    duration = args.duration
+    pulls = total(before, after, 'palio_fetch_seconds_count')
+    computed = total(before, after, 'palio_compute_seconds_count') - total(before, after, 'palio_compute_seconds_count', coin='all')
+
+    report = {
+        'symbols': n,
+        'pulls': pulls,
+        'expected_pulls': duration / args.pull_interval,
+        'fetch_p50': quantile(before, after, 'palio_fetch_seconds', 0.5),
+        'fetch_p95': quantile(before, after, 'palio_fetch_seconds', 0.95),
+        'coins_per_second': computed / duration,
+        'signals_per_second': total(before, after, 'palio_signals_total') / duration,
+        'signal_p50': quantile(before, after, 'palio_signal_seconds', 0.5),
+        'signal_p95': quantile(before, after, 'palio_signal_seconds', 0.95),
+        'signal_p99': quantile(before, after, 'palio_signal_seconds', 0.99),
+        'order_p95': quantile(before, after, 'palio_pipeline_seconds', 0.95, stage='buy'),
+        'display_p95': quantile(before, after, 'palio_pipeline_seconds', 0.95, stage='display'),
+        'api_per_second': (api_after['requests'] - api_before['requests']) / duration,
+        'api_429': status(api_after, '429') - status(api_before, '429'),
+        'api_5xx': status(api_after, '5') - status(api_before, '5'),
+        'api_errors': total(before, after, 'palio_api_errors_total'),
+        'pipe_backlog_max': peak(after, 'palio_pipe_backlog_max')
+    }
+    report['saturated'] = (pulls < 0.9 * report['expected_pulls']) or ((report['fetch_p95'] or 0) > args.pull_interval)
+    return report
+
+
+
+
+# ==== REPORT
+
+def ms(seconds):
+    return '-' if (seconds is None) else f'{seconds * 1000:.0f}'
+
+
+
+def printReports(reports):
+    print(f"{'SYMBOLS':>8} {'PULLS':>9} {'FETCH p50/p95 ms':>17} {'COINS/s':>9} {'SIG/s':>7} "
+          f"{'SIGNAL p50/p95/p99 ms':>22} {'ORDER p95':>10} {'DISPLAY p95':>12} {'API/s':>7} {'429':>5} {'5xx':>5} {'BACKLOG':>8}")
+
+    for r in reports:
+        pulls = f"{r['pulls']:.0f}/{r['expected_pulls']:.0f}"
+        fetch = f"{ms(r['fetch_p50'])}/{ms(r['fetch_p95'])}"
+        signal = f"{ms(r['signal_p50'])}/{ms(r['signal_p95'])}/{ms(r['signal_p99'])}"
+        flag = '  SATURATED' if r['saturated'] else ''
+        print(f"{r['symbols']:>8} {pulls:>9} {fetch:>17} {r['coins_per_second']:>9.1f} {r['signals_per_second']:>7.2f} "
+              f"{signal:>22} {ms(r['order_p95']):>10} {ms(r['display_p95']):>12} {r['api_per_second']:>7.1f} "
+              f"{r['api_429']:>5} {r['api_5xx']:>5} {r['pipe_backlog_max']:>8.0f}{flag}")
+
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='run the app headless against the mock exchange and report throughput and latency')
+    parser.add_argument('--symbols', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--duration', type=float, default=60, help='seconds measured per run')
+    parser.add_argument('--warmup', type=float, default=15, help='seconds before measuring')
+    parser.add_argument('--pull-interval', type=float, default=5, help='seconds between candle pulls')
+    parser.add_argument('--dir', help='run directory, defaults to a new temporary one')
+    parser.add_argument('--json', help='also write the reports to this file')
+
+    app = parser.add_argument_group('app')
+    app.add_argument('--data-workers', type=int, default=APP_VARIABLES['data_workers'])
+    app.add_argument('--backend', default=APP_VARIABLES['indicator_backend'])
+    app.add_argument('--transport', default=APP_VARIABLES['gui_transport'])
+    app.add_argument('--fetch-workers', type=int, default=APP_VARIABLES['fetch_workers'])
+    app.add_argument('--api-rate-limit', type=float, default=1000, help='trader side requests per second')
+    app.add_argument('--api-burst', type=int, default=50)
+
+    mock = parser.add_argument_group('mock exchange')
+    mock.add_argument('--port', type=int, default=8088)
+    mock.add_argument('--seed', type=int, default=0)
+    mock.add_argument('--history', type=int, default=1440)
+    mock.add_argument('--speed', type=float, help='simulated seconds per second, defaults to one candle per pull')
+    mock.add_argument('--latency', type=float, default=0.0, help='ms')
+    mock.add_argument('--jitter', type=float, default=0.0, help='ms')
+    mock.add_argument('--error-rate', type=float, default=0.0)
+    mock.add_argument('--rate-limit', type=float, default=0.0, help='requests per second, 0 --> off')
+    mock.add_argument('--burst', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix='palio-loadtest-')
+    os.makedirs(directory, exist_ok=True)
+    print(f'run directory {directory}')
+
+    reports = []
+    with open(os.path.join(directory, 'app.log'), 'a') as log:
+        for n in args.symbols:
+            print(f'{n} symbols: {args.warmup:.0f}s warmup, {args.duration:.0f}s measured...')
+            reports.append(run(args, n, os.path.join(directory, f'{n}'), log))
+
+    print()
+    printReports(reports)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
@@ -0,0 +1,184 @@
+# ================================================
+#   FILE: tools/marketdata_standin.py
+#
+#   Local stand-in for the exchange's v2 market data WebSocket, for testing
+#   the trader's streaming mode without a network connection. Speaks just
+#   enough of RFC 6455 (handshake, text frames, close) with the standard
+#   library. Sends a book snapshot for every subscribed symbol and then
+#   random top of book changes.
+#
+#       python tools/marketdata_standin.py --port 8765 --rate 20
+#
+#   and set app_variables['ws_url'] = 'ws://127.0.0.1:8765/'
+#
+
+
+# ==== IMPORTS
+import argparse
+import base64
+import hashlib
+import json
+import random
+import socketserver
+import struct
+import threading
+import time
+
+
+
+
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+
+
+# ==== FRAMING
+
+def sendFrame(sock, payload, opcode=0x1):
+    data = payload.encode() if isinstance(payload, str) else payload
+    header = bytes([0x80 | opcode])
+
+    if (len(data) < 126):
+        header += bytes([len(data)])
+    elif (len(data) < 65536):
+        header += bytes([126]) + struct.pack('!H', len(data))
+    else:
+        header += bytes([127]) + struct.pack('!Q', len(data))
+
+    sock.sendall(header + data)
+
+
+
+def readExact(rfile, n):
+    data = rfile.read(n)
+    if (len(data) < n):
+        raise EOFError
+    return data
+
+
+
+# returns (opcode, payload) of the next client frame, client frames are masked
+def readFrame(rfile):
+    b0, b1 = readExact(rfile, 2)
+    length = b1 & 0x7f
+
+    if (length == 126):
+        length = struct.unpack('!H', readExact(rfile, 2))[0]
+    elif (length == 127):
+        length = struct.unpack('!Q', readExact(rfile, 8))[0]
+
+    mask = readExact(rfile, 4) if (b1 & 0x80) else b'\x00\x00\x00\x00'
+    payload = bytes(b ^ mask[i % 4] for i, b in enumerate(readExact(rfile, length)))
+
+    return (b0 & 0x0f), payload
+
+
+
+
+# ==== SERVER
+
+class StandInHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        # http upgrade handshake
+        headers = {}
+        self.rfile.readline()
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                break
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + GUID).encode()).digest()).decode()
+        self.wfile.write((
+            'HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {accept}\r\n\r\n'
+        ).encode())
+
+        # first frame is the subscribe message
+        opcode, payload = readFrame(self.rfile)
+        symbols = json.loads(payload)['subscriptions'][0]['symbols']
+
+        self.closed = False
+        self.send_lock = threading.Lock()
+        threading.Thread(target=self.readLoop, daemon=True).start()
+
+        try:
+            self.stream(symbols)
+        except OSError:
+            pass
+
+
+
+    # answers pings and notices when the client closes
+    def readLoop(self):
+        try:
+            while True:
+                opcode, payload = readFrame(self.rfile)
+                if (opcode == 0x8):
+                    break
+                if (opcode == 0x9):
+                    with self.send_lock:
+                        sendFrame(self.request, payload, opcode=0xA)
+        except (EOFError, OSError):
+            pass
+        self.closed = True
+
+
+
+    def stream(self, symbols):
+        rng = random.Random(self.server.seed)
+        mids = {symbol: rng.uniform(1, 1000) for symbol in symbols}
+
+        # five levels on each side around the mid price
+        def ladder(mid, quantity):
+            changes = [['buy', f'{mid * (1 - 0.001 * i):.4f}', quantity] for i in range(1, 6)]
+            changes += [['sell', f'{mid * (1 + 0.001 * i):.4f}', quantity] for i in range(1, 6)]
+            return changes
+
+        # snapshot
+        for symbol in symbols:
+            with self.send_lock:
+                sendFrame(self.request, json.dumps({'type': 'l2_updates', 'symbol': symbol, 'changes': ladder(mids[symbol], '1')}))
+
+        while not self.closed:
+            time.sleep(1 / self.server.rate)
+
+            # move the whole book of a random symbol
+            symbol = rng.choice(symbols)
+            mid = mids[symbol]
+            mids[symbol] = mid * (1 + rng.gauss(0, 0.001))
+
+            changes = ladder(mid, '0') + ladder(mids[symbol], '1')
+            with self.send_lock:
+                sendFrame(self.request, json.dumps({'type': 'l2_updates', 'symbol': symbol, 'changes': changes}))
+
+
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, rate=20, seed=0):
+        super().__init__(address, StandInHandler)
+        self.rate = rate        # updates per second
+        self.seed = seed
+
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='local stand-in for the market data WebSocket')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate', type=float, default=20, help='top of book updates per second')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = StandInServer((args.host, args.port), rate=args.rate, seed=args.seed)
+    print(f'market data stand-in on ws://{args.host}:{args.port}/')
+    server.serve_forever()
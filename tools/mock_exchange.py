@@ -0,0 +1,307 @@
+# ================================================
+#   FILE: tools/mock_exchange.py
+#
+#   Local stand-in for the exchange's public REST api, so the whole app can
+#   run without the network. Serves the two endpoints the trader uses:
+#
+#       GET /v2/candles/{coin}/{timeframe}      newest first, --history candles
+#       GET /v2/ticker/{coin}                   bid / ask around the last close
+#       GET /stats                              request counts of the mock itself
+#
+#   Candles come from the seeded market of benchmarks/market.py, every coin
+#   name is valid, or are replayed from recorded {coin}.json / candle store
+#   files (--candles, for the timeframe they were recorded in). A simulated
+#   clock closes a new candle every timeframe / --speed seconds, the same
+#   seed always gives the same candles.
+#
+#   Faults, drawn from the seeded generator:
+#       --latency / --jitter    ms added to every response (normal distribution)
+#       --error-rate            share of requests answered with a 500 / 502 / 503
+#       --rate-limit / --burst  requests per second per client, 429 above it
+#
+#       python -m tools.mock_exchange --port 8088 --speed 60 --latency 30 --error-rate 0.01
+#
+#   and set app_variables['base_url'] = 'http://127.0.0.1:8088/'
+#
+
+
+# ==== IMPORTS
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.market import SyntheticMarket
+from resources.fetcher import TokenBucket
+from resources.resampler import timeframeMs
+
+import argparse
+import json
+import random
+import threading
+import time
+
+
+
+
+# exchange timeframe names that differ from the app's
+TIMEFRAMES = {'1hr': '1h', '6hr': '6h', '1day': '1d'}
+
+ERRORS = {
+    429: ('RateLimited', 'Requests were throttled.'),
+    500: ('InternalServerError', 'Injected server error.'),
+    502: ('BadGateway', 'Injected bad gateway.'),
+    503: ('ServiceUnavailable', 'Injected unavailable.'),
+    400: ('InvalidTimeframe', 'Unknown timeframe.'),
+    404: ('EndpointNotFound', 'No such endpoint.')
+}
+
+SPREAD = 0.0005         # bid / ask around the close
+
+
+
+
+# ==== MARKET
+
+class MarketFeed:
+    def __init__(self, seed=0, history=1440, speed=1.0, recorded=None, recorded_timeframe='1m'):
+        self.seed = seed
+        self.history = history
+        self.speed = speed          # simulated seconds per second
+
+        # {coin: [candles oldest first]} replayed in place of the synthetic ones
+        self.recorded = recorded or {}
+        self.recorded_ms = timeframeMs(recorded_timeframe)
+
+        self.markets = {}           # timeframe ms --> SyntheticMarket
+        self.series = {}            # (coin, ms) --> [walk, candles oldest first, closed]
+        self.encoded = {}           # (coin, ms) --> (closed, json body)
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+
+
+
+    # candles of the timeframe closed on the simulated clock, the first
+    # `history` are there from the start
+    def closed(self, ms):
+        return self.history + int((time.monotonic() - self.started) * self.speed * 1000 / ms)
+
+
+
+    # the newest `history` candles, oldest first --> (closed, candles)
+    def window(self, coin, ms):
+        closed = self.closed(ms)
+
+        # recordings stop at their last candle
+        if (coin in self.recorded) and (ms == self.recorded_ms):
+            candles = self.recorded[coin]
+            closed = min(closed, len(candles))
+            return closed, candles[max(0, closed - self.history):closed]
+
+        key = (coin, ms)
+        with self.lock:
+            entry = self.series.get(key)
+            if (entry is None):
+                market = self.markets.setdefault(ms, SyntheticMarket(self.seed, ms))
+                entry = [market.walk(coin), deque(maxlen=self.history), 0]
+                self.series[key] = entry
+
+            walk, candles, count = entry
+            for _ in range(count, closed):
+                candles.append(next(walk))
+            entry[2] = max(count, closed)
+
+            return entry[2], list(candles)
+
+
+
+    # json body of v2/candles, encoded once per closed candle
+    def candles(self, coin, timeframe):
+        ms = timeframeMs(TIMEFRAMES.get(timeframe, timeframe))
+        closed, candles = self.window(coin, ms)
+
+        cached = self.encoded.get((coin, ms))
+        if cached and (cached[0] == closed):
+            return cached[1]
+
+        body = json.dumps(candles[::-1]).encode()
+        self.encoded[(coin, ms)] = (closed, body)
+        return body
+
+
+
+    # v2/ticker --> 24 hours of the base timeframe, prices as strings
+    def ticker(self, coin):
+        _, candles = self.window(coin, self.recorded_ms)
+        day = candles[-(24 * 60 * 60 * 1000 // self.recorded_ms):]
+        close = day[-1][4]
+        hourly = day[::-max(1, (60 * 60 * 1000 // self.recorded_ms))]      # newest first
+
+        return json.dumps({
+            'symbol': coin.upper(),
+            'open': str(day[0][1]),
+            'high': str(max(candle[2] for candle in day)),
+            'low': str(min(candle[3] for candle in day)),
+            'close': str(close),
+            'changes': [str(candle[4]) for candle in hourly],
+            'bid': f'{close * (1 - SPREAD):.6f}',
+            'ask': f'{close * (1 + SPREAD):.6f}'
+        }).encode()
+
+
+
+
+# ==== SERVER
+
+class MockHandler(BaseHTTPRequestHandler):
+    # keep-alive, the trader reuses its pooled connections
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        parts = self.path.split('?')[0].strip('/').split('/')
+
+        if (parts == ['stats']):
+            self.reply(200, json.dumps(server.snapshot()).encode())
+            return
+
+        key = '/'.join(parts[:2])
+        delay, fault = server.draw()
+        time.sleep(delay)
+
+        if server.limited(self.client_address[0]):
+            self.error(429, key)
+        elif fault:
+            self.error(fault, key)
+        elif (key == 'v2/candles') and (len(parts) == 4):
+            try:
+                self.reply(200, server.feed.candles(parts[2], parts[3]), key)
+            except ValueError:
+                self.error(400, key)
+        elif (key == 'v2/ticker') and (len(parts) == 3):
+            self.reply(200, server.feed.ticker(parts[2]), key)
+        else:
+            self.error(404, key)
+
+
+
+    def error(self, status, key):
+        reason, message = ERRORS[status]
+        self.reply(status, json.dumps({'result': 'error', 'reason': reason, 'message': message}).encode(), key)
+
+
+
+    def reply(self, status, body, key=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        if key:
+            self.server.count(key, status)
+
+
+
+    def log_message(self, *args):
+        pass
+
+
+
+
+class MockExchange(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, feed, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=0.0, burst=5, seed=0):
+        super().__init__(address, MockHandler)
+        self.feed = feed
+
+        self.latency = latency / 1000       # ms --> seconds
+        self.jitter = jitter / 1000
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit        # requests per second per client, 0 --> off
+        self.burst = burst
+
+        self.rnd = random.Random(seed)
+        self.buckets = {}                   # client host --> TokenBucket
+        self.counts = {}                    # (endpoint, status) --> requests
+        self.lock = threading.Lock()
+
+
+
+    # delay and injected status of the next request, status None --> no fault
+    def draw(self):
+        with self.lock:
+            delay = max(0.0, self.rnd.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+            fault = self.rnd.choice((500, 502, 503)) if (self.rnd.random() < self.error_rate) else None
+            return delay, fault
+
+
+
+    def limited(self, host):
+        if not(self.rate_limit):
+            return False
+
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if (bucket is None):
+                bucket = TokenBucket(self.rate_limit, self.burst)
+                self.buckets[host] = bucket
+
+        return (bucket.take() != 0)
+
+
+
+    def count(self, key, status):
+        with self.lock:
+            self.counts[(key, status)] = self.counts.get((key, status), 0) + 1
+
+
+
+    # {'uptime', 'requests', 'status': {status: n}, 'endpoints': {endpoint: {status: n}}}
+    def snapshot(self):
+        with self.lock:
+            out = {'uptime': time.monotonic() - self.feed.started, 'requests': 0, 'status': {}, 'endpoints': {}}
+            for (key, status), n in self.counts.items():
+                out['requests'] += n
+                out['status'][str(status)] = out['status'].get(str(status), 0) + n
+                out['endpoints'].setdefault(key, {})[str(status)] = n
+            return out
+
+
+
+
+# process target for the load test --> serves until terminated
+#   candles --> directory of recorded candles, see backtest.loadCandles
+def runServer(host, port, seed=0, history=1440, speed=1.0, candles=None, coins=(), timeframe='1m', **faults):
+    recorded = None
+    if candles:
+        from backtest import loadCandles
+        recorded = loadCandles(candles, coins, timeframe)
+
+    feed = MarketFeed(seed, history, speed, recorded, timeframe)
+    server = MockExchange((host, port), feed, seed=seed, **faults)
+    server.serve_forever()
+
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='local stand-in for the exchange rest api')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8088)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--history', type=int, default=1440, help='candles per v2/candles response')
+    parser.add_argument('--speed', type=float, default=1.0, help='simulated seconds per second, 60 --> a 1m candle every second')
+    parser.add_argument('--candles', help='directory with recorded {coin}.json or candle store files')
+    parser.add_argument('--coins', nargs='*', default=[], help='coins to load from --candles')
+    parser.add_argument('--timeframe', default='1m', help='timeframe of the recorded candles')
+    parser.add_argument('--latency', type=float, default=0.0, help='ms added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='standard deviation of the latency, ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 5xx')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='requests per second per client, 0 --> off')
+    parser.add_argument('--burst', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'mock exchange on http://{args.host}:{args.port}/')
+    runServer(args.host, args.port, args.seed, args.history, args.speed, args.candles, args.coins, args.timeframe,
+              latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, rate_limit=args.rate_limit, burst=args.burst)
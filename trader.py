@@ -9,12 +9,26 @@
 
 
 # ==== IMPORTS
-from resources.message import Message
-from playsound import playsound
-
+from resources.message import Message, Tick, Dispatcher, sendMessage
+from resources.message import CALC_DATA, BUY_SIGNAL, SELL_SIGNAL, TICK, CANDLES
+from resources.messageloop import MessageLoop
+from resources.fetcher import CandleFetcher
+from resources.candlestore import CandleStore
+from resources.journal import TradeJournal
+from resources.effects import SideEffects
+from resources.stoploss import StopEngine
+from resources.sharding import HashRing
+from resources.metrics import Metrics
+
+import queue
+import signal
+import threading
 import time
-import requests, json
-import pandas as pd
+import requests
+
+from multiprocessing import Pipe
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 
@@ -36,7 +50,7 @@ COLORS = {
 
 
 def PRINT_BUY_EVENT(coin, order, t):
-    print(f"BUY_EVENT[{t}]::{coin.upper()} --> bid: {COLORS['YELLOW']}$ {order['bid']}{COLORS['RESET']}   stop_loss: {COLORS['RED']}$ {order['stop-loss']}{COLORS['RESET']}")
+    print(f"BUY_EVENT[{order['strategy']}/{t}]::{coin.upper()} --> bid: {COLORS['YELLOW']}$ {order['bid']}{COLORS['RESET']}   stop_loss: {COLORS['RED']}$ {order['stop-loss']}{COLORS['RESET']}")
 
 
 
@@ -50,21 +64,38 @@ def PRINT_SELL_EVENT(coin, order, t):
     percent = round(calcPercent(order['bid'], order['ask']), 4)
 
     if (order['ask'] > order['bid']):
-        print(f"SOLD[{t}]::{coin.upper()} --> bid: {COLORS['YELLOW']}$ {order['bid']}{COLORS['RESET']}   ask: {COLORS['GREEN']}$ {order['ask']}   {percent * 100} %{COLORS['RESET']}")
+        print(f"SOLD[{order['strategy']}/{t}]::{coin.upper()} --> bid: {COLORS['YELLOW']}$ {order['bid']}{COLORS['RESET']}   ask: {COLORS['GREEN']}$ {order['ask']}   {percent * 100} %{COLORS['RESET']}")
     else:
-        print(f"SOLD[{t}]::{coin.upper()} --> bid: {COLORS['YELLOW']}$ {order['bid']}{COLORS['RESET']}   ask: {COLORS['RED']}$ {order['ask']}   {percent * 100} %{COLORS['RESET']}")
+        print(f"SOLD[{order['strategy']}/{t}]::{coin.upper()} --> bid: {COLORS['YELLOW']}$ {order['bid']}{COLORS['RESET']}   ask: {COLORS['RED']}$ {order['ask']}   {percent * 100} %{COLORS['RESET']}")
+
+
 
 
 
+# runs on the sounds thread, playsound is only imported once a sound plays
+def PLAY_SOUND(path):
+    from playsound import playsound
+    playsound(path)
 
 
-def DISPLAY_ORDERS(orders):
+
+
+
+def DISPLAY_ORDERS(orders, stats=None, api=None):
     print('- - - - - - - - - - - ACTIVE ORDERS - - - - - - - - - - -')
-    for coin in orders:
-        if (orders[coin]['stop-loss'] > orders[coin]['bid']):
-            print(f"{coin.upper()} --> bid: {COLORS['YELLOW']}$ {orders[coin]['bid']}{COLORS['RESET']}   stop_loss: {COLORS['GREEN']}$ {orders[coin]['stop-loss']}{COLORS['RESET']}")
+    for i in orders:
+        order = orders[i]
+        name = f"{order['coin'].upper()}#{i} [{order['strategy']}]"
+        if (order['stop-loss'] > order['bid']):
+            print(f"{name} --> bid: {COLORS['YELLOW']}$ {order['bid']}{COLORS['RESET']}   stop_loss: {COLORS['GREEN']}$ {order['stop-loss']}{COLORS['RESET']}")
         else:
-            print(f"{coin.upper()} --> bid: {COLORS['YELLOW']}$ {orders[coin]['bid']}{COLORS['RESET']}   stop_loss: {COLORS['RED']}$ {orders[coin]['stop-loss']}{COLORS['RESET']}")
+            print(f"{name} --> bid: {COLORS['YELLOW']}$ {order['bid']}{COLORS['RESET']}   stop_loss: {COLORS['RED']}$ {order['stop-loss']}{COLORS['RESET']}")
+    if stats:
+        for name, s in stats.items():
+            print(f"{name} queue --> depth: {s['depth']}   max: {s['max_depth']}   dropped: {s['dropped']}   coalesced: {s['coalesced']}")
+    if api:
+        for key, s in api.items():
+            print(f"{key} --> requests: {s['count']}   errors: {s['errors']}   mean: {s['mean'] * 1000:.0f} ms   max: {s['max'] * 1000:.0f} ms")
     print('- - - - - - - - - - - - - - - - - - - - - - - - - - - - -')
 
 
@@ -73,109 +104,358 @@ def DISPLAY_ORDERS(orders):
 
 
 
+# ==== EXCHANGE CLIENT
+
+# one pooled keep-alive session for every api call, so requests reuse open
+# TCP + TLS connections instead of doing a new handshake each time
+class ExchangeClient:
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=10, retries=3, pool_size=10):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+
+        # only retry when the connection itself fails (e.g. a pooled connection
+        # the server already closed), slower failures are left to the caller
+        retry = Retry(total=retries, connect=retries, read=0, status=0, backoff_factor=0.1)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+
+        # per endpoint latency counters --> {key: {'count', 'errors', 'total', 'max', 'last'}}
+        self.latency = {}
+        self.lock = threading.Lock()
+
+        # trader Metrics, also gets every request when set
+        self.metrics = None
+
+
+
+    # GET an endpoint and return the decoded json, raises on http errors
+    # key groups the latency counters, e.g. 'v2/ticker' for every coin
+    def get(self, endpoint, key=None):
+        key = endpoint if (key is None) else key
+        start = time.perf_counter()
+        error = False
+
+        try:
+            response = self.session.get(self.base_url + endpoint, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+
+        except Exception:
+            error = True
+            raise
+
+        finally:
+            self.record(key, time.perf_counter() - start, error)
+
+
+
+    def record(self, key, elapsed, error):
+        with self.lock:
+            stats = self.latency.setdefault(key, {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+            stats['count'] += 1
+            stats['errors'] += error
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            stats['last'] = elapsed
+
+        if self.metrics:
+            self.metrics.observe('api_seconds', elapsed, endpoint=key)
+            if error:
+                self.metrics.inc('api_errors_total', endpoint=key)
+
+
+
+    # snapshot of the latency counters with the mean filled in
+    def latencyStats(self):
+        with self.lock:
+            out = {}
+            for key in self.latency:
+                out[key] = dict(self.latency[key])
+                out[key]['mean'] = out[key]['total'] / out[key]['count']
+            return out
+
+
+
+    # ticker for a coin --> {'bid', 'ask', ...}
+    def getTicker(self, coin):
+        return self.get(f'v2/ticker/{coin}', 'v2/ticker')
+
+
+
+
+
+
+
 # ==== TRADER CLASS
 
 class Trader:
-    def __init__(self, app_vars, d_conn, g_conn):
-        self.data_connection = d_conn   # communication with the data process
-        self.gui_connection = g_conn    # communication with the gui process
+    def __init__(self, app_vars, d_conns, g_conn):
+        self.data_connections = d_conns     # communication with the data workers --> {worker: conn}
+        self.gui_connection = g_conn        # communication with the gui process
 
         self.app_variables = app_vars
-        self.active_coins = app_vars['coins']
-        self.base_url = 'https://api.gemini.com/'
 
-        self.active_orders = {}
+        # same ring MainApp used to hand out the coins to the data workers
+        self.shards = HashRing(range(0, app_vars['data_workers']))
+        self.active_coins = app_vars['coins']
+        self.base_url = app_vars['base_url']
+
+        # open positions, several per coin are allowed
+        self.active_orders = {}     # position id --> order
+        self.coin_orders = {}       # coin --> set of position ids
+        self.next_position = 1
+
+        # trailing stop losses, evaluated on every price update
+        self.stop_engine = StopEngine(app_vars['stop_loss_percent'], app_vars['round_amounts'])
+
+        # message handlers by opcode
+        self.dispatcher = Dispatcher()
+        self.dispatcher.register(BUY_SIGNAL, self.handleBuySignal)
+        self.dispatcher.register(SELL_SIGNAL, self.handleSellSignal)
+        self.dispatcher.register(TICK, self.handleTick)
+        self.dispatcher.register(CANDLES, self.handleCandles)
+
+        # newest candle sent to the data process for each coin, only newer
+        # or revised candles are sent after the first pull
+        self.last_candles = {}
+
+        # shared keep-alive connection pool for all api calls
+        self.client = ExchangeClient(
+            self.base_url,
+            connect_timeout = app_vars['connect_timeout'],
+            read_timeout = app_vars['read_timeout'],
+            retries = app_vars['request_retries'],
+            pool_size = app_vars['fetch_workers']
+        )
+
+        # latency histograms and counters, written to the stats file by the mainloop
+        self.metrics = Metrics('trader', app_vars.get('metrics_dir'))
+        self.client.metrics = self.metrics
+        self.loop = None
+
+        # streaming top of book cache, only used when market_data is 'stream'
+        self.market_data = None
+        self.quotes = None
+
+        # the market data thread wakes the mainloop through this Pipe when the
+        # price of a coin with open positions moves
+        self.tick_reader = None
+        self.tick_writer = None
+        self.pending_ticks = set()
+
+        # pulls candles for all coins concurrently within the api rate limit
+        self.candle_fetcher = CandleFetcher(
+            self.client,
+            rate = app_vars['api_rate_limit'],
+            burst = app_vars['api_burst'],
+            workers = app_vars['fetch_workers'],
+            retries = app_vars['request_retries']
+        )
+
+        # candle pulls run on their own thread, the candles are handed over
+        # through the queue and the thread wakes the mainloop through the
+        # Pipe, opened in start(). At most one pull is in flight.
+        self.pull_reader = None
+        self.pull_writer = None
+        self.pulled = queue.SimpleQueue()
+        self.pulling = False
+
+        # on-disk candle history, opened in start() since the mapped files
+        # stay in this process
+        self.candle_store = None
+
+        # trade journal with its writer thread, started in start()
+        self.journal = None
+
+        # worker threads for everything that is not part of placing orders,
+        # sounds get their own so a playing mp3 does not hold up the prints
+        self.sounds = None
+        self.effects = None
 
 
     # mainloop
     def start(self):
 
+        if (self.app_variables['market_data'] == 'stream'):
+            self.startMarketData()
+
+        if self.app_variables.get('candle_store'):
+            self.openCandleStore()
+
+        self.journal = TradeJournal(self.app_variables['journal'], self.app_variables['journal_sync_interval'])
+        self.sounds = SideEffects('sounds', maxsize=2)
+        self.effects = SideEffects('effects', maxsize=self.app_variables['effects_queue_size'])
+
+        self.pull_reader, self.pull_writer = Pipe(duplex=False)
         self.pullCandleData()
 
-        # 60 second refresh time for pulling candle data
-        refresh_rate = 60
-        refresh_last = time.time()
+        # blocks on the Pipes, wakes up for the timers
+        self.loop = MessageLoop()
+        for conn in self.data_connections.values():
+            self.loop.addConnection(conn, self.handleMessage)
+        self.loop.addConnection(self.gui_connection, self.handleMessage)
+        self.loop.addConnection(self.pull_reader, self.handleMessage)
+        if self.tick_reader:
+            self.loop.addConnection(self.tick_reader, self.handleMessage)
+
+        # refresh time for pulling candle data, 60 seconds by default
+        self.loop.addTimer(self.app_variables['pull_interval'], self.pullCandleData)
+
+        # 30 second refresh for displaying orders, also updates the stop
+        # losses when prices come from the REST ticker
+        self.loop.addTimer(30, self.updateActiveOrders)
+
+        if self.app_variables.get('metrics_dir'):
+            self.loop.addTimer(self.app_variables['metrics_interval'], self.writeMetrics)
+
+        # MainApp.stop() ends the process with SIGTERM, which would skip the
+        # atexit handlers --> unwind out of the mainloop and shut down instead
+        signal.signal(signal.SIGTERM, self.handleTerminate)
+
+        try:
+            self.loop.run()
+        finally:
+            self.shutdown()
+
+
+
+    def handleTerminate(self, signum, frame):
+        raise SystemExit(0)
+
+
+
+    # runs the side effects still queued, the journal records among them,
+    # then writes the journal queue out
+    def shutdown(self):
+        self.loop.stop()
+        self.effects.close()
+        self.journal.close()
+
+        if self.candle_store:
+            self.candle_store.close()
+
+
+
+    def writeMetrics(self):
+        self.metrics.set('pipe_backlog', self.loop.backlog)
+        self.metrics.set('pipe_backlog_max', self.loop.max_backlog)
+
+        for key, stats in self.client.latencyStats().items():
+            self.metrics.set('api_latency_mean_seconds', stats['mean'], endpoint=key)
+            self.metrics.set('api_latency_max_seconds', stats['max'], endpoint=key)
+
+        for effects in (self.sounds, self.effects):
+            stats = effects.stats()
+            self.metrics.set('effects_queue_depth', stats['depth'], queue=effects.name)
+            self.metrics.set('effects_queue_depth_max', stats['max_depth'], queue=effects.name)
+            for result in ('submitted', 'done', 'dropped', 'coalesced', 'errors'):
+                self.metrics.set('effects_total', stats[result], queue=effects.name, result=result)
+
+        self.metrics.write()
+
+
+
+    # subscribes to the WebSocket feed for every active coin, prices are then
+    # read from the in-memory top of book cache
+    def startMarketData(self):
+        from resources.marketdata import MarketDataStream, TopOfBookCache
+
+        self.tick_reader, self.tick_writer = Pipe(duplex=False)
 
-        display_rate = 30
-        display_last = time.time()
+        self.quotes = TopOfBookCache()
+        self.market_data = MarketDataStream(self.app_variables['ws_url'], self.active_coins, self.quotes, self.onQuoteUpdate)
+        self.market_data.start()
 
-        # check for incoming messages
-        def checkForMessages():
 
-            if self.data_connection.poll():
-                try:
-                    msg = self.data_connection.recv()
-                    self.handleMessage(msg)
-                except:
-                    pass
 
-            if self.gui_connection.poll():
-                try:
-                    msg = self.gui_connection.recv()
-                    self.handleMessage(msg)
-                except:
-                    pass
+    # called on the market data thread --> only wakes the mainloop for coins
+    # with open positions and at most once until that tick is handled
+    def onQuoteUpdate(self, coin):
+        if not(self.coin_orders.get(coin)) or (coin in self.pending_ticks):
+            return
+
+        self.pending_ticks.add(coin)
+        sendMessage(self.tick_writer, Tick(coin))
+
+
 
+    # evaluates the stop losses of a coin at its latest streamed price
+    def handleTick(self, m):
+        self.pending_ticks.discard(m.coin)
 
+        quote = self.quotes.get(m.coin, self.app_variables['quote_max_age'])
+        if quote:
+            self.checkStopLosses(m.coin, quote[1])
 
-        # mainloop
-        while True:
-            # check for incoming messages
-            checkForMessages()
 
-            t = time.time()
-            if ((t - refresh_last) > refresh_rate):
-                self.pullCandleData()
-                refresh_last = t
 
+    # sells the positions of a coin whose stop loss was hit by the ask price
+    # and raises the trailing stops of the rest
+    def checkStopLosses(self, coin, ask):
+        for position_id in self.stop_engine.update(coin, ask):
+            self.closePosition(position_id, ask, 'stoploss')
 
 
-            # update and display active orders
-            if (self.active_orders):
-                t = time.time()
-                if ((t - display_last) > display_rate):
 
-                    temp = self.active_orders.copy()
-                    for coin in temp:
-                        endpoint = f'v2/ticker/{coin}'
+    # returns the current (bid, ask) for a coin, from the streaming cache when
+    # it is fresh enough and from the REST ticker otherwise
+    def getQuote(self, coin):
+        if self.quotes:
+            quote = self.quotes.get(coin, self.app_variables['quote_max_age'])
+            if quote:
+                return (quote[0], quote[1])
 
-                        try:
-                            response = requests.get(self.base_url + endpoint)
-                            ticker = response.json()
-                            ask = float(ticker['ask'])
+        ticker = self.client.getTicker(coin)
+        return (float(ticker['bid']), float(ticker['ask']))
+
+
+
+    # update stop losses for active orders and display them
+    def updateActiveOrders(self):
+        if not(self.active_orders):
+            return
 
-                        except:
-                            pass
+        for coin in list(self.coin_orders):
+            try:
+                ask = self.getQuote(coin)[1]
 
-                        if (ask < self.active_orders[coin]['stop-loss']):
-                            self.handleMessage(Message('sell-signal-stoploss', coin))
-                            continue
+            except:
+                continue
 
+            self.checkStopLosses(coin, ask)
 
-                        new_stop = self.calculateStopLoss(ask)
-                        if (new_stop > self.active_orders[coin]['stop-loss']):
-                            self.active_orders[coin]['stop-loss'] = round(new_stop, self.app_variables['round_amounts'][coin])
 
+        for position_id in self.active_orders:
+            self.active_orders[position_id]['stop-loss'] = self.stop_engine.stop(position_id)
 
-                    DISPLAY_ORDERS(self.active_orders)
-                    display_last = t
+        # the worker gets a copy, only the newest table is printed
+        orders = {position_id: dict(self.active_orders[position_id]) for position_id in self.active_orders}
+        stats = {'sounds': self.sounds.stats(), 'effects': self.effects.stats()}
+        self.effects.submit(DISPLAY_ORDERS, orders, stats, self.client.latencyStats(), policy='coalesce', key='orders')
 
 
 
 
 
-    # creates a Message object and sends it through the
-    # corresponding pipe
-    def sendMessage(self, to, m='', d=''):
-        message = Message(m, d)
+    # sends a message through the corresponding pipe
+    def sendMessage(self, to, message):
 
         if (to == 'data'):
             #print('MESSAGE: trader --> data')
-            self.data_connection.send(message)
+            for conn in self.data_connections.values():
+                sendMessage(conn, message)
 
         if (to == 'gui'):
             #print('MESSAGE: trader --> gui')
-            self.gui_connection.send(message)
+            sendMessage(self.gui_connection, message)
 
 
 
@@ -183,99 +463,247 @@ class Trader:
 
     # handles incoming messages
     def handleMessage(self, m):
+        self.dispatcher.dispatch(m)
 
-        # handle buy signal
-        if ('buy-signal' in m.message):
-            if not(m.data in self.active_orders):
-                type = m.message.split('-')[2]
-                bid = self.placeBuyOrder(m.data)
 
-                if (bid):
-                    self.active_orders[m.data] = {}
-                    self.active_orders[m.data]['bid'] = bid
-                    self.active_orders[m.data]['stop-loss'] = round(self.calculateStopLoss(bid), self.app_variables['round_amounts'][m.data])
-                    self.active_orders[m.data]['buy-type'] = type
-                    playsound('resources/sounds/notification.mp3')
-                    PRINT_BUY_EVENT(m.data, self.active_orders[m.data], type)
 
-            return
+    # stage latencies of a signal from the data process, manual signals from
+    # the gui have no trace
+    def traceSignal(self, m):
+        if m.trace:
+            received = time.monotonic()
+            self.metrics.observe('ipc_seconds', received - m.trace[-1], route='data-trader')
+            self.metrics.observe('signal_seconds', received - m.trace[0])
+
+
 
+    # fetch to order time once the price for a signal is in
+    def traceOrder(self, m, side, latency):
+        self.metrics.observe('quote_seconds', latency, side=side)
+        if m.trace:
+            self.metrics.observe('pipeline_seconds', time.monotonic() - m.trace[0], stage=side)
 
-        # handle sell signal
-        if ('sell-signal' in m.message):
-            if (m.data in self.active_orders):
-                type = m.message.split('-')[2]
-                ask = self.placeSellOrder(m.data)
 
-                if ((type == 'rsi') or (type == 'macd')) and (ask < self.active_orders[m.data]['bid']):
-                    return
 
-                self.active_orders[m.data]['ask'] = ask
-                self.active_orders[m.data]['sell-type'] = type
-                self.active_orders[m.data]['profit'] = (self.active_orders[m.data]['ask'] - self.active_orders[m.data]['bid'])
-                playsound('resources/sounds/caching.mp3')
-                PRINT_SELL_EVENT(m.data, self.active_orders[m.data], type)
+    # handle buy signal --> every strategy gets max_positions_per_coin
+    # positions of its own, so variants trade side by side
+    def handleBuySignal(self, m):
+        self.traceSignal(m)
 
-                # create data frame for event --> append to events.csv
-                d = {
-                    'coin': m.data,
-                    'buy-type': self.active_orders[m.data]['buy-type'],
-                    'sell-type': self.active_orders[m.data]['sell-type'],
-                    'buy-price': self.active_orders[m.data]['bid'],
-                    'sell-price': self.active_orders[m.data]['ask'],
-                    'timeframe': self.app_variables['timeframe'],
-                    'sl-percent': self.app_variables['stop_loss_percent']
-                }
+        held = [p for p in self.coin_orders.get(m.coin, ()) if (self.active_orders[p]['strategy'] == m.strategy)]
+        if (len(held) < self.app_variables['max_positions_per_coin']):
+            start = time.perf_counter()
+            bid = self.placeBuyOrder(m.coin)
 
-                cols = ['coin', 'buy-type', 'sell-type', 'buy-price', 'sell-price', 'timeframe']
+            if (bid):
+                latency = time.perf_counter() - start
+                self.traceOrder(m, 'buy', latency)
+                self.openPosition(m.coin, bid, m.kind, latency, m.strategy)
 
-                df = pd.DataFrame(columns=cols)
-                df = df.append(d, ignore_index=True)
-                df.to_csv('database/events.csv', mode='a', header=False, index=False)
 
 
-                self.active_orders.pop(m.data)
+    # handle sell signal --> sells the positions the strategy opened, manual
+    # sells close every position of the coin, signal sells keep positions that
+    # would close at a loss
+    def handleSellSignal(self, m):
+        self.traceSignal(m)
 
+        positions = [p for p in self.coin_orders.get(m.coin, ()) if (m.kind == 'manual') or (self.active_orders[p]['strategy'] == m.strategy)]
+        if not(positions):
             return
 
+        type = m.kind
+        start = time.perf_counter()
+        ask = self.placeSellOrder(m.coin)
+        if not(ask):
+            return
+        latency = time.perf_counter() - start
+        self.traceOrder(m, 'sell', latency)
+
+        for position_id in positions:
+            if (type != 'manual') and (ask < self.active_orders[position_id]['bid']):
+                continue
+
+            self.stop_engine.remove(position_id)
+            self.closePosition(position_id, ask, type, latency)
+
+
+
+    # records a new position and starts tracking its stop loss
+    # latency --> seconds from the signal to the fill
+    # strategy --> id of the strategy that opened it, its sells close it
+    def openPosition(self, coin, bid, type, latency=0.0, strategy='manual'):
+        position_id = self.next_position
+        self.next_position += 1
+
+        self.active_orders[position_id] = {}
+        self.active_orders[position_id]['coin'] = coin
+        self.active_orders[position_id]['bid'] = bid
+        self.active_orders[position_id]['stop-loss'] = self.stop_engine.add(coin, position_id, bid)
+        self.active_orders[position_id]['buy-type'] = type
+        self.active_orders[position_id]['strategy'] = strategy
+        self.active_orders[position_id]['opened'] = time.time()
+        self.active_orders[position_id]['buy-latency'] = latency
+        self.coin_orders.setdefault(coin, set()).add(position_id)
+
+        self.notifyBuy(coin, self.active_orders[position_id], type)
+
+        return position_id
+
+
+
+    # records the sale of a position, its stop loss must no longer be tracked
+    def closePosition(self, position_id, ask, type, latency=0.0):
+        order = self.active_orders.pop(position_id)
+        coin = order['coin']
+
+        self.coin_orders[coin].discard(position_id)
+        if not(self.coin_orders[coin]):
+            del self.coin_orders[coin]
+
+        order['ask'] = ask
+        order['sell-type'] = type
+        order['profit'] = (order['ask'] - order['bid'])
+        order['closed'] = time.time()
+        order['sell-latency'] = latency
+
+        self.notifySell(coin, order, type)
+        self.recordTrade(order)
+
+
+
+    # sound and console output for a new position, both queued
+    def notifyBuy(self, coin, order, type):
+        if self.app_variables['sounds']:
+            self.sounds.submit(PLAY_SOUND, 'resources/sounds/notification.mp3')
+        self.effects.submit(PRINT_BUY_EVENT, coin, dict(order), type)
+
+
 
+    # sound and console output for a sold position, both queued
+    def notifySell(self, coin, order, type):
+        if self.app_variables['sounds']:
+            self.sounds.submit(PLAY_SOUND, 'resources/sounds/caching.mp3')
+        self.effects.submit(PRINT_SELL_EVENT, coin, dict(order), type)
 
 
 
+    # queues a sold position for the journal writer thread
+    def recordTrade(self, order):
+        self.effects.submit(self.journal.record, {
+            'coin': order['coin'],
+            'strategy': order['strategy'],
+            'buy_type': order['buy-type'],
+            'sell_type': order['sell-type'],
+            'buy_price': order['bid'],
+            'sell_price': order['ask'],
+            'timeframe': self.app_variables['timeframe'],
+            'sl_percent': self.app_variables['stop_loss_percent'],
+            'opened_at': order['opened'],
+            'closed_at': order['closed'],
+            'buy_latency': order['buy-latency'],
+            'sell_latency': order['sell-latency']
+        }, policy='keep')
 
-    # pulls the raw candle data for each active coin and sends
-    # the raw data to the data process
+
+
+    # the data process loads the stored candles itself when it starts, so
+    # only the candles newer than the newest stored one are sent after that
+    def openCandleStore(self):
+        self.candle_store = CandleStore(self.app_variables['candle_store'], self.app_variables['timeframe'])
+
+        for coin in self.active_coins:
+            stored = self.candle_store.candles(coin, limit=1)
+            if (stored):
+                self.last_candles[coin] = stored[0]
+
+
+
+    # starts a pull of the raw candle data for each active coin on the fetch
+    # thread, the mainloop keeps handling signals and ticks meanwhile. A pull
+    # that is still running when the timer fires again is not doubled up.
     def pullCandleData(self):
+        if (self.pulling):
+            return
+
+        self.pulling = True
+        threading.Thread(target=self.fetchCandles, daemon=True).start()
+
+
+
+    # runs on the fetch thread --> the rate limited requests, then hands the
+    # candles to the mainloop
+    def fetchCandles(self):
         #print('pulling candle data...')
+        start = time.monotonic()
+        try:
+            candles = self.candle_fetcher.fetch(self.active_coins, self.app_variables['timeframe'])
+
+        except Exception as e:
+            print(f"{COLORS['ERROR']}candle pull failed: {e}{COLORS['RESET']}")
+            candles = {}
+
+        self.pulled.put(candles)
+        sendMessage(self.pull_writer, Message(CANDLES, None, (start, time.monotonic())))
+
+
+
+    # a pull finished --> stores the candles and sends the new ones to the
+    # data worker of each coin
+    def handleCandles(self, m):
+        self.pulling = False
+        candles = self.pulled.get()
+        start, fetched = m.trace
+        self.metrics.observe('fetch_seconds', fetched - start)
+
         out_data = {}
-        timeframe = self.app_variables['timeframe']
+        for coin in candles:
+            if self.candle_store:
+                self.candle_store.append(coin, candles[coin])
 
-        for coin in self.active_coins:
+            delta = self.candleDelta(coin, candles[coin])
+            if (delta):
+                out_data[coin] = delta
 
-            try:
-                endpoint = f"v2/candles/{coin}/{timeframe}"
-                time.sleep(1)   # wait one second
-                response = requests.get(self.base_url + endpoint)
-                candles = response.json()
-                out_data[coin] = candles
+        # each data worker only gets the candles of its own coins
+        for worker, part in self.shards.split(out_data).items():
+            sendMessage(self.data_connections[worker], Message(CALC_DATA, part, (start, fetched, time.monotonic())))
 
-            except Exception as e:
-                print(e)
-                pass
 
-        if (out_data):
-            self.sendMessage('data', 'calc-data', out_data)
 
+    # returns the candles the data process has not seen yet --> everything
+    # newer than the last candle sent, plus that candle if it was revised
+    def candleDelta(self, coin, candles):
+        if not(candles):
+            return []
 
+        last = self.last_candles.get(coin)
+        if (last is None):
+            self.last_candles[coin] = candles[0]
+            return candles
 
-    # get bid price from api
-    def placeBuyOrder(self, coin):
-        endpoint = f'v2/ticker/{coin}'
+        if (candles[0][0] < last[0]):
+            return []
+
+        delta = []
+        for candle in candles:
+            if (candle[0] > last[0]):
+                delta.append(candle)
+                continue
+
+            if (candle[0] == last[0]) and (candle != last):
+                delta.append(candle)
+            break
 
+        self.last_candles[coin] = candles[0]
+        return delta
+
+
+
+    # get bid price from the stream cache or api
+    def placeBuyOrder(self, coin):
         try:
-            response = requests.get(self.base_url + endpoint)
-            ticker = response.json()
-            bid = float(ticker['bid'])
+            bid = self.getQuote(coin)[0]
 
             return bid
         except:
@@ -286,23 +714,13 @@ class Trader:
 
 
 
-    # get ask price from api
+    # get ask price from the stream cache or api
     def placeSellOrder(self, coin):
-        endpoint = f'v2/ticker/{coin}'
-
         try:
-            response = requests.get(self.base_url + endpoint)
-            ticker = response.json()
-            ask = float(ticker['ask'])
+            ask = self.getQuote(coin)[1]
 
             return ask
         except:
             pass
 
         return False
-
-
-
-    # calculate stop loss price
-    def calculateStopLoss(self, price):
-        return (price - (price * self.app_variables['stop_loss_percent']))